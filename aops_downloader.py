@@ -1,62 +1,380 @@
+import itertools
+import json
+import os
 import requests
 import re
-from typing import Dict, List, Any
+from requests.adapters import HTTPAdapter
+from dataclasses import dataclass
+from typing import Container, Dict, Iterable, Iterator, List, Any, Optional, Tuple
+
+from wiki_cache import DEFAULT_CACHE_DIR, WikiCache
 
 API_URL = "https://artofproblemsolving.com/wiki/api.php"
+# MediaWiki caps ``titles=`` at 50 entries per request for regular clients.
+API_TITLE_LIMIT = 50
+USER_AGENT = (
+    "math-problems-downloader/0.1 (+https://github.com/SnowballSH/math-problems)"
+)
 
 
-def fetch_page_wikitext(page_title: str) -> str:
-    """Fetch raw wikitext of a page from AoPS wiki."""
-    params = {
-        "action": "query",
-        "titles": page_title,
-        "prop": "revisions",
-        "rvprop": "content",
-        "rvslots": "main",
-        "redirects": 1,
-        "format": "json",
-    }
-    response = requests.get(API_URL, params=params, timeout=1000)
-    response.raise_for_status()
-    data = response.json()
-    pages = data.get("query", {}).get("pages", {})
-    if not pages:
-        raise ValueError("Page not found")
-    page = next(iter(pages.values()))
+@dataclass
+class WikiPage:
+    """Result of fetching a single title as part of a batch."""
+
+    title: str
+    resolved_title: str
+    text: Optional[str] = None
+    error: Optional[str] = None
+    revid: Optional[int] = None
+    timestamp: Optional[str] = None
+
+    @property
+    def redirected(self) -> bool:
+        return self.resolved_title != self.title
+
+
+class RateLimited(Exception):
+    """Raised when the API asks us to slow down (HTTP 429/503 or ``maxlag``)."""
+
+    def __init__(self, message: str, retry_after: float) -> None:
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class PageNotFound(ValueError):
+    """Raised when a wiki page is missing or has no content; not worth retrying."""
+
+
+def _retry_after(response: requests.Response, default: float) -> float:
+    try:
+        return float(response.headers.get("Retry-After", default))
+    except ValueError:
+        return default
+
+
+class WikiClient:
+    """Pooled, keep-alive HTTP client for the AoPS wiki API.
+
+    A single client is meant to be shared for a whole run so that every
+    request reuses the same TCP/TLS connections. ``api_url`` can point at a
+    local stand-in server for tests.
+
+    ``limiter`` is an optional object with a ``slot(url)`` context manager
+    (see :class:`crawler.CrawlLimiter`) that is held around every request.
+    ``maxlag`` is forwarded to MediaWiki so that it refuses requests while
+    its replicas are lagging; that and HTTP 429/503 raise :class:`RateLimited`.
+
+    ``recorder`` (an :class:`http_archive.ArchiveWriter`) captures every
+    response; ``replay`` (an :class:`http_archive.ArchiveReader`) serves
+    requests from a recorded archive without touching the network.
+
+    With a :class:`wiki_cache.WikiCache` attached, page bodies are only
+    downloaded when their revision moved; ``refresh`` bypasses the cache
+    lookup (fresh bodies are still written back). The cache is ignored while
+    recording or replaying, since a replay must issue exactly the recorded
+    requests whatever the state of the cache.
+    """
+
+    def __init__(
+        self,
+        api_url: str = API_URL,
+        *,
+        connect_timeout: float = 10.0,
+        read_timeout: float = 60.0,
+        pool_size: int = 10,
+        session: Optional[requests.Session] = None,
+        limiter: Any = None,
+        maxlag: Optional[int] = None,
+        cache: Optional[WikiCache] = None,
+        refresh: bool = False,
+        recorder: Any = None,
+        replay: Any = None,
+    ) -> None:
+        self.api_url = api_url
+        self.recorder = recorder
+        self.replay = replay
+        self.cache = cache if recorder is None and replay is None else None
+        self.refresh = refresh
+        self.limiter = limiter
+        self.maxlag = maxlag
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "Accept-Encoding": "gzip, deflate",
+                "Connection": "keep-alive",
+                "User-Agent": USER_AGENT,
+            }
+        )
+
+    def query(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Perform a GET against the API and return the decoded JSON body."""
+        if self.replay is not None:
+            return self.replay.get(params)
+        if self.maxlag is not None:
+            params = {**params, "maxlag": self.maxlag}
+        if self.limiter is not None:
+            with self.limiter.slot(self.api_url):
+                response = self._get(params)
+        else:
+            response = self._get(params)
+        if response.status_code in (429, 503):
+            raise RateLimited(
+                f"HTTP {response.status_code} from {self.api_url}",
+                _retry_after(response, 5.0),
+            )
+        response.raise_for_status()
+        data = response.json()
+        error = data.get("error") if isinstance(data, dict) else None
+        if error and error.get("code") == "maxlag":
+            raise RateLimited(error.get("info", "maxlag"), _retry_after(response, 5.0))
+        if self.recorder is not None:
+            self.recorder.add(params, response.content)
+        return data
+
+    def _get(self, params: Dict[str, Any]) -> requests.Response:
+        return self.session.get(self.api_url, params=params, timeout=self.timeout)
+
+    def close(self) -> None:
+        self.session.close()
+
+    def __enter__(self) -> "WikiClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+_default_client: Optional[WikiClient] = None
+
+
+def get_client() -> WikiClient:
+    """Return the process-wide client used when none is passed explicitly."""
+    global _default_client
+    if _default_client is None:
+        _default_client = WikiClient()
+    return _default_client
+
+
+def _revision_text(page: Dict[str, Any]) -> Optional[str]:
     revisions = page.get("revisions")
     if not revisions:
-        raise ValueError("No revisions found")
-    text = revisions[0].get("*") or revisions[0].get("slots", {}).get("main", {}).get(
+        return None
+    return revisions[0].get("*") or revisions[0].get("slots", {}).get("main", {}).get(
         "*"
     )
-    if text is None:
-        raise ValueError("Content not available")
-    return text
+
+
+def _query_pages(
+    client: WikiClient, titles: List[str], content: bool = True
+) -> Dict[str, WikiPage]:
+    params: Dict[str, Any] = {
+        "action": "query",
+        "titles": "|".join(titles),
+        "prop": "info|revisions",
+        "rvprop": "ids|timestamp",
+        "redirects": 1,
+        "format": "json",
+    }
+    if content:
+        params["rvprop"] += "|content"
+        params["rvslots"] = "main"
+    aliases: Dict[str, str] = {}
+    pages: Dict[str, Dict[str, Any]] = {}
+    cont: Dict[str, Any] = {}
+    while True:
+        data = client.query({**params, **cont})
+        query = data.get("query", {})
+        for entry in query.get("normalized", []) + query.get("redirects", []):
+            aliases[entry["from"]] = entry["to"]
+        for page in query.get("pages", {}).values():
+            # pages split across continuations only carry revisions once
+            known = pages.setdefault(page["title"], page)
+            if known is not page and page.get("revisions"):
+                known["revisions"] = page["revisions"]
+        if "continue" not in data:
+            break
+        cont = data["continue"]
+
+    result: Dict[str, WikiPage] = {}
+    for title in titles:
+        resolved = title
+        seen = {resolved}
+        while resolved in aliases:
+            resolved = aliases[resolved]
+            if resolved in seen:
+                break
+            seen.add(resolved)
+        entry = WikiPage(title=title, resolved_title=resolved)
+        page = pages.get(resolved)
+        if page is None or "missing" in page or "invalid" in page:
+            entry.error = "Page not found"
+        elif not page.get("revisions"):
+            entry.error = "No revisions found"
+        else:
+            revision = page["revisions"][0]
+            entry.revid = revision.get("revid", page.get("lastrevid"))
+            entry.timestamp = revision.get("timestamp")
+            if content:
+                entry.text = _revision_text(page)
+                if entry.text is None:
+                    entry.error = "Content not available"
+        result[title] = entry
+    return result
+
+
+def _fetch_batch(client: WikiClient, titles: List[str]) -> Dict[str, WikiPage]:
+    cache = client.cache
+    if cache is None:
+        return _query_pages(client, titles)
+
+    result: Dict[str, WikiPage] = {}
+    stale = titles
+    cached = {} if client.refresh else cache.revisions(titles)
+    if cached:
+        # cheap metadata-only lookup; bodies are fetched only for moved pages
+        stale = []
+        for title, meta in _query_pages(client, titles, content=False).items():
+            hit = None
+            if meta.error is None and meta.revid == cached.get(title):
+                hit = cache.get(title)
+            if hit is not None:
+                meta.text = hit.text
+                result[title] = meta
+            elif meta.error is not None:
+                result[title] = meta
+            else:
+                stale.append(title)
+    if stale:
+        for title, page in _query_pages(client, stale).items():
+            if page.text is not None:
+                cache.put(
+                    title,
+                    page.text,
+                    resolved_title=page.resolved_title,
+                    revid=page.revid,
+                    timestamp=page.timestamp,
+                )
+            result[title] = page
+    return {title: result[title] for title in titles}
+
+
+def fetch_pages_wikitext(
+    titles: Iterable[str], client: Optional[WikiClient] = None
+) -> Dict[str, WikiPage]:
+    """Fetch raw wikitext for many AoPS wiki pages using batched API requests.
+
+    Titles are sent ``API_TITLE_LIMIT`` at a time. The result maps every
+    requested title to a :class:`WikiPage`; pages that are missing or have no
+    content carry an ``error`` instead of aborting the whole batch, and
+    redirects/normalization are recorded in ``resolved_title``.
+    """
+    client = client or get_client()
+    unique = list(dict.fromkeys(titles))
+    result: Dict[str, WikiPage] = {}
+    for start in range(0, len(unique), API_TITLE_LIMIT):
+        result.update(_fetch_batch(client, unique[start : start + API_TITLE_LIMIT]))
+    return result
+
+
+def _page_text(page: WikiPage) -> str:
+    if page.error is not None:
+        raise PageNotFound(page.error)
+    assert page.text is not None
+    return page.text
+
+
+def fetch_page_wikitext(page_title: str, client: Optional[WikiClient] = None) -> str:
+    """Fetch raw wikitext of a page from AoPS wiki."""
+    return _page_text(fetch_pages_wikitext([page_title], client)[page_title])
 
 
 _HEADER_RE = re.compile(r"^==\s*([^=]+?)\s*==\s*$", re.MULTILINE)
-_PROBLEM_HEADER_RE = re.compile(r"^==\s*Problem\s*(\d+)\s*==\s*$", re.MULTILINE)
+_PROBLEM_TITLE_RE = re.compile(r"Problem\s*(\d+)")
+_SOLUTION_NUMBER_RE = re.compile(r"solution\s*(\d+)", re.IGNORECASE)
 _SOLUTION_LINK_RE = re.compile(r"\[\[[^\]]+\|Solution\]\]")
 _FILE_RE = re.compile(r"\[\[File:[^\]]+\]\]")
+_SIGNATURE_RE = re.compile(r"^~(.*)$", re.MULTILINE)
+
+
+@dataclass
+class Section:
+    """A level-2 section of a wiki page.
+
+    ``kind`` is one of ``"problem"``, ``"solution"``, ``"video"``,
+    ``"see_also"`` or ``"other"``. ``number`` is the problem number for
+    problem sections and the 1-based solution index for solutions; ``author``
+    is the last ``~signature`` found in a solution.
+    """
+
+    kind: str
+    title: str
+    body: str
+    number: Optional[int] = None
+    author: Optional[str] = None
+
+
+def iter_sections(
+    wikitext: str, kinds: Optional[Container[str]] = None
+) -> Iterator[Section]:
+    """Lazily yield the typed ``== ... ==`` sections of a page in one pass.
+
+    When ``kinds`` is given, other sections are skipped without being sliced
+    or cleaned.
+    """
+    solution_count = 0
+    header = None
+    for nxt in itertools.chain(_HEADER_RE.finditer(wikitext), (None,)):
+        if header is None:
+            header = nxt
+            continue
+        title = header.group(1).strip()
+        lowered = title.lower()
+        m = _PROBLEM_TITLE_RE.fullmatch(title)
+        if m:
+            kind = "problem"
+        elif "solution" in lowered:
+            kind = "video" if "video" in lowered else "solution"
+        elif lowered == "see also":
+            kind = "see_also"
+        else:
+            kind = "other"
+        if kind == "solution":
+            solution_count += 1
+        if kinds is None or kind in kinds:
+            end = nxt.start() if nxt is not None else len(wikitext)
+            body = wikitext[header.end() : end].strip()
+            if kind == "problem":
+                body = _FILE_RE.sub("", _SOLUTION_LINK_RE.sub("", body)).strip()
+                yield Section(kind, title, body, int(m.group(1)))
+            elif kind == "solution":
+                authors: List[str] = []
+                body = _SIGNATURE_RE.sub(
+                    lambda sig: authors.append(sig.group(1).strip()) or "",
+                    _FILE_RE.sub("", body),
+                ).strip()
+                number = _SOLUTION_NUMBER_RE.search(title)
+                yield Section(
+                    kind,
+                    title,
+                    body,
+                    int(number.group(1)) if number else solution_count,
+                    authors[-1] if authors else None,
+                )
+            else:
+                yield Section(kind, title, body)
+        header = nxt
 
 
 def parse_problems(wikitext: str) -> Dict[int, str]:
     """Parse wikitext and return mapping from problem number to cleaned wikitext."""
-    problems: Dict[int, str] = {}
-    headers = list(_HEADER_RE.finditer(wikitext))
-    for i, header in enumerate(headers):
-        title = header.group(1).strip()
-        m = _PROBLEM_HEADER_RE.match(header.group(0))
-        if not m:
-            continue
-        number = int(m.group(1))
-        end = headers[i + 1].start() if i + 1 < len(headers) else len(wikitext)
-        section = wikitext[header.end() : end].strip()
-        section = _SOLUTION_LINK_RE.sub("", section)
-        section = _FILE_RE.sub("", section)
-        section = section.strip()
-        problems[number] = section
-    return problems
+    return {
+        section.number: section.body
+        for section in iter_sections(wikitext, ("problem",))
+    }
 
 
 _ANSWER_RE = re.compile(r"^#\s*([A-E]|\d{1,3})\b", re.MULTILINE)
@@ -78,34 +396,21 @@ def parse_answers(wikitext: str) -> Dict[int, str]:
     return answers
 
 
-def parse_solutions(wikitext: str) -> str:
-    """Extract solution sections from a problem page wikitext."""
-    solutions: List[str] = []
-    headers = list(_HEADER_RE.finditer(wikitext))
-    for i, header in enumerate(headers):
-        title = header.group(1).strip().lower()
-        if "solution" in title and "video" not in title:
-            end = headers[i + 1].start() if i + 1 < len(headers) else len(wikitext)
-            section = wikitext[header.end() : end].strip()
-            section = _FILE_RE.sub("", section)
-            section = re.sub(r"^~.*$", "", section, flags=re.MULTILINE)
-            solutions.append(section.strip())
-    return "\n\n".join(filter(None, solutions))
-
+def parse_solution_list(wikitext: str) -> List[Section]:
+    """Return the non-empty, non-video solution sections of a problem page."""
+    return [
+        section for section in iter_sections(wikitext, ("solution",)) if section.body
+    ]
 
-from typing import List
 
+def parse_solutions(wikitext: str) -> str:
+    """Extract solution sections from a problem page wikitext."""
+    return "\n\n".join(section.body for section in parse_solution_list(wikitext))
 
-def download_contest(year: str | int, contest: str) -> List[Dict[str, Any]]:
-    """Download contest problems, answers, and solutions from AoPS.
 
-    The returned structure is a list where each item contains the fields:
-    ``ID``, ``Year``, ``ProblemNumber``, ``QuestionType``, ``Question``,
-    ``Answer``, ``Solution`` and ``source``.
-    """
+def contest_base(year: str | int, contest: str) -> Tuple[str, str, bool]:
+    """Return the wiki title prefix, ``Source`` label and AIME flag of a contest."""
     year_str = str(year)
-
-    # Determine base wiki page prefix based on contest type
     contest_clean = contest.strip()
     is_aime = contest_clean.upper().startswith("AIME")
     if is_aime:
@@ -122,45 +427,248 @@ def download_contest(year: str | int, contest: str) -> List[Dict[str, Any]]:
             source = "AMC10"
         else:
             source = "AMC12"
+    return base, source, is_aime
+
+
+_PAGE_TITLE_RE = re.compile(
+    r"^(?P<year>\d{4}(?: Fall)?) (?:AMC (?P<amc>\w+)|(?P<other>AIME(?: I{1,2})?|AHSME)) "
+    r"(?P<page>Problems|Answer Key)(?:/Problem (?P<number>\d+))?$"
+)
 
-    # Download main contest page with all problems
-    print("Fetching problems for", year_str, contest)
-    problems_title = f"{base} Problems"
-    problems_text = fetch_page_wikitext(problems_title)
-    problems = parse_problems(problems_text)
 
-    # Download answer key
-    print("Fetching answers for", year_str, contest)
+def parse_page_title(title: str) -> Optional[Tuple[str, str, str, Optional[int]]]:
+    """Map a wiki title back to ``(year, contest, kind, number)``.
+
+    ``kind`` is ``"problems"`` for the contest page, ``"answers"`` for the
+    answer key and ``"solution"`` for an individual problem page. Titles that
+    are not contest pages return ``None``.
+    """
+    m = _PAGE_TITLE_RE.match(title.replace("_", " ").strip())
+    if not m:
+        return None
+    contest = m.group("amc") or m.group("other")
+    if m.group("number") is not None:
+        if m.group("page") != "Problems":
+            return None
+        return m.group("year"), contest, "solution", int(m.group("number"))
+    kind = "problems" if m.group("page") == "Problems" else "answers"
+    return m.group("year"), contest, kind, None
+
+
+def iter_contest(
+    year: str | int,
+    contest: str,
+    client: Optional[WikiClient] = None,
+    *,
+    skip: Iterable[int] = (),
+    batch_size: int = API_TITLE_LIMIT,
+) -> Iterator[Dict[str, Any]]:
+    """Yield contest problem records as soon as their solution page arrives.
+
+    Problem numbers in ``skip`` are not fetched, which lets an interrupted
+    download resume where it stopped. Problem pages are requested
+    ``batch_size`` titles at a time.
+    """
+    year_str = str(year)
+    base, source, is_aime = contest_base(year_str, contest)
+
+    # Download the main contest page and the answer key in a single request
+    print("Fetching problems and answers for", year_str, contest)
+    problems_title = f"{base} Problems"
     answer_title = f"{base} Answer Key"
-    answers_text = fetch_page_wikitext(answer_title)
-    answers = parse_answers(answers_text)
-
-    result: List[Dict[str, Any]] = []
-    for number in sorted(problems):
-        print(f"Processing problem {number} for {year_str} {contest}")
-        question = problems[number]
-        problem_page = f"{base} Problems/Problem {number}"
-        sol_text = fetch_page_wikitext(problem_page)
-        solution = parse_solutions(sol_text)
-        pid = f"{year_str}-{contest}-{number}"
-        result.append(
-            {
-                "ID": pid,
+    index_pages = fetch_pages_wikitext([problems_title, answer_title], client)
+    problems = parse_problems(_page_text(index_pages[problems_title]))
+    answers = parse_answers(_page_text(index_pages[answer_title]))
+
+    # Download the remaining problem pages in as few batched requests as possible
+    print("Fetching solutions for", year_str, contest)
+    skipped = set(skip)
+    pending = [number for number in sorted(problems) if number not in skipped]
+    for start in range(0, len(pending), batch_size):
+        problem_pages = {
+            number: f"{base} Problems/Problem {number}"
+            for number in pending[start : start + batch_size]
+        }
+        solution_pages = fetch_pages_wikitext(problem_pages.values(), client)
+        for number, title in problem_pages.items():
+            print(f"Processing problem {number} for {year_str} {contest}")
+            page = solution_pages[title]
+            if page.error is not None:
+                raise PageNotFound(f"{page.title}: {page.error}")
+            yield {
+                "ID": f"{year_str}-{contest}-{number}",
                 "Year": year_str,
                 "ProblemNumber": number,
                 "QuestionType": "int3" if is_aime else "choice",
-                "Question": question,
+                "Question": problems[number],
                 "Answer": answers.get(number, ""),
-                "Solution": solution,
+                "Solution": parse_solutions(_page_text(page)),
                 "Source": source,
             }
-        )
+
+
+def download_contest(
+    year: str | int, contest: str, client: Optional[WikiClient] = None
+) -> List[Dict[str, Any]]:
+    """Download contest problems, answers, and solutions from AoPS.
+
+    The returned structure is a list where each item contains the fields:
+    ``ID``, ``Year``, ``ProblemNumber``, ``QuestionType``, ``Question``,
+    ``Answer``, ``Solution`` and ``source``.
+    """
+    return list(iter_contest(year, contest, client))
+
+
+def write_json(path: str, data: Any) -> None:
+    """Write ``data`` to ``path`` atomically so readers never see partial files."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def checkpoint_path(output_file: str) -> str:
+    return f"{output_file}.partial.jsonl"
+
+
+def _read_checkpoint(path: str) -> List[Dict[str, Any]]:
+    records: List[Dict[str, Any]] = []
+    if not os.path.exists(path):
+        return records
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # torn last line from an interrupted run
+    return records
+
+
+def download_contest_to(
+    output_file: str,
+    year: str | int,
+    contest: str,
+    client: Optional[WikiClient] = None,
+    *,
+    batch_size: int = API_TITLE_LIMIT,
+) -> List[Dict[str, Any]]:
+    """Download a contest into ``output_file`` with problem-level checkpoints.
+
+    Finished problems are appended to ``<output_file>.partial.jsonl`` as they
+    arrive. A rerun after a failure skips problems already in the checkpoint,
+    and the final JSON is written atomically before the checkpoint is removed.
+    """
+    partial = checkpoint_path(output_file)
+    done = {r["ProblemNumber"]: r for r in _read_checkpoint(partial)}
+    if done:
+        print(f"Resuming {year} {contest}: {len(done)} problems already fetched")
+    # rewrite the checkpoint so a torn tail line does not linger
+    with open(partial, "w", encoding="utf-8") as f:
+        for record in done.values():
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        for record in iter_contest(
+            year, contest, client, skip=done, batch_size=batch_size
+        ):
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            done[record["ProblemNumber"]] = record
+    result = [done[number] for number in sorted(done)]
+    write_json(output_file, result)
+    os.remove(partial)
     return result
 
 
+def update_contest(
+    records: List[Dict[str, Any]],
+    year: str | int,
+    contest: str,
+    *,
+    problems: bool = False,
+    answers: bool = False,
+    solutions: Iterable[int] = (),
+    client: Optional[WikiClient] = None,
+) -> List[int]:
+    """Refresh selected fields of previously downloaded records in place.
+
+    ``problems`` refetches every ``Question``, ``answers`` every ``Answer``
+    and ``solutions`` the ``Solution`` of the given problem numbers. Other
+    keys (labels, ``Provider``, ...) are left untouched. Returns the problem
+    numbers whose record actually changed.
+    """
+    base, _source, _is_aime = contest_base(year, contest)
+    solutions = sorted(set(solutions))
+    titles: List[str] = []
+    if problems:
+        titles.append(f"{base} Problems")
+    if answers:
+        titles.append(f"{base} Answer Key")
+    titles += [f"{base} Problems/Problem {n}" for n in solutions]
+    if not titles:
+        return []
+    pages = fetch_pages_wikitext(titles, client)
+
+    updates: Dict[int, Dict[str, str]] = {}
+    if problems:
+        for n, question in parse_problems(
+            _page_text(pages[f"{base} Problems"])
+        ).items():
+            updates.setdefault(n, {})["Question"] = question
+    if answers:
+        for n, answer in parse_answers(_page_text(pages[f"{base} Answer Key"])).items():
+            updates.setdefault(n, {})["Answer"] = answer
+    for n in solutions:
+        text = _page_text(pages[f"{base} Problems/Problem {n}"])
+        updates.setdefault(n, {})["Solution"] = parse_solutions(text)
+
+    changed: List[int] = []
+    for record in records:
+        fields = updates.get(record["ProblemNumber"], {})
+        if any(record.get(k) != v for k, v in fields.items()):
+            record.update(fields)
+            changed.append(record["ProblemNumber"])
+    return changed
+
+
+def fetch_recent_changes(
+    since: str, client: Optional[WikiClient] = None
+) -> Tuple[List[str], Optional[str]]:
+    """Return titles edited at or after ``since`` and the newest edit timestamp.
+
+    ``since`` is an ISO-8601 timestamp as used by MediaWiki
+    (``2024-01-01T00:00:00Z``). Only main-namespace edits and page creations
+    are considered.
+    """
+    client = client or get_client()
+    params: Dict[str, Any] = {
+        "action": "query",
+        "list": "recentchanges",
+        "rcstart": since,
+        "rcdir": "newer",
+        "rcnamespace": 0,
+        "rctype": "edit|new",
+        "rcprop": "title|timestamp",
+        "rclimit": "max",
+        "format": "json",
+    }
+    titles: Dict[str, None] = {}
+    latest: Optional[str] = None
+    cont: Dict[str, Any] = {}
+    while True:
+        data = client.query({**params, **cont})
+        for change in data.get("query", {}).get("recentchanges", []):
+            titles[change["title"]] = None
+            if latest is None or change["timestamp"] > latest:
+                latest = change["timestamp"]
+        if "continue" not in data:
+            break
+        cont = data["continue"]
+    return list(titles), latest
+
+
 if __name__ == "__main__":
     import argparse
-    import json
+
+    from http_archive import ArchiveReader, ArchiveWriter
 
     parser = argparse.ArgumentParser(
         description="Download AMC, AIME, or AHSME problems from AoPS"
@@ -171,11 +679,45 @@ if __name__ == "__main__":
         help="Contest name, e.g. '8', '10A', '10B', '12A', '12B', 'AIME I', 'AHSME'",
     )
     parser.add_argument("--output", help="Output JSON file")
+    parser.add_argument("--api-url", default=API_URL, help="MediaWiki API endpoint")
+    parser.add_argument("--connect-timeout", type=float, default=10.0)
+    parser.add_argument("--read-timeout", type=float, default=60.0)
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size-mb", type=int, default=512)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the cache")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Ignore cached pages and refetch"
+    )
+    parser.add_argument("--record", help="Append every API response to this archive")
+    parser.add_argument("--replay", help="Serve API requests from this archive")
 
     args = parser.parse_args()
-    problems = download_contest(args.year, args.contest)
-    if args.output:
-        with open(args.output, "w", encoding="utf-8") as f:
-            json.dump(problems, f, indent=2, ensure_ascii=False)
-    else:
-        print(json.dumps(problems, indent=2, ensure_ascii=False))
+    # recorded and replayed runs must issue the same requests, so neither
+    # uses the cache
+    cache = (
+        None
+        if args.no_cache or args.record or args.replay
+        else WikiCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    )
+    recorder = ArchiveWriter(args.record) if args.record else None
+    replay = ArchiveReader(args.replay) if args.replay else None
+    with WikiClient(
+        args.api_url,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        pool_size=args.pool_size,
+        cache=cache,
+        refresh=args.refresh,
+        recorder=recorder,
+        replay=replay,
+    ) as client:
+        try:
+            if args.output:
+                download_contest_to(args.output, args.year, args.contest, client)
+            else:
+                problems = download_contest(args.year, args.contest, client)
+                print(json.dumps(problems, indent=2, ensure_ascii=False))
+        finally:
+            if recorder is not None:
+                recorder.close()
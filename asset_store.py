@@ -0,0 +1,64 @@
+"""Content-addressed storage for rendered diagram files.
+
+Each distinct SVG is written once as ``<directory>/<sha256[:20]>.svg`` and
+referenced by URL, so a diagram used on many pages (or in both a problem page
+and ``index.html``) is downloaded and cached by the browser only once.
+Raster variants of a diagram are stored next to it as
+``<sha256[:20]>-<suffix>``, e.g. ``-<settings hash>-150.webp``.
+"""
+
+import gzip
+import hashlib
+import os
+from pathlib import Path
+
+
+def write_compressed(path: Path) -> None:
+    """Write a precompressed ``<path>.gz`` sibling for static file servers."""
+    tmp = path.with_name(f"{path.name}.gz.{os.getpid()}.tmp")
+    tmp.write_bytes(gzip.compress(path.read_bytes(), 9, mtime=0))
+    os.replace(tmp, path.with_name(path.name + ".gz"))
+
+
+class AssetStore:
+    """Write SVG assets to ``directory`` and return their URLs.
+
+    ``url_prefix`` is how pages refer to ``directory`` (``"assets/"`` or a
+    relative path such as ``"../../assets/"``). With ``compress`` a ``.gz``
+    sibling is written next to every asset.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike,
+        url_prefix: str = "assets/",
+        compress: bool = False,
+    ) -> None:
+        self.directory = Path(directory)
+        self.url_prefix = url_prefix
+        self.compress = compress
+
+    def url(self, svg: bytes, variants: dict[str, bytes] | None = None) -> str:
+        """Store ``svg`` and its ``variants`` (by suffix); return the SVG's URL."""
+        stem = hashlib.sha256(svg).hexdigest()[:20]
+        self._write(f"{stem}.svg", svg, self.compress)
+        for suffix, data in (variants or {}).items():
+            # PNG and WebP are compressed already
+            self._write(f"{stem}-{suffix}", data, False)
+        return f"{self.url_prefix}{stem}.svg"
+
+    def has_variants(self, svg: bytes, suffixes: list[str]) -> bool:
+        """Tell whether every variant of ``svg`` in ``suffixes`` is stored."""
+        stem = hashlib.sha256(svg).hexdigest()[:20]
+        return all((self.directory / f"{stem}-{s}").exists() for s in suffixes)
+
+    def _write(self, name: str, data: bytes, compress: bool) -> None:
+        path = self.directory / name
+        if not path.exists():
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{name}.{os.getpid()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        # an asset from an earlier build without --gzip has no .gz yet
+        if compress and not path.with_name(f"{name}.gz").exists():
+            write_compressed(path)
@@ -1,71 +1,319 @@
 ### Downloads all AMC problems automatically
 
-import time
-from aops_downloader import download_contest
+from aops_downloader import (
+    WikiClient,
+    download_contest_to,
+    fetch_recent_changes,
+    parse_page_title,
+    update_contest,
+    write_json,
+)
+from http_archive import ArchiveReader, ArchiveWriter
+from catalog import DEFAULT_TTL, Contest, load_catalog
+from crawler import CrawlJob, CrawlLimiter, CrawlReport, CrawlScheduler
+from wiki_cache import DEFAULT_CACHE_DIR, WikiCache
+from datetime import datetime, timedelta, timezone
 import os
 import json
 
-years = reversed(list(map(str, range(1983, 2026))) + ["2021 Fall"])
-contests = ["8", "10A", "10B", "12A", "12B"]
-
 amc_dir = "amc_problems"
 aime_dir = "aime_problems"
 ahsme_dir = "ahsme_problems"
+sync_state_file = "sync_state.json"
+# MediaWiki only keeps recent changes for $wgRCMaxAge (90 days by default)
+RC_MAX_AGE = timedelta(days=90)
+# seconds of replica lag at which the wiki should refuse our requests
+DEFAULT_MAXLAG = 5
 
 
-def resume_download():
-    for year in years:
-        year_int = int(str(year).split()[0])
-        contests_available = (
-            []
-            if year_int <= 2001
-            else (
-                ["10A", "10B", "12A", "12B"]
-                if "2021" in year
-                else ["8", "10A", "12A"] if "2025" in year else contests
-            )
-        )
-        aime = (
-            []
-            if "Fall" in year
-            else (["AIME I", "AIME II"] if year_int >= 2000 else ["AIME"])
-        )
-        contests_available = list(contests_available) + aime
-        if year_int <= 1999:
-            contests_available.append("AHSME")
-
-        for contest in contests_available:
-            c_upper = contest.upper()
-            if c_upper.startswith("AIME"):
-                base_dir = aime_dir
-            elif c_upper == "AHSME":
-                base_dir = ahsme_dir
-            else:
-                base_dir = amc_dir
-
-            contest_dir = os.path.join(base_dir, contest)
-            os.makedirs(contest_dir, exist_ok=True)
-            output_file = os.path.join(contest_dir, f"{year}-{contest}.json")
-            if not os.path.exists(output_file):
-                done = False
-                while not done:
-                    print(f"Downloading {year} {contest} problems...")
-                    try:
-                        problems = download_contest(year, contest)
-                    except Exception as e:
-                        print(f"Error downloading {year} {contest}: {e}")
-                        time.sleep(61)
-                        continue
-                    with open(output_file, "w", encoding="utf-8") as f:
-                        json.dump(problems, f, indent=2, ensure_ascii=False)
-                    print(f"Saved to {output_file}")
-                    done = True
-            else:
+def output_path(year: str, contest: str) -> str:
+    c_upper = contest.upper()
+    if c_upper.startswith("AIME"):
+        base_dir = aime_dir
+    elif c_upper == "AHSME":
+        base_dir = ahsme_dir
+    else:
+        base_dir = amc_dir
+    return os.path.join(base_dir, contest, f"{year}-{contest}.json")
+
+
+class StaleSyncState(Exception):
+    """Raised when the sync high-water mark predates the recent changes window."""
+
+
+def downloaded_contests() -> list[tuple[str, str]]:
+    """Return (year, contest) for every JSON file laid out by :func:`output_path`."""
+    found = []
+    for base_dir in (amc_dir, aime_dir, ahsme_dir):
+        if not os.path.isdir(base_dir):
+            continue
+        for contest in sorted(os.listdir(base_dir)):
+            suffix = f"-{contest}.json"
+            for name in sorted(os.listdir(os.path.join(base_dir, contest))):
+                if name.endswith(suffix):
+                    found.append((name[: -len(suffix)], contest))
+    return found
+
+
+def _download_job(client: WikiClient, year: str, contest: str, output_file: str):
+    def run() -> str:
+        print(f"Downloading {year} {contest} problems...")
+        os.makedirs(os.path.dirname(output_file), exist_ok=True)
+        # finished problems survive a failed attempt in the .partial.jsonl file
+        download_contest_to(output_file, year, contest, client)
+        print(f"Saved to {output_file}")
+        return output_file
+
+    return CrawlJob(f"{year} {contest}", run)
+
+
+def _throttle(client: WikiClient, rate: float, per_host: int, maxlag: int) -> None:
+    """Install the shared rate limiter and ``maxlag`` unless ``client`` has its own."""
+    if client.limiter is None:
+        client.limiter = CrawlLimiter(rate=rate, burst=2 * rate, per_host=per_host)
+    if client.maxlag is None:
+        client.maxlag = maxlag
+
+
+def resume_download(
+    client: WikiClient | None = None,
+    *,
+    contests: list[Contest] | None = None,
+    workers: int = 4,
+    rate: float = 5.0,
+    per_host: int = 4,
+    max_retries: int = 5,
+    catalog_ttl: float = DEFAULT_TTL,
+    maxlag: int = DEFAULT_MAXLAG,
+) -> CrawlReport:
+    """Download every contest whose output file does not exist yet.
+
+    ``contests`` defaults to the wiki's contest catalog (see
+    :func:`catalog.load_catalog`), so only pages that exist are scheduled.
+    Contests are fetched concurrently by a :class:`crawler.CrawlScheduler`.
+    All requests share one pooled client throttled by a global token bucket
+    (``rate`` requests per second) and at most ``per_host`` concurrent
+    requests per host, and send ``maxlag`` unless the client sets its own.
+    """
+    own_client = client is None
+    client = client or WikiClient(pool_size=max(workers, per_host))
+    _throttle(client, rate, per_host, maxlag)
+    try:
+        if contests is None:
+            contests = load_catalog(client, ttl=catalog_ttl, refresh=client.refresh)
+        jobs = []
+        for year, contest in contests:
+            output_file = output_path(year, contest)
+            if os.path.exists(output_file):
                 print(f"Already downloaded {year} {contest} problems. Skipping...")
+                continue
+            jobs.append(_download_job(client, year, contest, output_file))
+        report = CrawlScheduler(workers=workers, max_retries=max_retries).run(jobs)
+    finally:
+        if own_client:
+            client.close()
+    print(report.summary())
+    return report
+
+
+def _utc_timestamp(dt: datetime) -> str:
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def sync(
+    client: WikiClient | None = None,
+    state_file: str = sync_state_file,
+    *,
+    full: bool = False,
+    rate: float = 5.0,
+    per_host: int = 4,
+    maxlag: int = DEFAULT_MAXLAG,
+) -> dict[str, list[int]]:
+    """Apply wiki edits made since the last sync to the downloaded JSON files.
+
+    The high-water mark in ``state_file`` is the newest edit timestamp seen so
+    far. Changed titles are mapped back to (year, contest, page) and only the
+    affected fields of existing problem records are rebuilt. Returns a mapping
+    from rewritten file to the problem numbers that changed.
+
+    The wiki forgets changes older than ``RC_MAX_AGE``, so a mark older than
+    that raises :class:`StaleSyncState` instead of silently skipping the gap.
+    ``full`` rebuilds every field of every downloaded contest and then
+    starts over from the current time. Requests are throttled like those of
+    :func:`resume_download`.
+    """
+    state = {}
+    if os.path.exists(state_file):
+        with open(state_file, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    since = state.get("since")
+    now = _utc_timestamp(datetime.now(timezone.utc))
+    if since is None and not full:
+        write_json(state_file, {"since": now})
+        print(f"No sync state found; recorded {now} as the starting point.")
+        return {}
+    if not full:
+        started = datetime.strptime(since, "%Y-%m-%dT%H:%M:%SZ")
+        age = datetime.now(timezone.utc) - started.replace(tzinfo=timezone.utc)
+        if age > RC_MAX_AGE:
+            raise StaleSyncState(
+                f"Last sync at {since} is older than the wiki's recent changes "
+                f"window ({RC_MAX_AGE.days} days), so edits since then cannot be "
+                "listed. Run 'sync --full' to rebuild every downloaded contest."
+            )
+
+    own_client = client is None
+    client = client or WikiClient()
+    _throttle(client, rate, per_host, maxlag)
+    try:
+        plan: dict[tuple[str, str], dict] = {}
+        if full:
+            latest = now
+            for year, contest in downloaded_contests():
+                with open(output_path(year, contest), "r", encoding="utf-8") as f:
+                    numbers = {r["ProblemNumber"] for r in json.load(f)}
+                plan[year, contest] = {
+                    "problems": True,
+                    "answers": True,
+                    "solutions": numbers,
+                }
+        else:
+            titles, latest = fetch_recent_changes(since, client)
+            # nothing was edited since ``since``, and anything edited after
+            # ``now`` is listed next time, so a quiet run moves the mark too
+            latest = latest or now
+            if client.cache is not None and titles:
+                # redirects (e.g. AMC 10/12 shared problems) point at the edited page
+                titles += client.cache.titles_resolving_to(titles)
+            for title in titles:
+                parsed = parse_page_title(title)
+                if parsed is None:
+                    continue
+                year, contest, kind, number = parsed
+                entry = plan.setdefault(
+                    (year, contest),
+                    {"problems": False, "answers": False, "solutions": set()},
+                )
+                if kind == "solution":
+                    entry["solutions"].add(number)
+                else:
+                    entry[kind] = True
+
+        updated: dict[str, list[int]] = {}
+        failed = False
+        for (year, contest), entry in sorted(plan.items()):
+            path = output_path(year, contest)
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+            try:
+                changed = update_contest(records, year, contest, client=client, **entry)
+            except Exception as e:
+                print(f"Error syncing {year} {contest}: {e}")
+                failed = True
+                continue
+            if changed:
+                write_json(path, records)
+                updated[path] = changed
+                print(f"Updated problems {changed} in {path}")
+    finally:
+        if own_client:
+            client.close()
+
+    # keep the old mark on failure so the next sync retries those contests
+    if not failed:
+        write_json(state_file, {"since": latest})
+    return updated
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Download all AoPS contests")
+    parser.add_argument(
+        "mode",
+        nargs="?",
+        choices=["download", "sync"],
+        default="download",
+        help="'sync' only applies wiki edits made since the previous sync",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="With sync: rebuild every downloaded contest, e.g. after a long gap",
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests/second")
+    parser.add_argument("--per-host", type=int, default=4)
+    parser.add_argument("--max-retries", type=int, default=5)
+    parser.add_argument(
+        "--maxlag",
+        type=int,
+        default=DEFAULT_MAXLAG,
+        help="Replica lag (seconds) at which the wiki asks us to back off",
+    )
+    parser.add_argument(
+        "--catalog-ttl-hours",
+        type=float,
+        default=DEFAULT_TTL / 3600,
+        help="How long the discovered contest list is reused",
+    )
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size-mb", type=int, default=512)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the cache")
+    parser.add_argument(
+        "--refresh", action="store_true", help="Ignore cached pages and refetch"
+    )
+    parser.add_argument("--record", help="Append every API response to this archive")
+    parser.add_argument("--replay", help="Serve API requests from this archive")
+    args = parser.parse_args()
+
     for d in (amc_dir, aime_dir, ahsme_dir):
         os.makedirs(d, exist_ok=True)
-    resume_download()
-    print("All downloads completed.")
+    # recorded and replayed runs must issue the same requests, so neither
+    # uses the cache
+    cache = (
+        None
+        if args.no_cache or args.record or args.replay
+        else WikiCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    )
+    recorder = ArchiveWriter(args.record) if args.record else None
+    replay = ArchiveReader(args.replay) if args.replay else None
+    with WikiClient(
+        pool_size=max(args.workers, args.per_host),
+        maxlag=args.maxlag,
+        cache=cache,
+        refresh=args.refresh,
+        recorder=recorder,
+        replay=replay,
+    ) as client:
+        try:
+            if args.mode == "sync":
+                try:
+                    sync(
+                        client,
+                        full=args.full,
+                        rate=args.rate,
+                        per_host=args.per_host,
+                        maxlag=args.maxlag,
+                    )
+                except StaleSyncState as e:
+                    raise SystemExit(str(e))
+                print("Sync completed.")
+            else:
+                report = resume_download(
+                    client,
+                    workers=args.workers,
+                    rate=args.rate,
+                    per_host=args.per_host,
+                    max_retries=args.max_retries,
+                    catalog_ttl=args.catalog_ttl_hours * 3600,
+                    maxlag=args.maxlag,
+                )
+                if report.failures:
+                    raise SystemExit(1)
+                print("All downloads completed.")
+        finally:
+            if recorder is not None:
+                recorder.close()
@@ -0,0 +1,133 @@
+"""Build manifest for incremental rendering of a contest directory.
+
+``.manifest.json`` in an output directory records a fingerprint of the
+renderer (version, page templates, diagram settings), a hash of each
+problem's rendered inputs and a hash of the written ``index.html``. The
+index section HTML of every problem is kept next to it in
+``.sections.json`` so ``index.html`` can be reassembled without rendering
+unchanged problems again; that file is only read when the index changes.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List
+
+MANIFEST_FILE = ".manifest.json"
+SECTIONS_FILE = ".sections.json"
+# keys whose values end up in a problem's page or index section
+INPUT_KEYS = ("ID", "ProblemNumber", "Question", "Answer", "Solution")
+
+
+def input_hash(item: Dict) -> str:
+    data = json.dumps([item.get(k) for k in INPUT_KEYS], ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _write(path: Path, text: str) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class BuildManifest:
+    """What was last rendered into ``directory``, and from which inputs.
+
+    With ``reset`` every problem is considered stale, as after a change of
+    ``fingerprint``.
+    """
+
+    def __init__(
+        self, directory: str | os.PathLike, fingerprint: str, reset: bool = False
+    ) -> None:
+        self.directory = Path(directory)
+        self.fingerprint = fingerprint
+        self.problems: Dict[str, str] = {}
+        self.index = ""
+        self._sections: Dict[str, str] | None = None
+        path = self.directory / MANIFEST_FILE
+        if path.exists():
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.problems = data["problems"]
+            self.index = data["index"]
+            # a different renderer or template invalidates every output, but
+            # the known IDs are kept so removed problems are still pruned
+            if (
+                reset
+                or data.get("fingerprint") != fingerprint
+                or not (self.directory / SECTIONS_FILE).exists()
+            ):
+                self.problems = dict.fromkeys(self.problems, "")
+                self.index = ""
+                self._sections = {}
+
+    @property
+    def sections(self) -> Dict[str, str]:
+        if self._sections is None:
+            self._sections = {}
+            path = self.directory / SECTIONS_FILE
+            if path.exists():
+                with open(path, "r", encoding="utf-8") as f:
+                    self._sections = json.load(f)
+        return self._sections
+
+    def stale(self, items: Iterable[Dict]) -> List[Dict]:
+        """Return the problems whose inputs or page changed since the last build."""
+        return [
+            item
+            for item in items
+            if self.problems.get(item["ID"]) != input_hash(item)
+            or not (self.directory / f"{item['ID']}.html").exists()
+        ]
+
+    def prune(self, items: Iterable[Dict]) -> List[str]:
+        """Delete the pages of problems that are no longer in ``items``."""
+        current = {item["ID"] for item in items}
+        removed = sorted(pid for pid in self.problems if pid not in current)
+        for pid in removed:
+            (self.directory / f"{pid}.html").unlink(missing_ok=True)
+            (self.directory / f"{pid}.html.gz").unlink(missing_ok=True)
+            del self.problems[pid]
+            self.sections.pop(pid, None)
+        return removed
+
+    def update(self, item: Dict, section: str, complete: bool = True) -> None:
+        """Record a written problem; an incomplete one stays stale."""
+        self.problems[item["ID"]] = input_hash(item) if complete else ""
+        self.sections[item["ID"]] = section
+
+    def write_index(
+        self, items: Iterable[Dict], build: Callable[[List[str]], str]
+    ) -> bool:
+        """Rebuild ``index.html`` from the recorded sections if it changed."""
+        ordered = sorted(items, key=lambda d: d["ProblemNumber"])
+        html = build(
+            [self.sections[i["ID"]] for i in ordered if i["ID"] in self.sections]
+        )
+        digest = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        path = self.directory / "index.html"
+        if digest == self.index and path.exists():
+            return False
+        path.write_text(html, encoding="utf-8")
+        self.index = digest
+        return True
+
+    def save(self) -> None:
+        if self._sections is not None:
+            _write(
+                self.directory / SECTIONS_FILE,
+                json.dumps(self._sections, ensure_ascii=False),
+            )
+        _write(
+            self.directory / MANIFEST_FILE,
+            json.dumps(
+                {
+                    "fingerprint": self.fingerprint,
+                    "problems": self.problems,
+                    "index": self.index,
+                },
+                indent=2,
+            ),
+        )
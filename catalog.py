@@ -0,0 +1,89 @@
+"""Discover which contests exist on the AoPS wiki.
+
+Instead of guessing contests from hardcoded year rules, the catalog lists
+real ``<year> ... Problems`` pages in bulk via ``list=allpages`` and caches
+the result locally for a configurable TTL.
+"""
+
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aops_downloader import WikiClient, get_client, parse_page_title, write_json
+
+CATALOG_FILE = "contest_catalog.json"
+DEFAULT_TTL = 7 * 24 * 3600
+FIRST_YEAR = 1983
+
+Contest = Tuple[str, str]
+
+
+def _list_prefix(client: WikiClient, prefix: str) -> List[str]:
+    params: Dict[str, object] = {
+        "action": "query",
+        "list": "allpages",
+        "apprefix": prefix,
+        "apnamespace": 0,
+        "apfilterredir": "nonredirects",
+        "aplimit": "max",
+        "format": "json",
+    }
+    titles: List[str] = []
+    cont: Dict[str, object] = {}
+    while True:
+        data = client.query({**params, **cont})
+        titles += [p["title"] for p in data.get("query", {}).get("allpages", [])]
+        if "continue" not in data:
+            return titles
+        cont = data["continue"]
+
+
+def discover_contests(
+    client: Optional[WikiClient] = None, years: Optional[Iterable[int]] = None
+) -> List[Contest]:
+    """Return ``(year, contest)`` for every contest with a Problems page.
+
+    ``years`` defaults to every year from ``FIRST_YEAR`` through next year,
+    so newly published contests are picked up without code changes. Results
+    are sorted newest year first.
+    """
+    client = client or get_client()
+    if years is None:
+        years = range(FIRST_YEAR, datetime.now().year + 2)
+    found: Dict[Contest, None] = {}
+    for year in years:
+        for title in _list_prefix(client, f"{year} "):
+            parsed = parse_page_title(title)
+            if parsed is not None and parsed[2] == "problems":
+                found[(parsed[0], parsed[1])] = None
+    return sorted(found, key=lambda c: (-int(c[0].split()[0]), c[0], c[1]))
+
+
+def load_catalog(
+    client: Optional[WikiClient] = None,
+    path: str = CATALOG_FILE,
+    ttl: float = DEFAULT_TTL,
+    refresh: bool = False,
+) -> List[Contest]:
+    """Return the cached contest list, rediscovering it once ``ttl`` expires."""
+    if not refresh and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if time.time() - cached.get("fetched", 0) < ttl:
+            return [tuple(c) for c in cached["contests"]]
+    contests = discover_contests(client)
+    write_json(path, {"fetched": time.time(), "contests": contests})
+    return contests
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List contests on the AoPS wiki")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cache")
+    args = parser.parse_args()
+    with WikiClient() as client:
+        for year, contest in load_catalog(client, refresh=args.refresh):
+            print(f"{year}\t{contest}")
@@ -0,0 +1,369 @@
+"""SQLite-backed store for the downloaded problem corpus.
+
+The JSON tree under ``*_problems/`` stays the source of truth; this module
+imports it into a single WAL-mode database with indexes on source, year,
+subject and topic so corpus-wide queries do not have to walk and parse every
+file, and can export the database back to the same JSON layout.
+"""
+
+import json
+import os
+import sqlite3
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+DEFAULT_DB = "corpus.sqlite"
+
+# keys stored in dedicated columns; anything else is kept in ``extra``
+_COLUMNS = {
+    "ID": "id",
+    "Year": "year",
+    "ProblemNumber": "problem_number",
+    "QuestionType": "question_type",
+    "Question": "question",
+    "Answer": "answer",
+    "Solution": "solution",
+    "Source": "source",
+    "Provider": "provider",
+}
+_LIST_KEYS = {"Subjects": "problem_subjects", "Topics": "problem_topics"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS problems (
+    id TEXT PRIMARY KEY,
+    path TEXT NOT NULL REFERENCES files (path) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    contest TEXT,
+    year TEXT,
+    year_num INTEGER,
+    problem_number INTEGER,
+    question_type TEXT,
+    question TEXT,
+    answer TEXT,
+    solution TEXT,
+    source TEXT,
+    provider TEXT,
+    extra TEXT NOT NULL,
+    key_order TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS problem_subjects (
+    problem_id TEXT NOT NULL REFERENCES problems (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (problem_id, position)
+);
+CREATE TABLE IF NOT EXISTS problem_topics (
+    problem_id TEXT NOT NULL REFERENCES problems (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    PRIMARY KEY (problem_id, position)
+);
+CREATE INDEX IF NOT EXISTS problems_source_year ON problems (source, year_num);
+CREATE INDEX IF NOT EXISTS problems_year ON problems (year_num);
+CREATE INDEX IF NOT EXISTS problems_path ON problems (path, position);
+CREATE INDEX IF NOT EXISTS subjects_value ON problem_subjects (value, problem_id);
+CREATE INDEX IF NOT EXISTS topics_value ON problem_topics (value, problem_id);
+"""
+
+# facet -> (SQL listing its values with counts, WHERE clause selecting one value)
+_FACETS = {
+    "source": (
+        "SELECT source, COUNT(*) FROM problems WHERE source IS NOT NULL "
+        "GROUP BY source ORDER BY source",
+        "p.source = ?",
+    ),
+    "year": (
+        "SELECT year, COUNT(*) FROM problems WHERE year IS NOT NULL "
+        "GROUP BY year ORDER BY MAX(year_num) DESC, year",
+        "p.year = ?",
+    ),
+    "subject": (
+        "SELECT value, COUNT(*) FROM problem_subjects GROUP BY value ORDER BY value",
+        "p.id IN (SELECT problem_id FROM problem_subjects WHERE value = ?)",
+    ),
+    "topic": (
+        "SELECT value, COUNT(*) FROM problem_topics GROUP BY value ORDER BY value",
+        "p.id IN (SELECT problem_id FROM problem_topics WHERE value = ?)",
+    ),
+}
+FACETS = tuple(_FACETS)
+
+
+def iter_problem_files(root: str = ".") -> Iterator[str]:
+    """Yield every JSON file below the ``*_problems`` directories of ``root``."""
+    bases = sorted(
+        d
+        for d in os.listdir(root)
+        if d.endswith("_problems") and os.path.isdir(os.path.join(root, d))
+    )
+    for base in bases:
+        for dirpath, dirs, files in os.walk(os.path.join(root, base)):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(".json"):
+                    yield os.path.join(dirpath, name)
+
+
+def _contest_of(problem_id: str) -> Optional[str]:
+    parts = problem_id.split("-", 2)
+    return parts[1] if len(parts) == 3 else None
+
+
+def _year_num(year: Any) -> Optional[int]:
+    try:
+        return int(str(year).split()[0])
+    except (ValueError, IndexError):
+        return None
+
+
+class CorpusStore:
+    """Indexed SQLite view of the problem corpus."""
+
+    def __init__(self, path: str = DEFAULT_DB) -> None:
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA foreign_keys=ON")
+        self.db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "CorpusStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    # -- import -----------------------------------------------------------
+
+    def _insert(self, path: str, position: int, item: Dict[str, Any]) -> None:
+        pid = item["ID"]
+        columns = {col: item.get(key) for key, col in _COLUMNS.items()}
+        extra = {
+            k: v for k, v in item.items() if k not in _COLUMNS and k not in _LIST_KEYS
+        }
+        self.db.execute(
+            "INSERT OR REPLACE INTO problems (path, position, contest, year_num, "
+            "extra, key_order, "
+            + ", ".join(columns)
+            + ") VALUES ("
+            + ", ".join("?" * (6 + len(columns)))
+            + ")",
+            (
+                path,
+                position,
+                _contest_of(pid),
+                _year_num(item.get("Year")),
+                json.dumps(extra, ensure_ascii=False),
+                json.dumps(list(item)),
+                *columns.values(),
+            ),
+        )
+        for key, table in _LIST_KEYS.items():
+            self.db.execute(f"DELETE FROM {table} WHERE problem_id = ?", (pid,))
+            self.db.executemany(
+                f"INSERT INTO {table} VALUES (?, ?, ?)",
+                [(pid, i, v) for i, v in enumerate(item.get(key) or [])],
+            )
+
+    def import_file(self, path: str, root: str = ".") -> bool:
+        """Import one JSON file; returns ``False`` if it was already current."""
+        rel = os.path.relpath(path, root)
+        stat = os.stat(path)
+        row = self.db.execute(
+            "SELECT mtime_ns, size FROM files WHERE path = ?", (rel,)
+        ).fetchone()
+        if row == (stat.st_mtime_ns, stat.st_size):
+            return False
+        with open(path, "r", encoding="utf-8") as f:
+            items = json.load(f)
+        with self.db:
+            self.db.execute("DELETE FROM files WHERE path = ?", (rel,))
+            self.db.execute(
+                "INSERT INTO files VALUES (?, ?, ?)",
+                (rel, stat.st_mtime_ns, stat.st_size),
+            )
+            for position, item in enumerate(items):
+                self._insert(rel, position, item)
+        return True
+
+    def import_tree(self, root: str = ".") -> Tuple[int, int]:
+        """Sync the database with the JSON tree under ``root``.
+
+        Unchanged files (same mtime and size) are skipped and files that no
+        longer exist are dropped. Returns ``(imported, removed)`` file counts.
+        """
+        seen = set()
+        imported = 0
+        for path in iter_problem_files(root):
+            seen.add(os.path.relpath(path, root))
+            imported += self.import_file(path, root)
+        stale = [
+            p for (p,) in self.db.execute("SELECT path FROM files") if p not in seen
+        ]
+        with self.db:
+            self.db.executemany(
+                "DELETE FROM files WHERE path = ?", [(p,) for p in stale]
+            )
+        return imported, len(stale)
+
+    # -- export / query ---------------------------------------------------
+
+    def _records(
+        self, where: str = "", params: Iterable[Any] = ()
+    ) -> List[Dict[str, Any]]:
+        cols = ", ".join(f"p.{c}" for c in _COLUMNS.values())
+        rows = self.db.execute(
+            f"SELECT {cols}, p.extra, p.key_order FROM problems p {where}",
+            tuple(params),
+        ).fetchall()
+        if not rows:
+            return []
+        ids = [row[0] for row in rows]
+        lists: Dict[str, Dict[str, List[str]]] = {}
+        for key, table in _LIST_KEYS.items():
+            for chunk in range(0, len(ids), 500):
+                part = ids[chunk : chunk + 500]
+                for pid, value in self.db.execute(
+                    f"SELECT problem_id, value FROM {table} WHERE problem_id IN "
+                    f"({','.join('?' * len(part))}) ORDER BY problem_id, position",
+                    part,
+                ):
+                    lists.setdefault(pid, {}).setdefault(key, []).append(value)
+        records = []
+        for row in rows:
+            values = dict(zip(_COLUMNS, row))
+            values.update(json.loads(row[-2]))
+            values.update(lists.get(row[0], {}))
+            records.append({k: values.get(k, []) for k in json.loads(row[-1])})
+        return records
+
+    def query(
+        self,
+        *,
+        source: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        subject: Optional[str] = None,
+        topic: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Return problem records matching every given filter.
+
+        ``year_from``/``year_to`` are inclusive. Results are ordered by year
+        (newest first), contest and problem number.
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        if source is not None:
+            clauses.append("p.source = ?")
+            params.append(source)
+        if year_from is not None:
+            clauses.append("p.year_num >= ?")
+            params.append(year_from)
+        if year_to is not None:
+            clauses.append("p.year_num <= ?")
+            params.append(year_to)
+        if subject is not None:
+            clauses.append(
+                "p.id IN (SELECT problem_id FROM problem_subjects WHERE value = ?)"
+            )
+            params.append(subject)
+        if topic is not None:
+            clauses.append(
+                "p.id IN (SELECT problem_id FROM problem_topics WHERE value = ?)"
+            )
+            params.append(topic)
+        where = ("WHERE " + " AND ".join(clauses)) if clauses else ""
+        where += " ORDER BY p.year_num DESC, p.year, p.contest, p.problem_number"
+        if limit is not None:
+            where += " LIMIT ?"
+            params.append(limit)
+        return self._records(where, params)
+
+    def facet_values(self, facet: str) -> List[Tuple[str, int]]:
+        """Return ``(value, problem count)`` for every value of ``facet``.
+
+        ``facet`` is one of :data:`FACETS`; years are listed newest first,
+        other values alphabetically.
+        """
+        return self.db.execute(_FACETS[facet][0]).fetchall()
+
+    def iter_listing(self, facet: str, value: str) -> Iterator[Dict[str, Any]]:
+        """Yield short records (no question or solution) for one facet value.
+
+        Rows are read from a cursor, in the order of :meth:`query`, so a
+        listing of any size is never held in memory at once.
+        """
+        cursor = self.db.execute(
+            "SELECT p.id, p.path, p.year, p.source, p.problem_number, "
+            "(SELECT group_concat(value, ', ') FROM (SELECT value FROM "
+            "problem_subjects WHERE problem_id = p.id ORDER BY position)) "
+            "FROM problems p WHERE "
+            + _FACETS[facet][1]
+            + " ORDER BY p.year_num DESC, p.year, p.contest, p.problem_number",
+            (value,),
+        )
+        for pid, path, year, source, number, subjects in cursor:
+            yield {
+                "ID": pid,
+                "Path": path,
+                "Year": year,
+                "Source": source,
+                "ProblemNumber": number,
+                "Subjects": subjects.split(", ") if subjects else [],
+            }
+
+    def export_tree(self, root: str = ".") -> int:
+        """Write every stored file back to ``root`` in the original layout."""
+        from aops_downloader import write_json
+
+        paths = [p for (p,) in self.db.execute("SELECT path FROM files ORDER BY path")]
+        for rel in paths:
+            records = self._records("WHERE p.path = ? ORDER BY p.position", (rel,))
+            out = os.path.join(root, rel)
+            os.makedirs(os.path.dirname(out), exist_ok=True)
+            write_json(out, records)
+        return len(paths)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="SQLite corpus store")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="Import the *_problems JSON tree")
+    imp.add_argument("--root", default=".")
+    exp = sub.add_parser("export", help="Export back to the JSON layout")
+    exp.add_argument("--root", default=".")
+    q = sub.add_parser("query", help="Query problems")
+    q.add_argument("--source")
+    q.add_argument("--since", type=int, help="First year (inclusive)")
+    q.add_argument("--until", type=int, help="Last year (inclusive)")
+    q.add_argument("--subject")
+    q.add_argument("--topic")
+    q.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    with CorpusStore(args.db) as store:
+        if args.cmd == "import":
+            imported, removed = store.import_tree(args.root)
+            print(f"Imported {imported} files, removed {removed}")
+        elif args.cmd == "export":
+            print(f"Exported {store.export_tree(args.root)} files")
+        else:
+            for item in store.query(
+                source=args.source,
+                year_from=args.since,
+                year_to=args.until,
+                subject=args.subject,
+                topic=args.topic,
+                limit=args.limit,
+            ):
+                print(item["ID"])
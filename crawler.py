@@ -0,0 +1,194 @@
+"""Concurrent, rate-limited crawl scheduling for the AoPS wiki.
+
+The scheduler runs independent jobs (usually one per contest) on a thread
+pool. Every HTTP request made through a :class:`aops_downloader.WikiClient`
+whose ``limiter`` is a :class:`CrawlLimiter` first takes a token from a global
+token bucket and a slot from a per-host semaphore, so the crawl stays polite
+no matter how many workers are running.
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import urlparse
+
+from aops_downloader import PageNotFound, RateLimited
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing ``rate`` events per second.
+
+    Up to ``capacity`` tokens may accumulate, which permits short bursts.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: Optional[float] = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(
+            self.capacity, self._tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Block until a token is available and consume it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+class CrawlLimiter:
+    """Combine a global token bucket with per-host concurrency caps."""
+
+    def __init__(self, rate: float = 5.0, burst: float = 10.0, per_host: int = 4):
+        self.bucket = TokenBucket(rate, burst)
+        self.per_host = per_host
+        self._hosts: Dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = threading.BoundedSemaphore(self.per_host)
+            return self._hosts[host]
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        """Hold a per-host slot and a rate token for the duration of a request."""
+        semaphore = self._semaphore(urlparse(url).netloc)
+        with semaphore:
+            self.bucket.acquire()
+            yield
+
+
+@dataclass
+class CrawlJob:
+    """A named unit of work; ``run`` is called with no arguments."""
+
+    name: str
+    run: Callable[[], Any]
+
+
+@dataclass
+class CrawlResult:
+    job: CrawlJob
+    attempts: int
+    value: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class CrawlReport:
+    results: List[CrawlResult] = field(default_factory=list)
+
+    @property
+    def failures(self) -> List[CrawlResult]:
+        return [r for r in self.results if not r.ok]
+
+    def summary(self) -> str:
+        lines = [
+            f"{len(self.results) - len(self.failures)} succeeded, "
+            f"{len(self.failures)} failed"
+        ]
+        for r in self.failures:
+            lines.append(f"  {r.job.name}: {r.error!r} after {r.attempts} attempt(s)")
+        return "\n".join(lines)
+
+
+def backoff_delay(
+    attempt: int, base: float = 1.0, cap: float = 120.0, retry_after: float = 0.0
+) -> float:
+    """Exponential backoff with full jitter, never shorter than ``retry_after``."""
+    return max(retry_after, random.uniform(0, min(cap, base * 2**attempt)))
+
+
+class CrawlScheduler:
+    """Run crawl jobs concurrently with capped, jittered retries.
+
+    :class:`~aops_downloader.PageNotFound` is treated as permanent; every other
+    exception, including a truncated JSON body, is retried up to
+    ``max_retries`` times. A
+    :class:`~aops_downloader.RateLimited` error waits at least as long as the
+    server's ``Retry-After``/``maxlag`` hint.
+    """
+
+    def __init__(
+        self,
+        workers: int = 4,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 120.0,
+        *,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.workers = workers
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+
+    def _run_job(self, job: CrawlJob) -> CrawlResult:
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                value = job.run()
+            except PageNotFound as e:
+                print(f"Giving up on {job.name}: {e}")
+                return CrawlResult(
+                    job, attempt, error=e, elapsed=time.perf_counter() - start
+                )
+            except Exception as e:
+                if attempt > self.max_retries:
+                    print(f"Giving up on {job.name} after {attempt} attempts: {e}")
+                    return CrawlResult(
+                        job, attempt, error=e, elapsed=time.perf_counter() - start
+                    )
+                retry_after = e.retry_after if isinstance(e, RateLimited) else 0.0
+                delay = backoff_delay(
+                    attempt - 1, self.base_delay, self.max_delay, retry_after
+                )
+                print(f"Error in {job.name}: {e}; retrying in {delay:.1f}s")
+                self._sleep(delay)
+                continue
+            return CrawlResult(job, attempt, value, elapsed=time.perf_counter() - start)
+
+    def run(self, jobs: List[CrawlJob]) -> CrawlReport:
+        """Run all ``jobs`` and return their results in submission order."""
+        report = CrawlReport()
+        if not jobs:
+            return report
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            report.results = list(pool.map(self._run_job, jobs))
+        return report
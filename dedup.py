@@ -0,0 +1,185 @@
+"""Find near-duplicate problems across contests with MinHash and LSH.
+
+AMC 10 and AMC 12 share many problems, each stored (and labeled, rendered
+and indexed) once per contest. This module computes MinHash signatures of
+word 3-gram shingles over the normalized ``Question`` text for the whole
+corpus in a few vectorized NumPy passes, buckets them with banded LSH and
+verifies candidate pairs with the exact Jaccard similarity.
+
+The result is written to ``duplicates.json`` as ``{ID: {"canonical": ID,
+"similarity": float}}`` for every non-canonical member of a duplicate group;
+the canonical copy is the group's smallest ID. Use :func:`load_canonical`
+to read it back as a plain ``ID -> canonical ID`` map.
+"""
+
+import json
+import os
+import zlib
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from corpus_store import iter_problem_files
+from search import tokenize
+
+DUPLICATES_FILE = "duplicates.json"
+NUM_PERM = 128
+BANDS = 32
+SHINGLE = 3
+THRESHOLD = 0.8
+
+_CHUNK = 1 << 23  # hash values computed per NumPy pass
+
+
+def shingles(question: str) -> Set[int]:
+    """Return the 32-bit hashes of the word shingles of ``question``."""
+    tokens = tokenize(question)
+    if len(tokens) < SHINGLE:
+        grams = [" ".join(tokens)] if tokens else []
+    else:
+        grams = [" ".join(tokens[i : i + SHINGLE]) for i in range(len(tokens) - 2)]
+    return {zlib.crc32(g.encode("utf-8")) for g in grams}
+
+
+def minhash(docs: List[Set[int]], num_perm: int = NUM_PERM, seed: int = 1) -> Any:
+    """Return an ``(len(docs), num_perm)`` uint32 signature matrix.
+
+    Every document must have at least one shingle. All shingles are hashed
+    in one flat array and reduced per document with ``minimum.reduceat``.
+    """
+    # multiply-shift hashing: ((a * x + b) mod 2**64) >> 32 with odd ``a``
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 2**64, num_perm, dtype=np.uint64, endpoint=False) | 1
+    b = rng.integers(0, 2**64, num_perm, dtype=np.uint64, endpoint=False)
+    values = np.fromiter(
+        (h for doc in docs for h in doc), dtype=np.uint64, count=sum(map(len, docs))
+    )
+    offsets = np.cumsum([0] + [len(doc) for doc in docs[:-1]])
+    sig = np.empty((len(docs), num_perm), dtype=np.uint32)
+    step = max(1, _CHUNK // max(1, len(values)))
+    for start in range(0, num_perm, step):
+        stop = min(num_perm, start + step)
+        hashed = a[start:stop, None] * values
+        hashed += b[start:stop, None]
+        hashed >>= np.uint64(32)
+        sig[:, start:stop] = np.minimum.reduceat(hashed, offsets, axis=1).T
+    return sig
+
+
+def candidate_pairs(sig: Any, bands: int = BANDS) -> Set[Tuple[int, int]]:
+    """Return row pairs that share at least one LSH band bucket."""
+    rows = sig.shape[1] // bands
+    pairs: Set[Tuple[int, int]] = set()
+    for band in range(bands):
+        keys = np.ascontiguousarray(sig[:, band * rows : (band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        same = sorted_keys[1:] == sorted_keys[:-1]
+        if not same.any():
+            continue
+        # keep only rows whose key collides with a neighbour, then split
+        shared = np.zeros(len(keys), dtype=bool)
+        shared[1:] |= same
+        shared[:-1] |= same
+        keep = np.flatnonzero(shared)
+        starts = np.flatnonzero(~same[keep[1:] - 1]) + 1
+        for bucket in np.split(order[keep], starts):
+            members = sorted(bucket.tolist())
+            pairs.update(
+                (x, y) for i, x in enumerate(members) for y in members[i + 1 :]
+            )
+    return pairs
+
+
+def jaccard(x: Set[int], y: Set[int]) -> float:
+    return len(x & y) / len(x | y) if x or y else 1.0
+
+
+def find_duplicates(
+    items: Iterable[Dict[str, Any]], threshold: float = THRESHOLD
+) -> Dict[str, Dict[str, Any]]:
+    """Group near-duplicate questions and map each copy to its canonical ID."""
+    ids: List[str] = []
+    docs: List[Set[int]] = []
+    for item in items:
+        doc = shingles(item.get("Question", ""))
+        if doc:
+            ids.append(item["ID"])
+            docs.append(doc)
+    if len(docs) < 2:
+        return {}
+
+    parent = list(range(len(ids)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for x, y in candidate_pairs(minhash(docs)):
+        if jaccard(docs[x], docs[y]) >= threshold:
+            rx, ry = find(x), find(y)
+            if rx != ry:
+                parent[max(rx, ry)] = min(rx, ry)
+
+    groups: Dict[int, List[int]] = {}
+    for i in range(len(ids)):
+        groups.setdefault(find(i), []).append(i)
+    result: Dict[str, Dict[str, Any]] = {}
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        canonical = min(members, key=ids.__getitem__)
+        for i in members:
+            if i != canonical:
+                score = jaccard(docs[i], docs[canonical])
+                result[ids[i]] = {
+                    "canonical": ids[canonical],
+                    "similarity": round(score, 4),
+                }
+    return dict(sorted(result.items()))
+
+
+def dedup_tree(
+    root: str = ".", out: str = DUPLICATES_FILE, threshold: float = THRESHOLD
+) -> Dict[str, Dict[str, Any]]:
+    """Scan every ``*_problems`` file under ``root`` and write ``out``."""
+    from aops_downloader import write_json
+
+    def items() -> Iterable[Dict[str, Any]]:
+        for path in iter_problem_files(root):
+            with open(path, "r", encoding="utf-8") as f:
+                yield from json.load(f)
+
+    result = find_duplicates(items(), threshold)
+    write_json(out, result)
+    return result
+
+
+def load_canonical(path: str = DUPLICATES_FILE) -> Dict[str, str]:
+    """Return ``ID -> canonical ID`` for every known duplicate (may be empty)."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return {pid: entry["canonical"] for pid, entry in json.load(f).items()}
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Find near-duplicate problems")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--output", default=DUPLICATES_FILE)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    result = dedup_tree(args.root, args.output, args.threshold)
+    groups = len(set(entry["canonical"] for entry in result.values()))
+    print(
+        f"{len(result)} duplicates in {groups} groups "
+        f"({time.perf_counter() - start:.1f}s) -> {args.output}"
+    )
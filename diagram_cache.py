@@ -0,0 +1,145 @@
+"""Persistent cache of rendered Asymptote diagrams.
+
+Rendered SVGs are stored under ``blobs/<key[:2]>/<key>.svg`` where ``key`` is
+a content hash computed by :func:`renderer.diagram_key` from the diagram
+code, the bundled ``libs/*.asy`` modules, ``DIAGRAM_SIZE``, the
+``svg_minify`` settings and the versions of ``asy`` and ``pdftocairo``, so
+any change to an input simply misses. Rendering with thumbnails also stores
+each diagram's full-size PNG, as ``blobs/<key[:2]>/<key>.png``. A small
+SQLite index tracks sizes and access times for LRU eviction and remembers
+tool versions per binary (path, mtime, size) so computing a key never has
+to spawn a process.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_DIR = ".diagram_cache"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS diagrams (
+    key TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS diagrams_accessed ON diagrams (accessed);
+CREATE TABLE IF NOT EXISTS tools (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    version TEXT NOT NULL
+);
+"""
+
+
+class DiagramCache:
+    """On-disk SVG cache with a total size cap and LRU eviction.
+
+    A key is a hash for an SVG blob; other blobs carry their extension in
+    the key, e.g. ``"<hash>.png"``.
+    """
+
+    def __init__(
+        self,
+        directory: str | os.PathLike = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        (self.directory / "blobs").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # render-corpus workers share one index; WAL lets them read while
+        # another writes, and the timeout waits out the remaining locks
+        self._db = sqlite3.connect(
+            self.directory / "index.sqlite", timeout=30, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def _blob_path(self, key: str) -> Path:
+        name = key if "." in key else f"{key}.svg"
+        return self.directory / "blobs" / key[:2] / name
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            try:
+                data = self._blob_path(key).read_bytes()
+            except FileNotFoundError:
+                self._db.execute("DELETE FROM diagrams WHERE key = ?", (key,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            try:
+                self._db.execute(
+                    "UPDATE diagrams SET accessed = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                self._db.commit()
+            except sqlite3.OperationalError:
+                # a stale access time only affects eviction order
+                self._db.rollback()
+            self.hits += 1
+        return data
+
+    def put(self, key: str, svg: bytes) -> None:
+        path = self._blob_path(key)
+        with self._lock:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(svg)
+            os.replace(tmp, path)
+            self._db.execute(
+                "INSERT OR REPLACE INTO diagrams VALUES (?, ?, ?)",
+                (key, len(svg), time.time()),
+            )
+            self._evict()
+            self._db.commit()
+
+    def tool_version(self, path: str) -> Optional[str]:
+        """Return the remembered version of the binary at ``path``, if current."""
+        stat = os.stat(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT version FROM tools WHERE path = ? AND mtime_ns = ? AND size = ?",
+                (path, stat.st_mtime_ns, stat.st_size),
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_tool_version(self, path: str, version: str) -> None:
+        stat = os.stat(path)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO tools VALUES (?, ?, ?, ?)",
+                (path, stat.st_mtime_ns, stat.st_size, version),
+            )
+            self._db.commit()
+
+    def total_bytes(self) -> int:
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM diagrams"
+        ).fetchone()[0]
+
+    def _evict(self) -> None:
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT key, size FROM diagrams ORDER BY accessed ASC"
+        ).fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM diagrams WHERE key = ?", (key,))
+            self._blob_path(key).unlink(missing_ok=True)
+            total -= size
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
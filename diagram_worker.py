@@ -0,0 +1,179 @@
+"""Bounded, fault-isolated execution of the diagram tools.
+
+:func:`run_limited` runs ``asy`` or ``pdftocairo`` in a new process group
+with a wall-clock timeout and an address-space limit. On timeout the whole
+group is killed, including the LaTeX and Ghostscript children ``asy``
+starts, so a pathological figure costs at most the limit. A failed figure
+becomes a :class:`DiagramError` that the renderer replaces with
+:data:`PLACEHOLDER_SVG`; every rendered or failed figure is described by a
+:class:`DiagramRecord` for the end-of-run report.
+"""
+
+import hashlib
+import os
+import re
+import signal
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, Iterable, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+DIAGRAM_TIMEOUT = 60.0  # seconds per figure
+DIAGRAM_MEMORY = 2 * 1024 * 1024 * 1024  # bytes of address space per tool run
+SLOW_DIAGRAM = 10.0  # seconds; figures at least this slow are reported
+
+PLACEHOLDER_SVG = (
+    b'<svg xmlns="http://www.w3.org/2000/svg" width="300px" height="300px" '
+    b'viewBox="0 0 300 300"><rect x="1" y="1" width="298" height="298" '
+    b'fill="#f4f4f4" stroke="#bbb" stroke-dasharray="6 4"/><text x="150" '
+    b'y="155" font-family="sans-serif" font-size="16" text-anchor="middle" '
+    b'fill="#777">Diagram unavailable</text></svg>'
+)
+
+_MEMORY_RE = re.compile(
+    r"out of memory|bad_alloc|cannot allocate|memory exhausted|MemoryError",
+    re.IGNORECASE,
+)
+
+
+def _kill_group(proc: subprocess.Popen) -> None:
+    try:
+        if hasattr(os, "killpg"):
+            os.killpg(proc.pid, signal.SIGKILL)
+        else:
+            proc.kill()
+    except ProcessLookupError:
+        pass
+
+
+def run_limited(
+    command: List[str],
+    cwd: Optional[str] = None,
+    check: bool = False,
+    timeout: Optional[float] = DIAGRAM_TIMEOUT,
+    memory: Optional[int] = DIAGRAM_MEMORY,
+    progress: Optional[Callable[[], object]] = None,
+) -> subprocess.CompletedProcess:
+    """Like :func:`subprocess.run` with captured output, but bounded.
+
+    With ``progress`` the ``timeout`` only counts while ``progress()`` stays
+    unchanged (it is polled about once a second), so a batch of figures may
+    run as long as each one finishes in time. Raises
+    :class:`subprocess.TimeoutExpired` once the process group has been
+    killed, and :class:`subprocess.CalledProcessError` with ``check``.
+    """
+    proc = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        start_new_session=True,
+    )
+    if memory and resource is not None and hasattr(resource, "prlimit"):
+        # applied right after the start; anything the tool spawns inherits it
+        try:
+            resource.prlimit(proc.pid, resource.RLIMIT_AS, (memory, memory))
+        except (OSError, ValueError):
+            pass
+    poll = timeout if progress is None or timeout is None else min(timeout, 1.0)
+    state = progress() if progress is not None else None
+    changed = time.monotonic()
+    try:
+        while True:
+            try:
+                stdout, stderr = proc.communicate(timeout=poll)
+                break
+            except subprocess.TimeoutExpired:
+                if progress is not None and progress() != state:
+                    state, changed = progress(), time.monotonic()
+                elif progress is None or time.monotonic() - changed >= timeout:
+                    raise
+    except subprocess.TimeoutExpired:
+        _kill_group(proc)
+        stdout, stderr = proc.communicate()
+        raise subprocess.TimeoutExpired(command, timeout, stdout, stderr)
+    except BaseException:
+        _kill_group(proc)
+        proc.wait()
+        raise
+    if check and proc.returncode:
+        raise subprocess.CalledProcessError(proc.returncode, command, stdout, stderr)
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+
+
+def _text(output) -> str:
+    if isinstance(output, bytes):
+        output = output.decode("utf-8", "replace")
+    return output or ""
+
+
+class DiagramError(Exception):
+    """A figure that could not be rendered.
+
+    ``kind`` is ``"timeout"``, ``"memory"`` or ``"error"``; ``message`` is
+    the last line asy or pdftocairo printed.
+    """
+
+    def __init__(self, kind: str, message: str) -> None:
+        super().__init__(f"{kind}: {message}" if message else kind)
+        self.kind = kind
+        self.message = message
+
+    @classmethod
+    def from_exception(cls, e: subprocess.SubprocessError) -> "DiagramError":
+        if isinstance(e, subprocess.TimeoutExpired):
+            return cls("timeout", f"killed after {e.timeout:g}s")
+        output = _text(getattr(e, "stderr", None)) or _text(getattr(e, "stdout", None))
+        lines = output.strip().splitlines()
+        message = lines[-1] if lines else str(e)
+        return cls("memory" if _MEMORY_RE.search(output) else "error", message)
+
+
+@dataclass
+class DiagramRecord:
+    """What happened to one newly rendered figure."""
+
+    code: str
+    seconds: float = 0.0
+    raw_bytes: int = 0  # SVG from pdftocairo
+    bytes: int = 0  # after svg_minify
+    error: Optional[str] = None  # DiagramError.kind
+    message: str = ""
+    owner: str = ""  # ID of a problem that shows the figure
+
+    @property
+    def digest(self) -> str:
+        return hashlib.sha256(self.code.encode("utf-8")).hexdigest()[:12]
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["digest"] = self.digest
+        return data
+
+
+def diagram_summary(
+    records: Iterable[DiagramRecord], slow: float = SLOW_DIAGRAM, top: int = 10
+) -> str:
+    """Summarise the failed figures and the ``top`` figures slower than ``slow``."""
+    records = list(records)
+    failed = [r for r in records if r.error]
+    slowest = sorted(
+        (r for r in records if r.seconds >= slow and not r.error),
+        key=lambda r: -r.seconds,
+    )[:top]
+    lines = [
+        f"Diagrams: {len(records)} rendered, {len(failed)} failed, "
+        f"{sum(r.seconds >= slow for r in records)} took {slow:g}s or more"
+    ]
+    lines += [
+        f"  failed {r.owner or '?'} [{r.digest}] {r.error} after {r.seconds:.1f}s: "
+        f"{r.message}"
+        for r in sorted(failed, key=lambda r: (r.owner, r.digest))
+    ]
+    lines += [f"  slow {r.owner or '?'} [{r.digest}] {r.seconds:.1f}s" for r in slowest]
+    return "\n".join(lines)
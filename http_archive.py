@@ -0,0 +1,249 @@
+"""Record/replay archive of wiki API responses for offline runs.
+
+An archive is one append-only data file holding zlib-compressed response
+bodies plus a sorted ``.idx`` file of fixed-width ``(sha1(key), offset,
+length)`` entries. Readers ``mmap`` both files and binary-search the index,
+so opening even a full-corpus archive costs almost nothing.
+
+Attach an :class:`ArchiveWriter` to a :class:`aops_downloader.WikiClient` as
+``recorder`` to capture every response, or an :class:`ArchiveReader` as
+``replay`` to serve requests from the archive with no network access.
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Dict, Iterator, Tuple
+from urllib.parse import urlencode
+
+MAGIC = b"MPHA\x00\x01\n\x00"
+INDEX_MAGIC = b"MPHI\x00\x01\n\x00"
+_RECORD = struct.Struct(">II")  # key length, body length
+_ENTRY = struct.Struct(">20sQI")  # sha1(key), record offset, record length
+_INDEX_HEADER = struct.Struct(">8sQI")  # magic, data file size, entry count
+# parameters that do not change the response content
+_IGNORED_PARAMS = {"maxlag"}
+
+
+class ArchiveMiss(ValueError):
+    """Raised when replaying a request that was never recorded."""
+
+
+def request_key(params: Dict[str, Any]) -> str:
+    """Return a canonical key for an API request."""
+    items = sorted((k, str(v)) for k, v in params.items() if k not in _IGNORED_PARAMS)
+    return urlencode(items)
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.sha1(key.encode("utf-8")).digest()
+
+
+def _scan(path: str) -> Iterator[Tuple[str, int, int]]:
+    """Yield ``(key, offset, length)`` for every complete record in ``path``."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a response archive")
+        offset = len(MAGIC)
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            key_len, body_len = _RECORD.unpack(header)
+            key = f.read(key_len)
+            f.seek(body_len, os.SEEK_CUR)
+            length = _RECORD.size + key_len + body_len
+            if len(key) < key_len or f.tell() > os.path.getsize(path):
+                return  # truncated tail from an interrupted recording
+            yield key.decode("utf-8"), offset, length
+            offset += length
+
+
+def _write_index(path: str, entries: Dict[bytes, Tuple[int, int]], size: int) -> None:
+    tmp = f"{path}.idx.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_INDEX_HEADER.pack(INDEX_MAGIC, size, len(entries)))
+        for digest in sorted(entries):
+            f.write(_ENTRY.pack(digest, *entries[digest]))
+    os.replace(tmp, f"{path}.idx")
+
+
+class ArchiveWriter:
+    """Append API responses to an archive; later records win for equal keys."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[bytes, Tuple[int, int]] = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            end = len(MAGIC)
+            for key, offset, length in _scan(path):
+                self._entries[_digest(key)] = (offset, length)
+                end = offset + length
+            self._file = open(path, "r+b")
+            self._file.truncate(end)
+            self._file.seek(end)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(MAGIC)
+
+    def add(self, params: Dict[str, Any], body: bytes) -> None:
+        key = request_key(params).encode("utf-8")
+        packed = zlib.compress(body, 6)
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(_RECORD.pack(len(key), len(packed)) + key + packed)
+            self._entries[hashlib.sha1(key).digest()] = (
+                offset,
+                _RECORD.size + len(key) + len(packed),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.flush()
+            size = self._file.tell()
+            self._file.close()
+            _write_index(self.path, self._entries, size)
+
+    def __enter__(self) -> "ArchiveWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class ArchiveReader:
+    """Serve recorded responses from a memory-mapped archive."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        size = os.path.getsize(path)
+        index_path = f"{path}.idx"
+        valid = False
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                magic, indexed_size, _count = _INDEX_HEADER.unpack(
+                    f.read(_INDEX_HEADER.size)
+                )
+            valid = magic == INDEX_MAGIC and indexed_size == size
+        if not valid:
+            entries = {_digest(k): (o, n) for k, o, n in _scan(path)}
+            _write_index(path, entries, size)
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        with open(index_path, "rb") as f:
+            self._index = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._count = _INDEX_HEADER.unpack_from(self._index)[2]
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _entry(self, i: int) -> Tuple[bytes, int, int]:
+        return _ENTRY.unpack_from(self._index, _INDEX_HEADER.size + i * _ENTRY.size)
+
+    def _record(self, offset: int) -> Tuple[str, bytes]:
+        key_len, body_len = _RECORD.unpack_from(self._data, offset)
+        start = offset + _RECORD.size
+        key = self._data[start : start + key_len].decode("utf-8")
+        body = zlib.decompress(self._data[start + key_len : start + key_len + body_len])
+        return key, body
+
+    def get_raw(self, params: Dict[str, Any]) -> bytes:
+        key = request_key(params)
+        digest = _digest(key)
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(mid)[0] < digest:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            found, offset, _length = self._entry(lo)
+            if found == digest:
+                stored_key, body = self._record(offset)
+                if stored_key == key:
+                    return body
+        raise ArchiveMiss(f"Request not in archive: {key}")
+
+    def get(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        return json.loads(self.get_raw(params))
+
+    def responses(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield ``(key, decoded JSON)`` for every recorded request."""
+        for i in range(self._count):
+            _digest_, offset, _length = self._entry(i)
+            key, body = self._record(offset)
+            yield key, json.loads(body)
+
+    def close(self) -> None:
+        self._data.close()
+        self._index.close()
+
+    def __enter__(self) -> "ArchiveReader":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+def benchmark_parsers(path: str) -> Tuple[Dict[str, float], int]:
+    """Parse every recorded page with the downloader parsers and time them.
+
+    Returns seconds spent per stage and the number of pages parsed.
+    """
+    import time
+
+    from aops_downloader import parse_answers, parse_problems, parse_solutions
+
+    stages = ["load", "parse_problems", "parse_answers", "parse_solutions"]
+    timings = dict.fromkeys(stages, 0.0)
+    start = time.perf_counter()
+    with ArchiveReader(path) as reader:
+        texts = []
+        for _key, data in reader.responses():
+            for page in data.get("query", {}).get("pages", {}).values():
+                for rev in page.get("revisions", [])[:1]:
+                    text = rev.get("*") or rev.get("slots", {}).get("main", {}).get("*")
+                    if text is not None:
+                        texts.append((page["title"], text))
+    timings["load"] = time.perf_counter() - start
+    for title, text in texts:
+        if "/Problem " in title:
+            stage, func = "parse_solutions", parse_solutions
+        elif title.endswith("Answer Key"):
+            stage, func = "parse_answers", parse_answers
+        else:
+            stage, func = "parse_problems", parse_problems
+        t0 = time.perf_counter()
+        func(text)
+        timings[stage] += time.perf_counter() - t0
+    return timings, len(texts)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Inspect a recorded API archive")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    ls_p = sub.add_parser("list", help="List recorded requests")
+    ls_p.add_argument("archive")
+    bench_p = sub.add_parser("bench", help="Time the parsers over all pages")
+    bench_p.add_argument("archive")
+    args = parser.parse_args()
+
+    if args.cmd == "list":
+        with ArchiveReader(args.archive) as reader:
+            for key, _data in reader.responses():
+                print(key)
+    elif args.cmd == "bench":
+        timings, pages = benchmark_parsers(args.archive)
+        print(f"{pages} pages")
+        for stage, seconds in timings.items():
+            print(f"{stage:>16}: {seconds * 1000:.1f} ms")
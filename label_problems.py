@@ -5,6 +5,9 @@ label_problems.py
 Reads every JSON file in folders matching "*_problems", uses GPT-4.1 with
 Structured Outputs to label each problem with 'subjects' and 'topics', and
 writes the updated JSON back in-place.
+
+Problems listed in duplicates.json (see dedup.py) reuse the labels of any
+already-labeled copy instead of calling the API again.
 """
 
 import os
@@ -14,6 +17,8 @@ from dotenv import load_dotenv
 from tqdm import tqdm
 from openai import OpenAI
 
+from dedup import load_canonical
+
 # 1) Load API key from .env or environment
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
@@ -110,20 +115,31 @@ def label_problem(question: str) -> dict:
     return json.loads(raw)
 
 
-def process_file(path: str) -> None:
-    """Load a JSON file, label each problem, and overwrite it."""
+def process_file(path: str, canonical: dict = None, known: dict = None) -> None:
+    """Load a JSON file, label each problem, and overwrite it.
+
+    ``canonical`` maps duplicate IDs to their canonical ID and ``known``
+    holds labels by canonical ID; both are shared across files.
+    """
+    canonical = canonical or {}
+    known = {} if known is None else known
     with open(path, "r") as f:
         problems = json.load(f)
 
     for idx, prob in enumerate(problems, 1):
+        key = canonical.get(prob["ID"], prob["ID"])
         # skip if already labeled
         if "Subjects" in prob and "Topics" in prob:
             continue
 
-        labels = label_problem(prob["Question"])
+        if key in known:
+            labels = known[key]
+            print(f"  ↳ Reused labels of {key} for problem {idx}/{len(problems)}")
+        else:
+            labels = known[key] = label_problem(prob["Question"])
+            print(f"  ↳ Labeled problem {idx}/{len(problems)}")
         prob["Subjects"] = labels["subjects"]
         prob["Topics"] = labels["topics"]
-        print(f"  ↳ Labeled problem {idx}/{len(problems)}")
 
     # write back
     with open(path, "w") as f:
@@ -163,9 +179,21 @@ def main():
     # Sort according to our custom key
     json_paths.sort(key=sort_key)
 
+    canonical = load_canonical()
+    known = {}
+    # collect existing labels first so duplicates in earlier files reuse them
+    for path in json_paths:
+        with open(path, "r") as f:
+            for prob in json.load(f):
+                if "Subjects" in prob and "Topics" in prob:
+                    key = canonical.get(prob["ID"], prob["ID"])
+                    known.setdefault(
+                        key, {"subjects": prob["Subjects"], "topics": prob["Topics"]}
+                    )
+
     print(f"Found {len(json_paths)} JSON files under '*_problems' folders.\n")
     for path in tqdm(json_paths, desc="Processing files"):
-        process_file(path)
+        process_file(path, canonical, known)
 
 
 if __name__ == "__main__":
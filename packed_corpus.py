@@ -0,0 +1,267 @@
+"""Compact memory-mapped binary corpus format.
+
+A packed corpus is a single file::
+
+    header | fixed-width record table | ID index | string heap
+
+Every record stores ``ProblemNumber`` inline and an ``(offset, length)``
+pair into the string heap for each text field. Identical strings (``Source``,
+``Year``, ...) are stored once. The ID index lists record numbers sorted by
+``ID`` for binary-search lookups. Opening a corpus only maps the file; text is
+decoded when a field of a :class:`PackedRecord` is actually read.
+"""
+
+import json
+import mmap
+import os
+import struct
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+MAGIC = b"MPPC\x00\x01\n\x00"
+# magic, record count, record table offset, index offset, heap offset
+_HEADER = struct.Struct("<8sIQQQ")
+_MISSING = 0xFFFFFFFF
+_LIST_SEP = "\x1f"
+
+# JSON key -> attribute name, in record-table order
+FIELDS = {
+    "ID": "id",
+    "Year": "year",
+    "QuestionType": "question_type",
+    "Question": "question",
+    "Answer": "answer",
+    "Solution": "solution",
+    "Source": "source",
+    "Provider": "provider",
+    "Subjects": "subjects",
+    "Topics": "topics",
+}
+_LIST_FIELDS = {"Subjects", "Topics"}
+# trailing slots: source file path and JSON of any other keys
+_EXTRA_SLOTS = 2
+_RECORD = struct.Struct("<i" + "II" * (len(FIELDS) + _EXTRA_SLOTS))
+_INDEX_ENTRY = struct.Struct("<I")
+
+
+class _Field:
+    """Descriptor decoding one heap string of a record on access."""
+
+    def __init__(self, slot: int, is_list: bool = False) -> None:
+        self.slot = slot
+        self.is_list = is_list
+
+    def __get__(self, record: "PackedRecord", owner: type) -> Any:
+        if record is None:
+            return self
+        text = record._corpus._string(record._row, self.slot)
+        if text is None or not self.is_list:
+            return text
+        return text.split(_LIST_SEP) if text else []
+
+
+class PackedRecord:
+    """Lazy view of one problem; text fields decode only when read."""
+
+    __slots__ = ("_corpus", "_row")
+
+    def __init__(self, corpus: "PackedCorpus", row: int) -> None:
+        self._corpus = corpus
+        self._row = row
+
+    @property
+    def problem_number(self) -> int:
+        return self._corpus._number(self._row)
+
+    path = _Field(len(FIELDS))
+
+    @property
+    def extra(self) -> Dict[str, Any]:
+        raw = self._corpus._string(self._row, len(FIELDS) + 1)
+        return json.loads(raw) if raw else {}
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "ProblemNumber":
+            return self.problem_number
+        if key in FIELDS:
+            value = getattr(self, FIELDS[key])
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self.extra[key]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Decode every field into a plain problem dict."""
+        item: Dict[str, Any] = {"ProblemNumber": self.problem_number}
+        for key, attr in FIELDS.items():
+            value = getattr(self, attr)
+            if value is not None:
+                item[key] = value
+        item.update(self.extra)
+        order = ["ID", "Year", "ProblemNumber"]
+        return {k: item[k] for k in order + [k for k in item if k not in order]}
+
+    def __repr__(self) -> str:
+        return f"PackedRecord({self.id!r})"
+
+
+for _slot, (_key, _attr) in enumerate(FIELDS.items()):
+    setattr(PackedRecord, _attr, _Field(_slot, _key in _LIST_FIELDS))
+
+
+class PackedCorpus:
+    """Read-only, memory-mapped packed corpus."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._count, self._records, self._index, self._heap = (
+            _HEADER.unpack_from(self._buf)
+        )
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a packed corpus")
+
+    def close(self) -> None:
+        self._buf.close()
+
+    def __enter__(self) -> "PackedCorpus":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, row: int) -> PackedRecord:
+        if not 0 <= row < self._count:
+            raise IndexError(row)
+        return PackedRecord(self, row)
+
+    def __iter__(self) -> Iterator[PackedRecord]:
+        for row in range(self._count):
+            yield PackedRecord(self, row)
+
+    def _number(self, row: int) -> int:
+        (number,) = struct.unpack_from(
+            "<i", self._buf, self._records + row * _RECORD.size
+        )
+        return number
+
+    def _string(self, row: int, slot: int) -> Optional[str]:
+        pos = self._records + row * _RECORD.size + 4 + slot * 8
+        offset, length = struct.unpack_from("<II", self._buf, pos)
+        if length == _MISSING:
+            return None
+        start = self._heap + offset
+        return self._buf[start : start + length].decode("utf-8")
+
+    def get(self, problem_id: str) -> Optional[PackedRecord]:
+        """Look up a record by ``ID`` using the sorted index."""
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = _INDEX_ENTRY.unpack_from(
+                self._buf, self._index + mid * _INDEX_ENTRY.size
+            )[0]
+            if self._string(row, 0) < problem_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count:
+            row = _INDEX_ENTRY.unpack_from(
+                self._buf, self._index + lo * _INDEX_ENTRY.size
+            )[0]
+            if self._string(row, 0) == problem_id:
+                return PackedRecord(self, row)
+        return None
+
+
+def write_packed(items: Iterable[Dict[str, Any]], out_path: str) -> int:
+    """Pack problem dicts into ``out_path``; each may carry a ``_path`` key."""
+    heap = bytearray()
+    interned: Dict[str, tuple] = {}
+
+    def add(text: Optional[str]) -> tuple:
+        if text is None:
+            return (0, _MISSING)
+        if text not in interned:
+            data = text.encode("utf-8")
+            interned[text] = (len(heap), len(data))
+            heap.extend(data)
+        return interned[text]
+
+    records = bytearray()
+    ids: List[str] = []
+    for item in items:
+        slots: List[int] = []
+        for key in FIELDS:
+            value = item.get(key)
+            if key in _LIST_FIELDS and value is not None:
+                value = _LIST_SEP.join(value)
+            slots.extend(add(None if value is None else str(value)))
+        extra = {
+            k: v
+            for k, v in item.items()
+            if k not in FIELDS and k not in ("ProblemNumber", "_path")
+        }
+        slots.extend(add(item.get("_path")))
+        slots.extend(add(json.dumps(extra, ensure_ascii=False) if extra else None))
+        records += _RECORD.pack(int(item.get("ProblemNumber", 0)), *slots)
+        ids.append(str(item["ID"]))
+
+    order = sorted(range(len(ids)), key=ids.__getitem__)
+    index = b"".join(_INDEX_ENTRY.pack(row) for row in order)
+    records_at = _HEADER.size
+    index_at = records_at + len(records)
+    heap_at = index_at + len(index)
+    tmp = f"{out_path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(ids), records_at, index_at, heap_at))
+        f.write(records)
+        f.write(index)
+        f.write(heap)
+    os.replace(tmp, out_path)
+    return len(ids)
+
+
+def pack_tree(root: str, out_path: str) -> int:
+    """Convert every JSON file under ``root``'s ``*_problems`` trees."""
+    from corpus_store import iter_problem_files
+
+    def items() -> Iterator[Dict[str, Any]]:
+        for path in iter_problem_files(root):
+            with open(path, "r", encoding="utf-8") as f:
+                for item in json.load(f):
+                    yield {**item, "_path": os.path.relpath(path, root)}
+
+    return write_packed(items(), out_path)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Packed binary corpus tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    pack_p = sub.add_parser("pack", help="Convert the *_problems JSON tree")
+    pack_p.add_argument("output")
+    pack_p.add_argument("--root", default=".")
+    show_p = sub.add_parser("show", help="Print one problem as JSON")
+    show_p.add_argument("corpus")
+    show_p.add_argument("id")
+    args = parser.parse_args()
+
+    if args.cmd == "pack":
+        print(f"Packed {pack_tree(args.root, args.output)} problems")
+    else:
+        with PackedCorpus(args.corpus) as corpus:
+            record = corpus.get(args.id)
+            if record is None:
+                raise SystemExit(f"{args.id} not found")
+            print(json.dumps(record.to_dict(), indent=2, ensure_ascii=False))
@@ -0,0 +1,147 @@
+"""Backends converting MediaWiki fragments to HTML with pandoc.
+
+:class:`SubprocessBackend` is the original path: one ``pypandoc`` call, and so
+one pandoc process, per fragment. :class:`LuaBackend` keeps a single
+``pandoc lua`` interpreter running and sends it one JSON request per line;
+the interpreter converts each fragment with ``pandoc.read``/``pandoc.write``
+on its own, so the output is the same as the per-fragment command line.
+
+Math is written for MathJax to typeset in the browser (``"mathjax"``) or as
+static MathML (``"mathml"``); both backends take the mode per fragment. In
+MathML mode pandoc's warnings about TeX it cannot convert are silenced, as
+the renderer reports those fragments itself.
+"""
+
+import functools
+import json
+import os
+import subprocess
+import threading
+from typing import Optional
+
+import pypandoc
+
+MATH_MODES = ("mathjax", "mathml")
+
+# reads one {"text": ..., "math": ...} per line and answers {"output": ...}
+# or {"error": ...}
+_LUA_SERVER = """
+local opts = {}
+for _, math in ipairs({"mathjax", "mathml"}) do
+  opts[math] = pandoc.WriterOptions({html_math_method = math})
+end
+local function convert(req)
+  local doc = pandoc.read(req.text, "mediawiki")
+  return pandoc.write(doc, "html", opts[req.math or "mathjax"])
+end
+for line in io.lines() do
+  local ok, result = pcall(function()
+    local req = pandoc.json.decode(line, false)
+    if req.math == "mathml" and pandoc.log and pandoc.log.silence then
+      local _, output = pandoc.log.silence(convert, req)
+      return output
+    end
+    return convert(req)
+  end)
+  if ok then
+    io.write(pandoc.json.encode({output = result}), "\\n")
+  else
+    io.write(pandoc.json.encode({error = tostring(result)}), "\\n")
+  end
+  io.stdout:flush()
+end
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def pandoc_version() -> str:
+    """Return the version of the pandoc both backends run."""
+    return pypandoc.get_pandoc_version()
+
+
+def _as_cli_input(text: str) -> str:
+    """Apply the input normalisation the pandoc command line does itself."""
+    text = text.replace("\r\n", "\n")
+    text = "\n".join(line.expandtabs(4) for line in text.split("\n"))
+    return text if text.endswith("\n") or not text else text + "\n"
+
+
+class SubprocessBackend:
+    """Start a new pandoc process for every fragment."""
+
+    def convert(self, text: str, math: str = "mathjax") -> str:
+        extra_args = [f"--{math}"] + (["--quiet"] if math == "mathml" else [])
+        return pypandoc.convert_text(
+            text, "html", format="mediawiki", extra_args=extra_args
+        )
+
+    def close(self) -> None:
+        pass
+
+
+class LuaBackend:
+    """Convert fragments through one long-running ``pandoc lua`` process."""
+
+    def __init__(self, pandoc_path: Optional[str] = None) -> None:
+        self.pandoc_path = pandoc_path or pypandoc.get_pandoc_path()
+        self._lock = threading.Lock()
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _start(self) -> subprocess.Popen:
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                [self.pandoc_path, "lua", "-e", _LUA_SERVER],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                encoding="utf-8",
+            )
+        return self._proc
+
+    def convert(self, text: str, math: str = "mathjax") -> str:
+        request = {"text": _as_cli_input(text), "math": math}
+        with self._lock:
+            proc = self._start()
+            try:
+                proc.stdin.write(json.dumps(request) + "\n")
+                proc.stdin.flush()
+                line = proc.stdout.readline()
+            except BrokenPipeError:
+                line = ""
+            if not line:
+                self._proc = None
+                raise RuntimeError("pandoc lua process exited")
+        reply = json.loads(line)
+        if "error" in reply:
+            raise RuntimeError(f"Pandoc died with error: {reply['error']}")
+        # the pandoc command line ends its output with a newline
+        return reply["output"] + "\n"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._proc is not None:
+                self._proc.stdin.close()
+                self._proc.wait()
+                self._proc = None
+
+
+_default: Optional[object] = None
+_default_pid: Optional[int] = None
+
+
+def default_backend():
+    """Return this process's shared backend, preferring :class:`LuaBackend`.
+
+    Falls back to :class:`SubprocessBackend` when the installed pandoc has
+    no ``pandoc lua`` (or no ``pandoc.json``). A forked worker gets its own
+    backend instead of sharing its parent's pipes.
+    """
+    global _default, _default_pid
+    if _default is None or _default_pid != os.getpid():
+        backend = LuaBackend()
+        try:
+            backend.convert("")
+        except (OSError, RuntimeError, ValueError):
+            backend.close()
+            backend = SubprocessBackend()
+        _default, _default_pid = backend, os.getpid()
+    return _default
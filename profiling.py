@@ -0,0 +1,122 @@
+"""Named timing spans for the render pipeline.
+
+Wrap a stage in ``with span("pandoc"):``. Nothing is recorded until
+:func:`enable` installs a :class:`Profiler`; while disabled :func:`span`
+returns a shared no-op context manager, so instrumented code costs one
+global lookup per stage. Recorded spans can be written as a Chrome trace
+(``chrome://tracing`` or https://ui.perfetto.dev) and summarised per stage.
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+_NULL = contextlib.nullcontext()
+
+
+class Profiler:
+    """Collects complete spans as Chrome trace ``"X"`` events."""
+
+    def __init__(self) -> None:
+        self.events: List[Dict[str, Any]] = []
+
+    def record(
+        self, name: str, start_ns: int, end_ns: int, args: Dict[str, Any]
+    ) -> None:
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_native_id(),
+        }
+        if args:
+            event["args"] = args
+        self.events.append(event)  # list.append is atomic across threads
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Return the events recorded so far and forget them."""
+        events, self.events = self.events, []
+        return events
+
+    def write_trace(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        """Return count, total, p50, p95 and max (in ms) of every span name."""
+        durations: Dict[str, List[float]] = {}
+        for event in self.events:
+            durations.setdefault(event["name"], []).append(event["dur"] / 1000)
+        stats = {}
+        for name, samples in durations.items():
+            samples.sort()
+            stats[name] = {
+                "count": len(samples),
+                "total": sum(samples),
+                "p50": samples[len(samples) // 2],
+                "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max": samples[-1],
+            }
+        return stats
+
+    def table(self) -> str:
+        stats = self.stages()
+        width = max([len(name) for name in stats] + [5])
+        lines = [
+            f"{'stage':<{width}} {'count':>7} {'total ms':>10} "
+            f"{'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+        ]
+        for name, s in sorted(stats.items(), key=lambda kv: -kv[1]["total"]):
+            lines.append(
+                f"{name:<{width}} {s['count']:>7} {s['total']:>10.1f} "
+                f"{s['p50']:>9.2f} {s['p95']:>9.2f} {s['max']:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "args", "start")
+
+    def __init__(self, profiler: Profiler, name: str, args: Dict[str, Any]) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "_Span":
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.profiler.record(self.name, self.start, time.perf_counter_ns(), self.args)
+
+
+_active: Optional[Profiler] = None
+
+
+def span(name: str, **args: Any):
+    """Time the ``with`` block as stage ``name``; ``args`` go into the trace."""
+    if _active is None:
+        return _NULL
+    return _Span(_active, name, args)
+
+
+def enable() -> Profiler:
+    """Start recording spans in this process and return the profiler."""
+    global _active
+    if _active is None:
+        _active = Profiler()
+    return _active
+
+
+def disable() -> None:
+    global _active
+    _active = None
+
+
+def active() -> Optional[Profiler]:
+    return _active
@@ -1,148 +1,1248 @@
 import base64
+import functools
+import gzip
+import hashlib
+import html as html_lib
+import io
+import os
 import re
 import subprocess
 import tempfile
 import shutil
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 from xml.etree import ElementTree as ET
 
-import pypandoc
 import json
 from pathlib import Path
 
+from PIL import Image, features
+
+from asset_store import AssetStore, write_compressed
+from build_manifest import BuildManifest
+from diagram_cache import DEFAULT_CACHE_DIR, DiagramCache
+from diagram_worker import (
+    DIAGRAM_MEMORY,
+    DIAGRAM_TIMEOUT,
+    PLACEHOLDER_SVG,
+    DiagramError,
+    DiagramRecord,
+    diagram_summary,
+    run_limited,
+)
+from pandoc_backend import MATH_MODES, default_backend, pandoc_version
+import profiling
+from profiling import span
+import svg_minify
+
 ASY_RE = re.compile(r"<asy>(.*?)</asy>", re.DOTALL | re.IGNORECASE)
 CMATH_RE = re.compile(r"<cmath>(.*?)</cmath>", re.DOTALL | re.IGNORECASE)
+# math the MathML writer could not convert is kept as TeX in these spans
+MATH_FALLBACK_RE = re.compile(
+    r'<span\s+class="math (?:inline|display)">\$\$?(.*?)\$?\$</span>', re.DOTALL
+)
 MATHJAX_SCRIPT = '<script src="https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-mml-chtml.js"></script>'
 
 DIAGRAM_SIZE = 300  # desired width/height in pixels for output diagrams
+SVG_PRECISION = 2  # decimals kept in diagram coordinates (see svg_minify)
+THUMBNAIL_SIZE = 150  # width/height in pixels of raster thumbnails
+RASTER_COLORS = 64  # palette of raster variants; plenty for anti-aliased line art
+# Pillow save options of the raster variants written with --thumbnails
+RASTER_FORMATS = {"png": {"optimize": True}, "webp": {"lossless": True, "method": 6}}
+if not features.check("webp"):
+    del RASTER_FORMATS["webp"]
+# bump when the generated HTML changes in a way the templates do not show
+RENDER_VERSION = 2
+PAGE_TEMPLATE = "<html><head>{head}</head><body>\n{body}\n</body></html>"
+SECTION_TEMPLATE = "<h2>Problem {number}</h2>\n{question}"
+# marks the question on a problem page, for listings that load it lazily
+QUESTION_TEMPLATE = '<div class="question">\n{question}</div>'
+LIB_DIR = Path(__file__).parent / "libs"
+BATCH_SIZE = 64  # diagrams compiled per asy process
+# concurrent pdftocairo runs per process; render_corpus splits the CPUs
+# between its workers
+CONVERT_THREADS = os.cpu_count() or 1
+# command printing each tool's version; both write it to stderr
+_VERSION_COMMANDS = {"asy": ["asy", "--version"], "pdftocairo": ["pdftocairo", "-v"]}
 
 
-def _render_asy(code: str) -> bytes:
-    """Render Asymptote code to SVG and return bytes with unified size."""
+def _prepare_code(code: str) -> str:
     # Ensure olympiad module for AoPS diagrams
     if "import olympiad;" not in code:
         code = "import olympiad;\n" + code
+    return code
+
+
+def _copy_libs(tmp: Path) -> None:
+    """Copy the bundled Asymptote modules into a working directory."""
+    if LIB_DIR.is_dir():
+        for lib in LIB_DIR.glob("*.asy"):
+            shutil.copy(lib, tmp / lib.name)
+
+
+def _run_asy(args: list[str], cwd: str, check: bool = True, progress=None) -> None:
+    try:
+        with span("asy", figures=sum(a.endswith(".asy") for a in args)):
+            run_limited(
+                ["asy", "-f", "pdf", *args],
+                cwd=cwd,
+                check=check,
+                timeout=DIAGRAM_TIMEOUT,
+                memory=DIAGRAM_MEMORY,
+                progress=progress,
+            )
+    except FileNotFoundError as e:
+        raise RuntimeError("Asymptote not installed") from e
+
+
+def _pdf_to_svg(pdf_path: Path) -> bytes:
+    """Convert one PDF to SVG and return bytes with unified size."""
+    svg_path = pdf_path.with_suffix(".svg")
+    with span("pdftocairo"):
+        run_limited(
+            ["pdftocairo", "-svg", str(pdf_path), str(svg_path)],
+            cwd=pdf_path.parent,
+            check=True,
+            timeout=DIAGRAM_TIMEOUT,
+            memory=DIAGRAM_MEMORY,
+        )
+    with open(svg_path, "r", encoding="utf-8") as img:
+        svg = img.read()
+    with span("svg.resize"):
+        return _resize_svg(svg)
+
+
+def _resize_svg(svg: str) -> bytes:
+    # normalize diagram dimensions to DIAGRAM_SIZE
+    try:
+        root = ET.fromstring(svg)
+        root.set("width", f"{DIAGRAM_SIZE}px")
+        root.set("height", f"{DIAGRAM_SIZE}px")
+        svg = ET.tostring(root, encoding="unicode")
+    except ET.ParseError:
+        # if parsing fails, fall back to regex replacement
+        svg = re.sub(r'width="[^"]+"', f'width="{DIAGRAM_SIZE}px"', svg, 1)
+        svg = re.sub(r'height="[^"]+"', f'height="{DIAGRAM_SIZE}px"', svg, 1)
+    return svg.encode("utf-8")
+
+
+def _pdf_to_png(pdf_path: Path) -> bytes:
+    """Rasterize one PDF, longest side ``DIAGRAM_SIZE`` pixels, transparent."""
+    with span("pdftocairo.png"):
+        run_limited(
+            [
+                "pdftocairo",
+                "-png",
+                "-singlefile",
+                "-transp",
+                "-scale-to",
+                str(DIAGRAM_SIZE),
+                str(pdf_path),
+                str(pdf_path.with_suffix("")),
+            ],
+            cwd=pdf_path.parent,
+            check=True,
+            timeout=DIAGRAM_TIMEOUT,
+            memory=DIAGRAM_MEMORY,
+        )
+    return pdf_path.with_suffix(".png").read_bytes()
+
+
+def _convert_pdf(pdf_path: Path, raster: bool) -> tuple[bytes, bytes | None]:
+    """Return the SVG of a PDF and, with ``raster``, its only rasterization."""
+    svg = _pdf_to_svg(pdf_path)
+    return svg, _pdf_to_png(pdf_path) if raster else None
+
+
+def raster_tag() -> str:
+    """Hash the settings of the raster variants, which is part of their names."""
+    settings = [THUMBNAIL_SIZE, RASTER_COLORS, RASTER_FORMATS, Image.__version__]
+    return hashlib.sha256(json.dumps(settings).encode("utf-8")).hexdigest()[:8]
+
+
+def raster_suffixes() -> list[str]:
+    """Return the asset name suffixes of the variants :func:`raster_variants` makes."""
+    tag = raster_tag()
+    return [
+        f"{tag}-{size}.{fmt}"
+        for size in (THUMBNAIL_SIZE, DIAGRAM_SIZE)
+        for fmt in RASTER_FORMATS
+    ]
+
+
+def raster_variants(png: bytes) -> dict[str, bytes]:
+    """Derive the thumbnail and full-size PNG/WebP variants of one diagram.
+
+    ``png`` is the output of :func:`_pdf_to_png`. It is centred on a square
+    of ``DIAGRAM_SIZE`` pixels, as the SVG's viewBox is, scaled down for the
+    thumbnail and reduced to ``RASTER_COLORS`` colours, which makes the files
+    about three times smaller. Keys are :func:`raster_suffixes`,
+    ``"<raster_tag>-<size>.<format>"``.
+    """
+    tag = raster_tag()
+    with span("raster"):
+        with Image.open(io.BytesIO(png)) as image:
+            image = image.convert("RGBA")
+        full = Image.new("RGBA", (DIAGRAM_SIZE, DIAGRAM_SIZE))
+        full.paste(
+            image,
+            ((DIAGRAM_SIZE - image.width) // 2, (DIAGRAM_SIZE - image.height) // 2),
+        )
+        variants = {}
+        for size in (THUMBNAIL_SIZE, DIAGRAM_SIZE):
+            scaled = full.resize((size, size), Image.Resampling.LANCZOS).quantize(
+                RASTER_COLORS, method=Image.Quantize.FASTOCTREE
+            )
+            for fmt, options in RASTER_FORMATS.items():
+                data = io.BytesIO()
+                # WebP has no palette mode; lossless WebP still gains from it
+                image = scaled if fmt == "png" else scaled.convert("RGBA")
+                image.save(data, fmt, **options)
+                variants[f"{tag}-{size}.{fmt}"] = data.getvalue()
+        return variants
+
+
+def _render_asy(code: str, raster: bool = False) -> tuple[bytes, bytes | None]:
+    """Render Asymptote code to SVG bytes with unified size.
+
+    With ``raster`` the PDF is also rasterized (see :func:`_pdf_to_png`).
+    """
     with tempfile.TemporaryDirectory() as tmpdir:
         tmp = Path(tmpdir)
         asy_path = tmp / "fig.asy"
         with open(asy_path, "w", encoding="utf-8") as f:
-            f.write(code)
-        # copy bundled Asymptote modules
-        lib_dir = Path(__file__).parent / "libs"
-        if lib_dir.is_dir():
-            for lib in lib_dir.glob("*.asy"):
-                shutil.copy(lib, tmp / lib.name)
+            f.write(_prepare_code(code))
+        _copy_libs(tmp)
+        _run_asy(["-o", "out", str(asy_path)], tmpdir)
+        return _convert_pdf(tmp / "out.pdf", raster)
+
+
+_Rendered = tuple[bytes, bytes | None] | DiagramError  # (SVG, PNG) or failure
+
+
+def _render_one(code: str, raster: bool = False) -> tuple[_Rendered, float]:
+    start = time.perf_counter()
+    try:
+        result = _render_asy(code, raster)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        result = DiagramError.from_exception(e)
+    return result, time.perf_counter() - start
+
+
+def _render_asy_batch(
+    codes: list[str], raster: bool = False
+) -> list[tuple[_Rendered, float]]:
+    """Render several diagrams with a single ``asy`` process.
+
+    All figures are compiled in one working directory holding one copy of
+    ``libs/``. A figure whose PDF is missing afterwards (a syntax error, or
+    asy giving up on the batch) is re-rendered on its own, so an error only
+    fails that figure; a :class:`DiagramError` is returned in place of its
+    SVG and PNG (see :func:`_convert_pdf`). ``DIAGRAM_TIMEOUT`` applies to
+    each figure: the batch is only killed once no new PDF has appeared for
+    that long, and then every figure without a PDF is rendered on its own.
+    Each result comes with the seconds spent on that figure.
+    """
+    if len(codes) == 1:
+        return [_render_one(codes[0], raster)]
+    with tempfile.TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        names = []
+        for i, code in enumerate(codes):
+            (tmp / f"fig{i}.asy").write_text(_prepare_code(code), encoding="utf-8")
+            names.append(f"fig{i}.asy")
+        _copy_libs(tmp)
+        start = time.time()
         try:
-            subprocess.run(
-                ["asy", "-f", "pdf", "-o", "out", asy_path],
-                check=True,
-                cwd=tmpdir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
+            _run_asy(
+                names,
+                tmpdir,
+                check=False,
+                progress=lambda: len(list(tmp.glob("*.pdf"))),
             )
-        except FileNotFoundError as e:
-            raise RuntimeError("Asymptote not installed") from e
-        pdf_path = tmp / "out.pdf"
-        svg_path = tmp / "out.svg"
-        subprocess.run(
-            ["pdftocairo", "-svg", str(pdf_path), str(svg_path)],
-            check=True,
-            cwd=tmpdir,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        with open(svg_path, "r", encoding="utf-8") as img:
-            svg = img.read()
-        # normalize diagram dimensions to DIAGRAM_SIZE
-        try:
-            root = ET.fromstring(svg)
-            root.set("width", f"{DIAGRAM_SIZE}px")
-            root.set("height", f"{DIAGRAM_SIZE}px")
-            svg = ET.tostring(root, encoding="unicode")
-        except ET.ParseError:
-            # if parsing fails, fall back to regex replacement
-            svg = re.sub(r'width="[^"]+"', f'width="{DIAGRAM_SIZE}px"', svg, 1)
-            svg = re.sub(r'height="[^"]+"', f'height="{DIAGRAM_SIZE}px"', svg, 1)
-        return svg.encode("utf-8")
+        except subprocess.TimeoutExpired:
+            pass  # the figures without a PDF are tried alone below
+        # asy writes each PDF as it finishes, so their mtimes time the figures
+        compiled: dict[int, float] = {}
+        previous = start
+        for i in range(len(codes)):
+            pdf = tmp / f"fig{i}.pdf"
+            if pdf.exists():
+                finished = pdf.stat().st_mtime
+                compiled[i] = max(finished - previous, 0.0)
+                previous = finished
+
+        def convert(i: int) -> tuple[_Rendered, float]:
+            if i not in compiled:
+                return _render_one(codes[i], raster)
+            begin = time.perf_counter()
+            try:
+                result = _convert_pdf(tmp / f"fig{i}.pdf", raster)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                return _render_one(codes[i], raster)
+            return result, compiled[i] + time.perf_counter() - begin
+
+        # pdftocairo reads one document per process; run those concurrently
+        with ThreadPoolExecutor(max_workers=CONVERT_THREADS) as pool:
+            return list(pool.map(convert, range(len(codes))))
+
+
+@functools.lru_cache(maxsize=None)
+def _libs_digest() -> str:
+    digest = hashlib.sha256()
+    for lib in sorted(LIB_DIR.glob("*.asy")):
+        digest.update(lib.name.encode("utf-8") + b"\0" + lib.read_bytes() + b"\0")
+    return digest.hexdigest()
+
+
+def _tool_versions(cache: DiagramCache) -> list[str]:
+    """Return the versions of the diagram tools, probing each binary once."""
+    versions = []
+    for tool, command in _VERSION_COMMANDS.items():
+        path = shutil.which(tool)
+        if path is None:
+            versions.append(f"{tool} missing")
+            continue
+        version = cache.tool_version(path)
+        if version is None:
+            proc = subprocess.run(command, capture_output=True, text=True)
+            output = (proc.stdout + proc.stderr).strip()
+            version = output.splitlines()[0] if output else "unknown"
+            cache.set_tool_version(path, version)
+        versions.append(version)
+    return versions
+
+
+def diagram_key(code: str, cache: DiagramCache) -> str:
+    """Hash every input that affects the SVG rendered for ``code``."""
+    parts = [
+        code,
+        _libs_digest(),
+        str(DIAGRAM_SIZE),
+        f"minify {svg_minify.VERSION} {SVG_PRECISION}",
+        *_tool_versions(cache),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def _minify(record: DiagramRecord, svg: bytes) -> bytes:
+    with span("svg.minify"):
+        small = svg_minify.minify(svg, SVG_PRECISION)
+    record.raw_bytes, record.bytes = len(svg), len(small)
+    return small
+
+
+def render_diagram(
+    code: str,
+    cache: DiagramCache | None = None,
+    records: list[DiagramRecord] | None = None,
+) -> bytes:
+    """Render one diagram to minified SVG, reusing ``cache`` when given.
+
+    Raises :class:`DiagramError` if the figure cannot be rendered.
+    """
+    return _as_svg(render_diagrams([code], cache, records)[code])
+
+
+def _as_svg(result: bytes | DiagramError) -> bytes:
+    if isinstance(result, DiagramError):
+        raise result
+    return result
+
+
+def render_diagrams(
+    codes: list[str],
+    cache: DiagramCache | None = None,
+    records: list[DiagramRecord] | None = None,
+    rasters: dict[str, bytes] | None = None,
+) -> dict[str, bytes | DiagramError]:
+    """Render many diagrams in ``BATCH_SIZE`` batches; see :func:`_render_asy_batch`.
+
+    Returns the minified SVG (or the error of a failed figure) for each
+    distinct code. Cached diagrams are not rendered again and new ones are
+    cached. A :class:`DiagramRecord` for every figure rendered (or failed)
+    is appended to ``records`` when given.
 
+    When ``rasters`` is given, each PDF is also rasterized in the same pass
+    and the full-size PNG of every rendered code is stored in it (see
+    :func:`raster_variants`).
+    The full-size PNG is cached next to the SVG; a cached SVG without one
+    is rendered again.
+    """
+    results: dict[str, bytes | DiagramError] = {}
+    keys: dict[str, str] = {}
+    pending: list[str] = []
+    for code in dict.fromkeys(codes):
+        if cache is not None:
+            with span("cache.get"):
+                keys[code] = diagram_key(code, cache)
+                svg = cache.get(keys[code])
+                png = None
+                if svg is not None and rasters is not None:
+                    png = cache.get(f"{keys[code]}.png")
+            if svg is not None and (rasters is None or png is not None):
+                results[code] = svg
+                if rasters is not None:
+                    rasters[code] = png
+                continue
+        pending.append(code)
+    for start in range(0, len(pending), BATCH_SIZE):
+        batch = pending[start : start + BATCH_SIZE]
+        with span("diagram.batch", figures=len(batch)):
+            rendered = _render_asy_batch(batch, rasters is not None)
+        for code, (result, seconds) in zip(batch, rendered):
+            record = DiagramRecord(code, seconds)
+            if isinstance(result, DiagramError):
+                record.error, record.message = result.kind, result.message
+            else:
+                svg, png = result
+                result = _minify(record, svg)
+                if cache is not None:
+                    with span("cache.put"):
+                        cache.put(keys[code], result)
+                        if png is not None:
+                            cache.put(f"{keys[code]}.png", png)
+                if png is not None:
+                    rasters[code] = png
+            results[code] = result
+            if records is not None:
+                records.append(record)
+    return results
 
-def render_wikitext(wikitext: str) -> str:
-    """Convert AoPS wikitext containing <cmath>, <math>, and <asy> tags to HTML."""
+
+def diagram_codes(wikitext: str) -> list[str]:
+    """Return the code of every ``<asy>`` block in ``wikitext``."""
+    return [m.group(1).strip() for m in ASY_RE.finditer(wikitext)]
+
+
+def render_wikitext(
+    wikitext: str,
+    cache: DiagramCache | None = None,
+    diagrams: dict[str, bytes | DiagramError] | None = None,
+    backend=None,
+    assets: AssetStore | None = None,
+    math: str = "mathjax",
+    rasters: dict[str, bytes] | None = None,
+) -> str:
+    """Convert AoPS wikitext containing <cmath>, <math>, and <asy> tags to HTML.
+
+    ``diagrams`` holds SVGs already rendered by :func:`render_diagrams`;
+    other diagrams are rendered one at a time. ``backend`` is a
+    :mod:`pandoc_backend` converter (the shared persistent one by default).
+    Diagrams are inlined as data URIs, or written to ``assets`` and
+    referenced by URL with lazy loading. A figure that failed to render is
+    shown as :data:`PLACEHOLDER_SVG`. For the diagrams with a PNG in
+    ``rasters`` (filled along with diagrams missing from ``diagrams``) the
+    :func:`raster_variants` are written to ``assets`` next to the SVG,
+    unless they are there already.
+
+    ``math`` is ``"mathjax"`` (TeX for MathJax to typeset in the browser) or
+    ``"mathml"`` (static MathML, no script needed); see :func:`math_fallbacks`
+    for what MathML mode could not convert.
+    """
+    images: list[str] = []
+    # pandoc escapes raw <img> tags in MediaWiki input, so diagrams are
+    # swapped for plain-word placeholders and inserted after conversion
+    nonce = uuid.uuid4().hex
 
     def repl(match: re.Match) -> str:
-        img_data = _render_asy(match.group(1).strip())
-        b64 = base64.b64encode(img_data).decode("ascii")
-        return f'<img src="data:image/svg+xml;base64,{b64}" alt="diagram"/>'
+        code = match.group(1).strip()
+        img_data = (diagrams or {}).get(code)
+        if img_data is None:
+            img_data = render_diagrams([code], cache, rasters=rasters)[code]
+        alt = "diagram"
+        if isinstance(img_data, DiagramError):
+            img_data, alt = PLACEHOLDER_SVG, f"diagram unavailable ({img_data.kind})"
+        if assets is not None:
+            with span("asset.write"):
+                png = (rasters or {}).get(code)
+                variants = None
+                if png is not None and not assets.has_variants(
+                    img_data, raster_suffixes()
+                ):
+                    variants = raster_variants(png)
+                url = assets.url(img_data, variants)
+            img = f'<img src="{url}" alt="{alt}" loading="lazy"/>'
+        else:
+            with span("base64"):
+                b64 = base64.b64encode(img_data).decode("ascii")
+            img = f'<img src="data:image/svg+xml;base64,{b64}" alt="{alt}"/>'
+        images.append(img)
+        return f"diagram{nonce}n{len(images) - 1}x"
 
     replaced = ASY_RE.sub(repl, wikitext)
     replaced = CMATH_RE.sub(
         lambda m: f'<math class="math inline">{m.group(1)}</math>', replaced
     )
-    html = pypandoc.convert_text(
-        replaced, "html", format="mediawiki", extra_args=["--mathjax"]
-    )
+    with span("pandoc"):
+        html = (backend or default_backend()).convert(replaced, math)
+    for i, img in enumerate(images):
+        html = html.replace(f"diagram{nonce}n{i}x", img)
     return html
 
 
-def render_json(json_file: str, output_dir: str) -> None:
-    """Render problems stored in the new JSON format to HTML files."""
+def thumbnail_images(html: str, assets: AssetStore) -> str:
+    """Show the diagram assets in ``html`` that have raster variants as thumbnails.
+
+    Each such ``<img>`` gets a ``srcset`` of the ``THUMBNAIL_SIZE`` and
+    ``DIAGRAM_SIZE`` PNGs (preferring WebP where supported) displayed at
+    ``THUMBNAIL_SIZE`` pixels, so high-density screens pick the full size.
+    The SVG stays the ``src`` for browsers without ``srcset``.
+    """
+    prefix = assets.url_prefix
+
+    tag = raster_tag()
+
+    def srcset(stem: str, fmt: str) -> str:
+        return ", ".join(
+            f"{prefix}{stem}-{tag}-{size}.{fmt} {size}w"
+            for size in (THUMBNAIL_SIZE, DIAGRAM_SIZE)
+        )
+
+    def repl(match: re.Match) -> str:
+        stem, alt = match.groups()
+        if not (assets.directory / f"{stem}-{tag}-{THUMBNAIL_SIZE}.png").exists():
+            return match.group(0)  # a placeholder
+        sizes = f'sizes="{THUMBNAIL_SIZE}px"'
+        sources = "".join(
+            f'<source type="image/{fmt}" srcset="{srcset(stem, fmt)}" {sizes}/>'
+            for fmt in RASTER_FORMATS
+            if fmt != "png"
+        )
+        return (
+            f'<picture>{sources}<img src="{prefix}{stem}.svg" '
+            f'srcset="{srcset(stem, "png")}" {sizes} width="{THUMBNAIL_SIZE}" '
+            f'height="{THUMBNAIL_SIZE}" alt="{alt}" loading="lazy"/></picture>'
+        )
+
+    img_re = re.compile(
+        f'<img src="{re.escape(prefix)}([0-9a-f]{{20}})\\.svg" alt="([^"]*)" '
+        'loading="lazy"/>'
+    )
+    return img_re.sub(repl, html)
+
+
+def math_fallbacks(html: str) -> list[str]:
+    """Return the TeX that the MathML writer left unconverted in ``html``."""
+    return [html_lib.unescape(m.group(1)) for m in MATH_FALLBACK_RE.finditer(html)]
+
+
+def math_head(math: str) -> str:
+    """Return the ``<head>`` contents pages need for ``math`` mode."""
+    return MATHJAX_SCRIPT if math == "mathjax" else ""
+
+
+def build_fingerprint(**options) -> str:
+    """Hash the settings, pandoc version and ``options`` that shape every page."""
+    parts = [
+        RENDER_VERSION,
+        PAGE_TEMPLATE,
+        SECTION_TEMPLATE,
+        QUESTION_TEMPLATE,
+        MATHJAX_SCRIPT,
+        DIAGRAM_SIZE,
+        svg_minify.VERSION,
+        SVG_PRECISION,
+        _libs_digest(),
+        pandoc_version(),
+        sorted(options.items()),
+    ]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def render_json(
+    json_file: str,
+    output_dir: str,
+    rendered: dict[str, str] | None = None,
+    *,
+    cache: DiagramCache | None = None,
+    force: bool = False,
+    assets: bool = False,
+    compress: bool = False,
+    records: list[DiagramRecord] | None = None,
+    math: str = "mathjax",
+    fallbacks: list[tuple[str, str]] | None = None,
+    thumbnails: bool = False,
+    assets_dir: str | None = None,
+    diagrams: dict[str, bytes | DiagramError] | None = None,
+) -> int:
+    """Render problems stored in the new JSON format to HTML files.
+
+    ``rendered`` maps wikitext to HTML; pass the same dict for several files
+    so problems shared between contests (see dedup.py) are rendered once.
+    Problems whose inputs are unchanged since the last build (according to
+    the output directory's :class:`BuildManifest`) are skipped unless
+    ``force`` is set, and pages of removed problems are deleted, so every
+    JSON file needs an ``output_dir`` of its own. Returns the number of
+    problems rendered.
+
+    With ``assets`` diagrams are written to ``assets_dir`` (default
+    ``output_dir/assets``) instead of being inlined; with ``compress`` every page and asset also gets a
+    precompressed ``.gz`` sibling. ``diagrams`` holds the results of
+    :func:`render_diagrams`; share it along with ``rendered``, and share
+    both only between calls with the same ``output_dir`` layout, assets
+    directory and options.
+
+    Failed figures are drawn as placeholders and listed in
+    ``output_dir/diagram_errors.json``, including figures that failed in an
+    earlier call sharing ``diagrams``; their problems stay stale so the
+    next build tries them again. The :class:`DiagramRecord` of every figure
+    rendered is appended to ``records`` when given.
+
+    ``math`` is passed to :func:`render_wikitext`; MathML pages load no
+    script. In MathML mode every fragment kept as TeX is appended to
+    ``fallbacks`` as ``(problem ID, TeX)``.
+
+    With ``thumbnails`` (which needs ``assets``) every diagram also gets the
+    PNG/WebP :func:`raster_variants`, and ``index.html`` shows them through
+    ``srcset`` (see :func:`thumbnail_images`) while problem pages keep the SVG.
+    """
+    if thumbnails and not assets:
+        raise ValueError("thumbnails are written as assets")
+    rendered = {} if rendered is None else rendered
+    records = [] if records is None else records
+    fallbacks = [] if fallbacks is None else fallbacks
+    diagrams = {} if diagrams is None else diagrams
+
     Path(output_dir).mkdir(parents=True, exist_ok=True)
     with open(json_file, "r", encoding="utf-8") as f:
         problems = json.load(f)
 
-    # Sort items by problem number for combined page
-    sorted_items = sorted(problems, key=lambda d: d["ProblemNumber"])
-
-    all_sections: list[str] = []
-    for item in sorted_items:
-        pid = item["ID"]
-        data = item
-        q_html = render_wikitext(data["Question"])
-        ans_html = (
-            f"<p><strong>Answer:</strong> {data['Answer']}</p>"
-            if data.get("Answer")
-            else ""
+    store = None
+    if assets:
+        assets_path = Path(assets_dir or Path(output_dir) / "assets")
+        prefix = Path(os.path.relpath(assets_path, output_dir)).as_posix() + "/"
+        store = AssetStore(assets_path, prefix, compress)
+    manifest = BuildManifest(
+        output_dir,
+        build_fingerprint(
+            assets=assets,
+            compress=compress,
+            math=math,
+            thumbnails=raster_tag() if thumbnails else None,
+        ),
+        reset=force,
+    )
+    removed = manifest.prune(problems)
+    todo = manifest.stale(problems)
+
+    # render every new diagram of the contest in as few asy runs as possible
+    owners: dict[str, str] = {}
+    for item in todo:
+        for code in _item_codes(item):
+            if code not in diagrams:
+                owners.setdefault(code, item["ID"])
+    first = len(records)
+    rasters: dict[str, bytes] | None = {} if thumbnails else None
+    diagrams.update(render_diagrams(list(owners), cache, records, rasters))
+    new = {record.code: record for record in records[first:]}
+    for record in new.values():
+        record.owner = owners[record.code]
+    failed: dict[str, DiagramRecord] = {}
+    for item in todo:
+        for code in _item_codes(item):
+            error = diagrams[code]
+            if isinstance(error, DiagramError) and code not in failed:
+                failed[code] = new.get(code) or DiagramRecord(
+                    code, error=error.kind, message=error.message, owner=item["ID"]
+                )
+    _write_errors(Path(output_dir) / "diagram_errors.json", list(failed.values()))
+
+    def render(text: str) -> str:
+        if text not in rendered:
+            rendered[text] = render_wikitext(
+                text, cache, diagrams, assets=store, math=math, rasters=rasters
+            )
+        return rendered[text]
+
+    for item in todo:
+        with span("problem", id=item["ID"]):
+            page, q_html = _problem_page(item, render, math)
+            _write_page(Path(output_dir) / f"{item['ID']}.html", page, compress)
+        if math == "mathml":
+            fallbacks += [(item["ID"], tex) for tex in math_fallbacks(page)]
+        complete = not any(code in failed for code in _item_codes(item))
+        if thumbnails:
+            q_html = thumbnail_images(q_html, store)
+        manifest.update(item, _index_section(item["ProblemNumber"], q_html), complete)
+    if todo or removed or not (Path(output_dir) / "index.html").exists():
+        _write_index(manifest, problems, compress, math)
+    return len(todo)
+
+
+def _item_codes(item: dict) -> list[str]:
+    return diagram_codes(item["Question"]) + diagram_codes(item.get("Solution") or "")
+
+
+def _write_errors(path: Path, records: list[DiagramRecord]) -> None:
+    """Write the failed figures of ``records`` to ``path``, or remove it."""
+    failed = [r.to_dict() for r in records if r.error]
+    if failed:
+        path.write_text(json.dumps(failed, indent=2), encoding="utf-8")
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _write_page(path: Path, html: str, compress: bool) -> None:
+    with span("write"):
+        path.write_text(html, encoding="utf-8")
+        if compress:
+            write_compressed(path)
+
+
+def _write_index(
+    manifest: BuildManifest, problems: list[dict], compress: bool, math: str
+) -> None:
+    index_page = functools.partial(_index_page, head=math_head(math))
+    with span("write.index"):
+        if manifest.write_index(problems, index_page) and compress:
+            write_compressed(manifest.directory / "index.html")
+        manifest.save()
+
+
+def _problem_page(item: dict, render, math: str) -> tuple[str, str]:
+    """Return the full page of one problem and its question HTML."""
+    q_html = render(item["Question"])
+    ans_html = (
+        f"<p><strong>Answer:</strong> {item['Answer']}</p>"
+        if item.get("Answer")
+        else ""
+    )
+    sol_html = render(item["Solution"]) if item.get("Solution") else ""
+    body = QUESTION_TEMPLATE.format(question=q_html)
+    if ans_html:
+        body += "\n" + ans_html
+    if sol_html:
+        body += "\n<h3>Solution</h3>\n" + sol_html
+    return PAGE_TEMPLATE.format(head=math_head(math), body=body), q_html
+
+
+def _index_section(number: int, q_html: str) -> str:
+    return SECTION_TEMPLATE.format(number=number, question=q_html)
+
+
+def _index_page(sections: list[str], head: str) -> str:
+    return PAGE_TEMPLATE.format(head=head, body="\n".join(sections))
+
+
+def benchmark_math(json_files: list[str], repeat: int = 3) -> dict[str, dict]:
+    """Build every problem page of ``json_files`` in each math mode.
+
+    Diagrams are left out, so only text and math are measured. Returns, per
+    mode, the fastest of ``repeat`` builds in seconds, the total and
+    per-page gzipped size of the pages in bytes, the fragments MathJax has
+    to typeset in the browser on page load and the TeX fragments MathML
+    mode could not convert.
+    """
+    problems: list[dict] = []
+    for json_file in json_files:
+        with open(json_file, "r", encoding="utf-8") as f:
+            problems += json.load(f)
+    backend = default_backend()
+    results = {}
+    for math in MATH_MODES:
+
+        def render(text: str) -> str:
+            return render_wikitext(
+                ASY_RE.sub("", text), diagrams={}, backend=backend, math=math
+            )
+
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pages = [_problem_page(item, render, math)[0] for item in problems]
+            best = min(best, time.perf_counter() - start)
+        data = [page.encode("utf-8") for page in pages]
+        fallbacks = sum(len(math_fallbacks(page)) for page in pages)
+        results[math] = {
+            "pages": len(pages),
+            "seconds": best,
+            "bytes": sum(map(len, data)),
+            "gzip_bytes": sum(len(gzip.compress(page)) for page in data),
+            "browser_typeset": (
+                sum(page.count('class="math ') for page in pages)
+                if math == "mathjax"
+                else 0
+            ),
+            "fallbacks": fallbacks,
+        }
+    return results
+
+
+def prewarm(root: str, cache: DiagramCache) -> tuple[int, int]:
+    """Render every distinct diagram of the ``*_problems`` trees into ``cache``.
+
+    Returns ``(diagrams, failures)``; a failing diagram does not stop the run.
+    """
+    from corpus_store import iter_problem_files
+
+    owners: dict[str, str] = {}
+    for path in iter_problem_files(root):
+        with open(path, "r", encoding="utf-8") as f:
+            problems = json.load(f)
+        for item in problems:
+            for field in ("Question", "Solution"):
+                for code in diagram_codes(item.get(field) or ""):
+                    owners.setdefault(code, item["ID"])
+    records: list[DiagramRecord] = []
+    render_diagrams(list(owners), cache, records)
+    for record in records:
+        record.owner = owners[record.code]
+        if not record.error:
+            print(
+                f"{record.owner}: SVG {record.raw_bytes} -> {record.bytes} bytes "
+                f"(saved {record.raw_bytes - record.bytes})"
+            )
+    raw = sum(r.raw_bytes for r in records)
+    if raw:
+        print(
+            f"SVG minification saved {raw - sum(r.bytes for r in records)} of {raw} bytes"
+        )
+    print(diagram_summary(records))
+    return len(owners), sum(bool(r.error) for r in records)
+
+
+def math_summary(fallbacks: list[tuple[str, str]], top: int = 10) -> str:
+    """Summarise ``(problem ID, TeX)`` fallbacks, most frequent TeX first."""
+    counts: dict[str, list[str]] = {}
+    for problem_id, tex in fallbacks:
+        counts.setdefault(tex, []).append(problem_id)
+    lines = [
+        f"MathML: {len(fallbacks)} fragments in "
+        f"{len({pid for pid, _ in fallbacks})} problems kept as TeX"
+    ]
+    for tex, ids in sorted(counts.items(), key=lambda kv: (-len(kv[1]), kv[0]))[:top]:
+        lines.append(f"  {len(ids)}x {ids[0]}: {' '.join(tex.split())[:80]}")
+    return "\n".join(lines)
+
+
+@dataclass
+class CorpusReport:
+    problems: int = 0
+    contests: int = 0
+    up_to_date: int = 0
+    seconds: float = 0.0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    failures: list[tuple[str, str]] = field(default_factory=list)
+    diagrams: list[DiagramRecord] = field(default_factory=list)
+    math_fallbacks: list[tuple[str, str]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        rate = self.problems / self.seconds if self.seconds else 0.0
+        raw = sum(r.raw_bytes for r in self.diagrams)
+        saved = raw - sum(r.bytes for r in self.diagrams)
+        lines = [
+            f"Rendered {self.problems} problems in {self.contests} contests "
+            f"in {self.seconds:.1f}s ({rate:.1f} problems/s), "
+            f"{self.up_to_date} contests up to date, "
+            f"{len(self.failures)} failed; "
+            f"diagram cache: {self.cache_hits} hits, {self.cache_misses} misses; "
+            f"SVG minification saved {saved} of {raw} bytes"
+        ]
+        lines += [f"  {pid}: {error}" for pid, error in self.failures]
+        lines.append(diagram_summary(self.diagrams))
+        if self.math_fallbacks:
+            lines.append(math_summary(self.math_fallbacks))
+        return "\n".join(lines)
+
+
+_worker_cache: DiagramCache | None = None
+
+
+def _init_worker(
+    cache_dir: str | None,
+    cache_bytes: int,
+    timeout: float,
+    memory: int,
+    threads: int,
+    profile: bool,
+) -> None:
+    global _worker_cache, DIAGRAM_TIMEOUT, DIAGRAM_MEMORY, CONVERT_THREADS
+    if cache_dir is not None:
+        _worker_cache = DiagramCache(cache_dir, cache_bytes)
+    DIAGRAM_TIMEOUT, DIAGRAM_MEMORY, CONVERT_THREADS = timeout, memory, threads
+    if profile:
+        profiling.enable()
+    else:
+        profiling.disable()  # a forked worker inherits the parent's profiler
+
+
+def _render_problem(
+    item: dict,
+    output_dir: str,
+    assets: AssetStore | None = None,
+    compress: bool = False,
+    math: str = "mathjax",
+    thumbnails: bool = False,
+) -> tuple[str, int, int, list[DiagramRecord], list[str], list[dict]]:
+    """Process-pool job: write one problem page.
+
+    Returns the question HTML for the index (with thumbnails if asked), the
+    worker's diagram cache hits and misses
+    for this problem, the records of the diagrams it rendered (see
+    :func:`render_diagrams`), the TeX kept by MathML mode and its profiling
+    spans, if enabled.
+    """
+    cache = _worker_cache
+    before = (cache.hits, cache.misses) if cache else (0, 0)
+    records: list[DiagramRecord] = []
+    with span("problem", id=item["ID"]):
+        rasters: dict[str, bytes] | None = {} if thumbnails else None
+        diagrams = render_diagrams(_item_codes(item), cache, records, rasters)
+        for record in records:
+            record.owner = item["ID"]
+        page, q_html = _problem_page(
+            item,
+            lambda text: render_wikitext(
+                text, cache, diagrams, assets=assets, math=math, rasters=rasters
+            ),
+            math,
         )
-        sol_html = render_wikitext(data["Solution"]) if data.get("Solution") else ""
-        body = q_html
-        if ans_html:
-            body += "\n" + ans_html
-        if sol_html:
-            body += "\n<h3>Solution</h3>\n" + sol_html
-        page = f"<html><head>{MATHJAX_SCRIPT}</head><body>\n{body}\n</body></html>"
-        out_path = Path(output_dir) / f"{pid}.html"
-        out_path.write_text(page, encoding="utf-8")
-        all_sections.append(f"<h2>Problem {data['ProblemNumber']}</h2>\n{q_html}")
+        _write_page(Path(output_dir) / f"{item['ID']}.html", page, compress)
+        if thumbnails:
+            q_html = thumbnail_images(q_html, assets)
+    after = (cache.hits, cache.misses) if cache else (0, 0)
+    fallbacks = math_fallbacks(page) if math == "mathml" else []
+    profiler = profiling.active()
+    events = profiler.drain() if profiler else []
+    hits, misses = after[0] - before[0], after[1] - before[1]
+    return q_html, hits, misses, records, fallbacks, events
 
-    index = (
-        f"<html><head>{MATHJAX_SCRIPT}</head><body>\n"
-        + "\n".join(all_sections)
-        + "\n</body></html>"
+
+def render_corpus(
+    root: str,
+    output_root: str,
+    *,
+    jobs: int | None = None,
+    cache_dir: str | None = DEFAULT_CACHE_DIR,
+    cache_bytes: int = 256 * 1024 * 1024,
+    force: bool = False,
+    assets: bool = False,
+    compress: bool = False,
+    math: str = "mathjax",
+    thumbnails: bool = False,
+    progress=print,
+) -> CorpusReport:
+    """Render every ``*_problems`` file under ``root`` with a process pool.
+
+    Each changed problem (see :func:`render_json`) is one job; a contest's
+    ``index.html`` is rebuilt once all of its jobs have finished, in
+    problem-number order, so the output does not depend on scheduling.
+    Contest ``<dir>/<name>.json`` is written to ``output_root/<dir>/<name>/``;
+    with ``assets`` all contests share the diagrams in ``output_root/assets``.
+    ``math`` selects MathJax or MathML output and ``thumbnails`` adds raster
+    variants as in :func:`render_json`.
+    When :mod:`profiling` is enabled the workers record spans too, and they
+    are collected into this process's profiler.
+    """
+    from corpus_store import iter_problem_files
+
+    if thumbnails and not assets:
+        raise ValueError("thumbnails are written as assets")
+    start = time.perf_counter()
+    report = CorpusReport()
+    fingerprint = build_fingerprint(
+        assets=assets,
+        compress=compress,
+        math=math,
+        thumbnails=raster_tag() if thumbnails else None,
     )
-    (Path(output_dir) / "index.html").write_text(index, encoding="utf-8")
+    assets_dir = Path(output_root) / "assets"
+    stores: dict[str, AssetStore | None] = {}
+    contests: dict[str, list[dict]] = {}
+    manifests: dict[str, BuildManifest] = {}
+    todo: dict[str, list[dict]] = {}
+    for path in iter_problem_files(root):
+        out_dir = Path(output_root) / Path(os.path.relpath(path, root)).with_suffix("")
+        out_dir.mkdir(parents=True, exist_ok=True)
+        with open(path, "r", encoding="utf-8") as f:
+            problems = json.load(f)
+        manifest = BuildManifest(out_dir, fingerprint, reset=force)
+        removed = manifest.prune(problems)
+        stale = manifest.stale(problems)
+        if not stale:
+            if removed or not (out_dir / "index.html").exists():
+                _write_index(manifest, problems, compress, math)
+            report.up_to_date += 1
+            continue
+        if assets:
+            prefix = Path(os.path.relpath(assets_dir, out_dir)).as_posix() + "/"
+            stores[str(out_dir)] = AssetStore(assets_dir, prefix, compress)
+        else:
+            stores[str(out_dir)] = None
+        contests[str(out_dir)] = problems
+        manifests[str(out_dir)] = manifest
+        todo[str(out_dir)] = stale
+    total = sum(len(items) for items in todo.values())
+    remaining = {out_dir: len(items) for out_dir, items in todo.items()}
+
+    def finish(out_dir: str) -> None:
+        _write_index(manifests[out_dir], contests[out_dir], compress, math)
+        report.contests += 1
+
+    if total:
+        workers = jobs or os.cpu_count() or 1
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                cache_dir,
+                cache_bytes,
+                DIAGRAM_TIMEOUT,
+                DIAGRAM_MEMORY,
+                # keep jobs x pdftocairo runs within the CPU count
+                max(1, CONVERT_THREADS // workers),
+                profiling.active() is not None,
+            ),
+        ) as pool:
+            futures = {
+                pool.submit(
+                    _render_problem,
+                    item,
+                    out_dir,
+                    stores[out_dir],
+                    compress,
+                    math,
+                    thumbnails,
+                ): (out_dir, item)
+                for out_dir, items in todo.items()
+                for item in items
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                out_dir, item = futures[future]
+                try:
+                    result = future.result()
+                    q_html, hits, misses, records, fallbacks, events = result
+                except Exception as e:  # keep rendering the rest of the corpus
+                    report.failures.append((item["ID"], repr(e)))
+                    status = "failed"
+                else:
+                    failed = sum(bool(r.error) for r in records)
+                    manifests[out_dir].update(
+                        item,
+                        _index_section(item["ProblemNumber"], q_html),
+                        complete=not failed,
+                    )
+                    report.cache_hits += hits
+                    report.cache_misses += misses
+                    report.diagrams += records
+                    report.math_fallbacks += [(item["ID"], t) for t in fallbacks]
+                    if profiling.active() is not None:
+                        profiling.active().events += events
+                    status = f"ok, {failed} diagrams failed" if failed else "ok"
+                elapsed = time.perf_counter() - start
+                progress(f"[{done}/{total}] {item['ID']} {status} ({elapsed:.1f}s)")
+                remaining[out_dir] -= 1
+                if remaining[out_dir] == 0:
+                    finish(out_dir)
+    report.problems = total - len(report.failures)
+    report.failures.sort()
+    report.math_fallbacks.sort()
+    _write_errors(Path(output_root) / "diagram_errors.json", report.diagrams)
+    report.seconds = time.perf_counter() - start
+    return report
 
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Render AoPS wikitext to HTML")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--cache-size-mb", type=int, default=256)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Disable the diagram cache"
+    )
+    parser.add_argument(
+        "--diagram-timeout",
+        type=float,
+        default=DIAGRAM_TIMEOUT,
+        help="Seconds before a diagram's asy/pdftocairo process group is killed",
+    )
+    parser.add_argument(
+        "--diagram-memory-mb",
+        type=int,
+        default=DIAGRAM_MEMORY // (1024 * 1024),
+        help="Address space limit of each asy/pdftocairo run",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Time each stage of the run"
+    )
+    parser.add_argument(
+        "--profile-output",
+        default="render_profile.json",
+        metavar="TRACE",
+        help="Chrome trace written with --profile",
+    )
+    parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=10,
+        help="Slowest diagrams listed with --profile",
+    )
     sub = parser.add_subparsers(dest="cmd", required=True)
 
     file_p = sub.add_parser("file", help="Render a wikitext file")
     file_p.add_argument("input")
     file_p.add_argument("output")
 
-    json_p = sub.add_parser("json", help="Render problems from a JSON file")
-    json_p.add_argument("input")
+    json_p = sub.add_parser("json", help="Render problems from JSON files")
+    json_p.add_argument("input", nargs="+")
     json_p.add_argument("output_dir")
+    json_p.add_argument(
+        "--force", action="store_true", help="Ignore the build manifest"
+    )
+    json_p.add_argument(
+        "--assets",
+        action="store_true",
+        help="Write diagrams as shared SVG files instead of inlining them",
+    )
+    json_p.add_argument(
+        "--gzip", action="store_true", help="Also write precompressed .gz files"
+    )
+
+    corpus_p = sub.add_parser(
+        "render-corpus", help="Render every *_problems tree in parallel"
+    )
+    corpus_p.add_argument("output_dir")
+    corpus_p.add_argument("--root", default=".")
+    corpus_p.add_argument(
+        "--jobs", type=int, default=os.cpu_count(), help="Worker processes"
+    )
+    corpus_p.add_argument(
+        "--force", action="store_true", help="Ignore the build manifests"
+    )
+    corpus_p.add_argument(
+        "--assets",
+        action="store_true",
+        help="Write diagrams as shared SVG files instead of inlining them",
+    )
+    corpus_p.add_argument(
+        "--gzip", action="store_true", help="Also write precompressed .gz files"
+    )
+
+    bench_p = sub.add_parser(
+        "bench-math", help="Compare page weight and build time of the math modes"
+    )
+    bench_p.add_argument("input", nargs="+")
+    bench_p.add_argument("--repeat", type=int, default=3)
+
+    for render_p in (file_p, json_p, corpus_p):
+        render_p.add_argument(
+            "--math",
+            choices=MATH_MODES,
+            default="mathjax",
+            help="Typeset math in the browser with MathJax or as static MathML",
+        )
+    for render_p in (json_p, corpus_p):
+        render_p.add_argument(
+            "--thumbnails",
+            action="store_true",
+            help="Also write PNG/WebP variants; index pages show thumbnails "
+            "(needs --assets)",
+        )
+
+    warm_p = sub.add_parser("prewarm", help="Render all corpus diagrams into the cache")
+    warm_p.add_argument("--root", default=".")
 
     args = parser.parse_args()
+    if getattr(args, "thumbnails", False) and not args.assets:
+        parser.error("--thumbnails needs --assets")
+    DIAGRAM_TIMEOUT = args.diagram_timeout
+    DIAGRAM_MEMORY = args.diagram_memory_mb * 1024 * 1024
+    profiler = profiling.enable() if args.profile else None
+    records: list[DiagramRecord] = []
+    # render-corpus workers open their own connections to the cache
+    cache = (
+        None
+        if args.no_cache or args.cmd == "render-corpus"
+        else DiagramCache(args.cache_dir, args.cache_size_mb * 1024 * 1024)
+    )
 
     if args.cmd == "file":
         with open(args.input, "r", encoding="utf-8") as f:
             text = f.read()
-        html = render_wikitext(text)
-        page = f"<html><head>{MATHJAX_SCRIPT}</head><body>\n{html}\n</body></html>"
+        html = render_wikitext(text, cache, math=args.math)
+        page = PAGE_TEMPLATE.format(head=math_head(args.math), body=html)
         with open(args.output, "w", encoding="utf-8") as f:
             f.write(page)
+        if args.math == "mathml":
+            for tex in math_fallbacks(html):
+                print(f"Kept as TeX: {tex}")
     elif args.cmd == "json":
-        render_json(args.input, args.output_dir)
+        rendered: dict[str, str] = {}
+        diagrams: dict[str, bytes | DiagramError] = {}
+        fallbacks: list[tuple[str, str]] = []
+        # each file needs its own manifest: with several, each gets a
+        # subdirectory and they share one assets/ directory
+        out_dirs = [args.output_dir]
+        if len(args.input) > 1:
+            out_dirs = [os.path.join(args.output_dir, Path(f).stem) for f in args.input]
+            if len(set(out_dirs)) < len(out_dirs):
+                parser.error("input files need distinct names")
+        for json_file, out_dir in zip(args.input, out_dirs):
+            render_json(
+                json_file,
+                out_dir,
+                rendered,
+                cache=cache,
+                force=args.force,
+                assets=args.assets,
+                compress=args.gzip,
+                records=records,
+                math=args.math,
+                fallbacks=fallbacks,
+                thumbnails=args.thumbnails,
+                assets_dir=os.path.join(args.output_dir, "assets"),
+                diagrams=diagrams,
+            )
+        print(diagram_summary(records))
+        if fallbacks:
+            print(math_summary(fallbacks))
+    elif args.cmd == "render-corpus":
+        report = render_corpus(
+            args.root,
+            args.output_dir,
+            jobs=args.jobs,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            cache_bytes=args.cache_size_mb * 1024 * 1024,
+            force=args.force,
+            assets=args.assets,
+            compress=args.gzip,
+            math=args.math,
+            thumbnails=args.thumbnails,
+        )
+        records = report.diagrams
+        print(report.summary())
+    elif args.cmd == "bench-math":
+        results = benchmark_math(args.input, args.repeat)
+        print(
+            f"{'mode':<8} {'pages':>6} {'build s':>8} {'KB':>9} {'gzip KB':>8} "
+            f"{'typeset in browser':>19} {'kept as TeX':>12}"
+        )
+        for math, r in results.items():
+            print(
+                f"{math:<8} {r['pages']:>6} {r['seconds']:>8.2f} "
+                f"{r['bytes'] / 1024:>9.1f} {r['gzip_bytes'] / 1024:>8.1f} "
+                f"{r['browser_typeset']:>19} {r['fallbacks']:>12}"
+            )
+    elif args.cmd == "prewarm":
+        if cache is None:
+            raise SystemExit("prewarm needs the diagram cache")
+        diagrams, failures = prewarm(args.root, cache)
+        print(f"{diagrams} diagrams, {failures} failed")
+    if cache is not None:
+        print(f"Diagram cache: {cache.hits} hits, {cache.misses} misses")
+        cache.close()
+    if profiler is not None:
+        profiler.write_trace(args.profile_output)
+        print(profiler.table())
+        slowest = sorted(records, key=lambda r: -r.seconds)[: args.profile_top]
+        if slowest:
+            print("Slowest diagrams:")
+        for r in slowest:
+            error = f" ({r.error})" if r.error else ""
+            print(f"  {r.owner} [{r.digest}] {r.seconds * 1000:.0f} ms{error}")
+        print(f"Trace written to {args.profile_output}")
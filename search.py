@@ -0,0 +1,380 @@
+"""Full-text search over problem questions and solutions.
+
+The tokenizer understands the AoPS wikitext used in the corpus: ``<math>``,
+``<cmath>`` and ``$...$`` contents are tokenized rather than discarded, LaTeX
+commands become tokens of their own (``\\frac``, ``\\sqrt``; ``\\dfrac`` is
+folded into ``\\frac``), wiki links keep only their label and ``<asy>`` code
+is skipped. Documents are ranked with BM25, question text counting more than
+solution text.
+
+The index is a SQLite database holding the postings (term, document,
+weighted term frequency) and per-document filter metadata. Opening it reads
+nothing up front: a query only touches the postings of its own terms, and
+documents are indexed by file so re-indexing a changed file only replaces
+that file's rows.
+"""
+
+import json
+import math
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from corpus_store import _year_num, iter_problem_files
+
+DEFAULT_INDEX = "search_index.sqlite"
+K1 = 1.2
+B = 0.75
+QUESTION_WEIGHT = 2
+
+_ASY_RE = re.compile(r"<asy>.*?</asy>", re.DOTALL | re.IGNORECASE)
+_LINK_RE = re.compile(r"\[\[(?:[^\]|]*\|)?([^\]]*)\]\]")
+_TAG_RE = re.compile(r"</?[a-zA-Z]+[^>]*>")
+_TOKEN_RE = re.compile(r"\\[a-zA-Z]+|[a-zA-Z]+|\d+")
+_COMMAND_ALIASES = {"\\dfrac": "\\frac", "\\tfrac": "\\frac", "\\le": "\\leq"}
+_COMMAND_ALIASES.update({"\\ge": "\\geq", "\\ne": "\\neq"})
+# layout commands that carry no meaning for search
+_IGNORED_COMMANDS = {"\\left", "\\right", "\\displaystyle", "\\qquad", "\\quad"}
+_IGNORED_COMMANDS |= {"\\textbf", "\\mathrm", "\\text", "\\mbox", "\\boxed"}
+_STOPWORDS = set(
+    "a an and are as at be by for from has have if in is it its of on or that the "
+    "then this to was were what which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split AoPS wikitext into search tokens."""
+    text = _ASY_RE.sub(" ", text)
+    text = _LINK_RE.sub(r" \1 ", text)
+    text = _TAG_RE.sub(" ", text)
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        if token[0] == "\\":
+            # command names stay case-sensitive (\Delta is not \delta)
+            if token in _IGNORED_COMMANDS:
+                continue
+            token = _COMMAND_ALIASES.get(token, token)
+        else:
+            token = token.lower()
+            if token in _STOPWORDS:
+                continue
+        tokens.append(token)
+    return tokens
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    pid TEXT NOT NULL UNIQUE,
+    file TEXT,
+    len INTEGER NOT NULL,
+    source TEXT,
+    year INTEGER
+);
+CREATE INDEX IF NOT EXISTS docs_file ON docs (file);
+CREATE TABLE IF NOT EXISTS doc_topics (
+    doc INTEGER NOT NULL,
+    topic TEXT NOT NULL,
+    PRIMARY KEY (doc, topic)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, doc)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc);
+"""
+
+
+class SearchIndex:
+    """Incrementally updatable BM25 index over problem records.
+
+    ``path`` defaults to an in-memory index; :meth:`save` commits it, or
+    copies it to another file.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+        # (number of documents, average length), cached between updates
+        self._stats: Optional[Tuple[int, float]] = None
+
+    def close(self) -> None:
+        self.db.close()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._collection_stats()[0]
+
+    # -- building ---------------------------------------------------------
+
+    def add(self, item: Dict[str, Any], file: Optional[str] = None) -> None:
+        """Index (or re-index) one problem record."""
+        terms = Counter()
+        for token in tokenize(item.get("Question", "")):
+            terms[token] += QUESTION_WEIGHT
+        terms.update(tokenize(item.get("Solution", "")))
+        self.remove(item["ID"])
+        doc = self.db.execute(
+            "INSERT INTO docs (pid, file, len, source, year) VALUES (?, ?, ?, ?, ?)",
+            (
+                item["ID"],
+                file,
+                sum(terms.values()),
+                item.get("Source"),
+                _year_num(item.get("Year")),
+            ),
+        ).lastrowid
+        self.db.executemany(
+            "INSERT OR IGNORE INTO doc_topics VALUES (?, ?)",
+            [(doc, topic) for topic in item.get("Topics") or []],
+        )
+        self.db.executemany(
+            "INSERT INTO postings VALUES (?, ?, ?)",
+            [(term, doc, tf) for term, tf in terms.items()],
+        )
+        self._stats = None
+
+    def remove(self, problem_id: str) -> None:
+        row = self.db.execute(
+            "SELECT id FROM docs WHERE pid = ?", (problem_id,)
+        ).fetchone()
+        if row is not None:
+            self._delete_docs("id = ?", row)
+
+    def update_from_tree(self, root: str = ".") -> Tuple[int, int]:
+        """Re-index changed ``*_problems`` files and drop deleted ones.
+
+        Returns ``(files indexed, files removed)``.
+        """
+        known = {
+            path: (mtime_ns, size)
+            for path, mtime_ns, size in self.db.execute("SELECT * FROM files")
+        }
+        seen = set()
+        indexed = 0
+        for path in iter_problem_files(root):
+            rel = os.path.relpath(path, root)
+            seen.add(rel)
+            stat = os.stat(path)
+            if known.get(rel) == (stat.st_mtime_ns, stat.st_size):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            self._delete_docs("file = ?", (rel,))
+            for item in items:
+                self.add(item, rel)
+            self.db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                (rel, stat.st_mtime_ns, stat.st_size),
+            )
+            indexed += 1
+        stale = [rel for rel in known if rel not in seen]
+        for rel in stale:
+            self._delete_docs("file = ?", (rel,))
+            self.db.execute("DELETE FROM files WHERE path = ?", (rel,))
+        return indexed, len(stale)
+
+    def _delete_docs(self, where: str, params: Tuple[Any, ...]) -> None:
+        selected = f"SELECT id FROM docs WHERE {where}"
+        self.db.execute(f"DELETE FROM postings WHERE doc IN ({selected})", params)
+        self.db.execute(f"DELETE FROM doc_topics WHERE doc IN ({selected})", params)
+        self.db.execute(f"DELETE FROM docs WHERE {where}", params)
+        self._stats = None
+
+    # -- persistence ------------------------------------------------------
+
+    def save(self, path: str = DEFAULT_INDEX) -> None:
+        self.db.commit()
+        if os.path.abspath(path) != os.path.abspath(self.path):
+            tmp = f"{path}.tmp"
+            target = sqlite3.connect(tmp)
+            self.db.backup(target)
+            target.close()
+            os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str = DEFAULT_INDEX) -> "SearchIndex":
+        return cls(path)
+
+    # -- querying ---------------------------------------------------------
+
+    def _collection_stats(self) -> Tuple[int, float]:
+        if self._stats is None:
+            n, total = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(len), 0) FROM docs"
+            ).fetchone()
+            self._stats = (n, total / n if n else 1.0)
+        return self._stats
+
+    def search(
+        self,
+        query: str,
+        *,
+        limit: int = 10,
+        source: Optional[str] = None,
+        year_from: Optional[int] = None,
+        year_to: Optional[int] = None,
+        topic: Optional[str] = None,
+        canonical: Optional[Dict[str, str]] = None,
+    ) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` ``(ID, score)`` pairs, best match first.
+
+        With a ``canonical`` map (see :func:`dedup.load_canonical`) only the
+        best-scoring copy of each group of duplicate problems is returned.
+        """
+        n, avg_len = self._collection_stats()
+        conditions, params = [], []
+        if source is not None:
+            conditions.append("d.source = ?")
+            params.append(source)
+        if year_from is not None:
+            conditions.append("d.year >= ?")
+            params.append(year_from)
+        if year_to is not None:
+            conditions.append("d.year <= ?")
+            params.append(year_to)
+        if topic is not None:
+            conditions.append(
+                "EXISTS (SELECT 1 FROM doc_topics t WHERE t.doc = d.id AND t.topic = ?)"
+            )
+            params.append(topic)
+        idf: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            (df,) = self.db.execute(
+                "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+            ).fetchone()
+            if df:
+                idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        if not idf:
+            return []
+        # BM25, summed over the query terms by SQLite rather than per posting
+        # in Python
+        weight = "CASE p.term" + " WHEN ? THEN ?" * len(idf) + " END"
+        rows = self.db.execute(
+            f"SELECT d.pid, SUM(({weight}) * p.tf * {K1 + 1} / "
+            f"(p.tf + {K1} * ({1 - B} + {B} * d.len / ?))) AS score "
+            "FROM postings p JOIN docs d ON d.id = p.doc "
+            f"WHERE p.term IN ({', '.join('?' * len(idf))})"
+            + "".join(f" AND {c}" for c in conditions)
+            + " GROUP BY p.doc ORDER BY score DESC, d.id"
+            + ("" if canonical else f" LIMIT {int(limit)}"),
+            (*[x for item in idf.items() for x in item], avg_len, *idf, *params),
+        )
+        if canonical is None:
+            return rows.fetchall()
+        # rows come best first, so the first hit of a group is its best copy
+        best: Dict[str, Tuple[str, float]] = {}
+        for pid, score in rows:
+            best.setdefault(canonical.get(pid, pid), (pid, score))
+            if len(best) == limit:
+                break
+        return list(best.values())
+
+
+def benchmark(path: str, queries: Iterable[str], repeat: int = 20) -> Dict[str, float]:
+    """Time a command-line query against the index at ``path``.
+
+    ``load`` is opening the index plus the first query, as ``search.py
+    query`` pays it; the percentiles are over the following queries. All
+    values are in milliseconds.
+    """
+    queries = list(queries)
+    if not queries:
+        return {}
+    start = time.perf_counter()
+    with SearchIndex.load(path) as index:
+        index.search(queries[0])
+        load = (time.perf_counter() - start) * 1000
+        samples = []
+        for _ in range(repeat):
+            for query in queries:
+                start = time.perf_counter()
+                index.search(query)
+                samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "load": load,
+        "queries": len(samples),
+        "p50": samples[len(samples) // 2],
+        "p95": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "max": samples[-1],
+    }
+
+
+BENCH_QUERIES = [
+    "triangle area",
+    "\\frac{1}{2} probability",
+    "remainder divided by 1000",
+    "\\sqrt circle radius tangent",
+    "number of ordered pairs",
+    "geometric sequence sum",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from dedup import load_canonical
+
+    parser = argparse.ArgumentParser(description="Search the problem corpus")
+    parser.add_argument("--index", default=DEFAULT_INDEX)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    build_p = sub.add_parser("build", help="Create or update the index")
+    build_p.add_argument("--root", default=".")
+    query_p = sub.add_parser("query", help="Run a query")
+    query_p.add_argument("text")
+    query_p.add_argument("--source")
+    query_p.add_argument("--since", type=int)
+    query_p.add_argument("--until", type=int)
+    query_p.add_argument("--topic")
+    query_p.add_argument("--limit", type=int, default=10)
+    query_p.add_argument(
+        "--all-copies",
+        action="store_true",
+        help="Do not collapse duplicates listed in duplicates.json",
+    )
+    sub.add_parser("bench", help="Measure query latency")
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        with SearchIndex.load(args.index) as index:
+            indexed, removed = index.update_from_tree(args.root)
+            index.save(args.index)
+            print(f"Indexed {indexed} files, removed {removed}; {len(index)} problems")
+    elif args.cmd == "query":
+        with SearchIndex.load(args.index) as index:
+            hits = index.search(
+                args.text,
+                limit=args.limit,
+                source=args.source,
+                year_from=args.since,
+                year_to=args.until,
+                topic=args.topic,
+                canonical=None if args.all_copies else load_canonical(),
+            )
+        for pid, score in hits:
+            print(f"{score:7.3f}  {pid}")
+    else:
+        with SearchIndex.load(args.index) as index:
+            problems = len(index)
+        stats = benchmark(args.index, BENCH_QUERIES)
+        print(f"{problems} problems, {stats.get('queries', 0)} queries")
+        for key in ("load", "p50", "p95", "max"):
+            print(f"{key}: {stats.get(key, 0.0):.2f} ms")
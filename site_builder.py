@@ -0,0 +1,281 @@
+"""Static site for browsing the rendered corpus.
+
+:func:`build_site` renders every problem page with
+:func:`renderer.render_corpus` (diagrams as shared assets) and then writes
+paginated listings by source, year, subject and topic:
+
+    index.html                          every facet value with its count
+    browse/<facet>/<value>/<n>.html     at most ``page_size`` problems each
+
+Listing entries hold a link and tags only; the question is fetched from the
+problem page when the entry scrolls into view, so a listing page stays a few
+kilobytes however large its problems and diagrams are. Listings are read from
+the :class:`corpus_store.CorpusStore` database one page at a time, so memory
+does not grow with the corpus. Pages whose content did not change are not
+rewritten, and listing pages that no longer exist are deleted.
+"""
+
+import html
+import os
+import re
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from urllib.parse import quote
+
+from asset_store import write_compressed
+from corpus_store import DEFAULT_DB, FACETS, CorpusStore
+from pandoc_backend import MATH_MODES
+from renderer import PAGE_TEMPLATE, math_head, render_corpus
+
+DEFAULT_PAGE_SIZE = 50
+BROWSE_DIR = "browse"
+
+# fills every ``.question[data-src]`` from the problem page once it is near
+# the viewport; image URLs are resolved against that page, not the listing
+LAZY_SCRIPT = """<script>
+const loadQuestion = (el) => {
+  const page = new URL(el.dataset.src, location.href);
+  fetch(page).then((r) => r.text()).then((text) => {
+    const doc = new DOMParser().parseFromString(text, "text/html");
+    const question = doc.querySelector(".question");
+    if (!question) return;
+    for (const img of question.querySelectorAll("img")) {
+      img.src = new URL(img.getAttribute("src"), page).href;
+    }
+    el.replaceChildren(...question.childNodes);
+    if (window.MathJax && MathJax.typesetPromise) MathJax.typesetPromise([el]);
+  });
+};
+const observer = new IntersectionObserver((entries) => {
+  for (const entry of entries) {
+    if (entry.isIntersecting) {
+      observer.unobserve(entry.target);
+      loadQuestion(entry.target);
+    }
+  }
+}, {rootMargin: "600px"});
+document.querySelectorAll(".question[data-src]").forEach((el) => observer.observe(el));
+</script>"""
+
+
+@dataclass
+class SiteReport:
+    written: int = 0
+    unchanged: int = 0
+    removed: int = 0
+
+    def summary(self) -> str:
+        return (
+            f"Listing pages: {self.written} written, {self.unchanged} unchanged, "
+            f"{self.removed} removed"
+        )
+
+
+def slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", str(value).lower()).strip("-") or "none"
+
+
+def problem_url(record: dict) -> str:
+    """URL of a problem page relative to the site root (see render_corpus)."""
+    contest_dir = Path(record["Path"]).with_suffix("").as_posix()
+    return quote(f"{contest_dir}/{record['ID']}.html")
+
+
+def _write_if_changed(path: Path, text: str, compress: bool) -> bool:
+    data = text.encode("utf-8")
+    gz = path.with_name(path.name + ".gz")
+    if path.exists() and path.read_bytes() == data and (gz.exists() or not compress):
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    if compress:
+        write_compressed(path)
+    return True
+
+
+def _entry(record: dict, to_root: str) -> str:
+    url = html.escape(to_root + problem_url(record))
+    title = html.escape(
+        f"{record['Year']} {record['Source'] or ''} Problem {record['ProblemNumber']}"
+    )
+    tags = html.escape(", ".join(record["Subjects"]))
+    return (
+        f'<li><a href="{url}">{title}</a> <small>{tags}</small>\n'
+        f'<div class="question" data-src="{url}"></div></li>'
+    )
+
+
+def _nav(number: int, pages: int) -> str:
+    links = [
+        f'<a href="{n}.html">{n}</a>' if n != number else f"<strong>{n}</strong>"
+        for n in range(1, pages + 1)
+    ]
+    return f'<nav>{" ".join(links)}</nav>'
+
+
+def _listing_page(
+    facet: str, value: str, number: int, pages: int, entries, head: str
+) -> str:
+    heading = html.escape(f"{facet.capitalize()}: {value}")
+    body = "\n".join(
+        [
+            '<p><a href="../../../index.html">All listings</a></p>',
+            f"<h1>{heading}</h1>",
+            _nav(number, pages),
+            "<ul>",
+            *entries,
+            "</ul>",
+            _nav(number, pages),
+            LAZY_SCRIPT,
+        ]
+    )
+    return PAGE_TEMPLATE.format(head=head, body=body)
+
+
+def _home_page(facets: dict[str, list[tuple[str, str, int]]]) -> str:
+    parts = []
+    for facet, values in facets.items():
+        parts.append(f"<h2>By {facet}</h2>\n<ul>")
+        parts += [
+            f'<li><a href="{BROWSE_DIR}/{facet}/{s}/1.html">'
+            f"{html.escape(str(value))}</a> ({count})</li>"
+            for value, s, count in values
+        ]
+        parts.append("</ul>")
+    return PAGE_TEMPLATE.format(head="", body="\n".join(parts))
+
+
+def build_listings(
+    store: CorpusStore,
+    output_root: str,
+    *,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    compress: bool = False,
+    math: str = "mathjax",
+) -> SiteReport:
+    """Write ``index.html`` and the paginated listings of every facet.
+
+    ``math`` is the mode the problem pages were rendered with; MathML
+    listings load no MathJax.
+    """
+    report = SiteReport()
+    root = Path(output_root)
+    written = set()
+    facets: dict[str, list[tuple[str, str, int]]] = {}
+    for facet in FACETS:
+        used: set[str] = set()
+        facets[facet] = []
+        for value, count in store.facet_values(facet):
+            value_slug = slug(value)
+            while value_slug in used:  # values differing only in punctuation
+                value_slug += "-"
+            used.add(value_slug)
+            facets[facet].append((value, value_slug, count))
+            pages = max(1, -(-count // page_size))
+            records = store.iter_listing(facet, value)
+            for number in range(1, pages + 1):
+                entries = [
+                    _entry(record, "../../../") for record in islice(records, page_size)
+                ]
+                path = root / BROWSE_DIR / facet / value_slug / f"{number}.html"
+                page = _listing_page(
+                    facet, str(value), number, pages, entries, math_head(math)
+                )
+                if _write_if_changed(path, page, compress):
+                    report.written += 1
+                else:
+                    report.unchanged += 1
+                written.add(path)
+    home = root / "index.html"
+    if _write_if_changed(home, _home_page(facets), compress):
+        report.written += 1
+    else:
+        report.unchanged += 1
+
+    # drop listings of values, or pages, that no longer exist
+    for dirpath, dirs, files in os.walk(root / BROWSE_DIR, topdown=False):
+        for name in files:
+            path = Path(dirpath) / name
+            if path.suffix == ".html" and path not in written:
+                path.unlink()
+                Path(f"{path}.gz").unlink(missing_ok=True)
+                report.removed += 1
+        if not os.listdir(dirpath):
+            os.rmdir(dirpath)
+    return report
+
+
+def build_site(
+    root: str,
+    output_root: str,
+    *,
+    db: str = DEFAULT_DB,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    compress: bool = False,
+    math: str = "mathjax",
+    progress=print,
+    **render_options,
+) -> SiteReport:
+    """Render the corpus under ``root`` and write its listings to ``output_root``.
+
+    ``render_options`` are passed to :func:`renderer.render_corpus`.
+    """
+    report = render_corpus(
+        root,
+        output_root,
+        assets=True,
+        compress=compress,
+        math=math,
+        progress=progress,
+        **render_options,
+    )
+    progress(report.summary())
+    with CorpusStore(db) as store:
+        store.import_tree(root)
+        return build_listings(
+            store, output_root, page_size=page_size, compress=compress, math=math
+        )
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from diagram_cache import DEFAULT_CACHE_DIR
+
+    parser = argparse.ArgumentParser(description="Build the static problem site")
+    parser.add_argument("output_dir")
+    parser.add_argument("--root", default=".")
+    parser.add_argument("--db", default=DEFAULT_DB)
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=DEFAULT_PAGE_SIZE,
+        help="Problems per listing page",
+    )
+    parser.add_argument("--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--force", action="store_true")
+    parser.add_argument("--math", choices=MATH_MODES, default="mathjax")
+    parser.add_argument(
+        "--thumbnails",
+        action="store_true",
+        help="Show PNG/WebP thumbnails on contest index pages",
+    )
+    args = parser.parse_args()
+
+    site = build_site(
+        args.root,
+        args.output_dir,
+        db=args.db,
+        page_size=args.page_size,
+        compress=args.gzip,
+        math=args.math,
+        jobs=args.jobs,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        force=args.force,
+        thumbnails=args.thumbnails,
+    )
+    print(site.summary())
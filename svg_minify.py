@@ -0,0 +1,374 @@
+"""Shrink the SVG that ``pdftocairo -svg`` writes for a diagram.
+
+cairo writes every coordinate with full precision, every style property of
+every path (mostly repeating the defaults or the enclosing group), a group
+per clip or colour change, and a ``<symbol>`` for every glyph of the font
+subset whether it is drawn or not. :func:`minify` rounds numbers to
+``precision`` decimals, turns ``style`` into presentation attributes and
+drops those a path would inherit anyway, collapses groups with a single
+child or no attributes, and removes unreferenced definitions and ids.
+
+Definitions (glyph symbols, clip paths) are renamed after a hash of their
+content, so the same glyph has the same id in every diagram and ids of
+different diagrams never clash: duplicates within a diagram are merged, and
+:func:`share_glyphs` can move the glyphs of several diagrams into one
+definition block when the SVGs are inlined into the same HTML page.
+"""
+
+import hashlib
+import re
+from xml.etree import ElementTree as ET
+
+VERSION = 1  # bump when the output of minify() changes
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+HREF = f"{{{XLINK_NS}}}href"
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+_NUM_RE = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?")
+_PATH_TOKEN_RE = re.compile(r"[A-Za-z]|" + _NUM_RE.pattern)
+_RGB_RE = re.compile(r"rgb\(\s*([\d.]+)%\s*,\s*([\d.]+)%\s*,\s*([\d.]+)%\s*\)")
+_REF_RE = re.compile(r"url\(#([^)]+)\)")
+
+# initial values of the inherited properties cairo writes
+_INHERITED = {
+    "fill": "#000",
+    "fill-opacity": "1",
+    "fill-rule": "nonzero",
+    "clip-rule": "nonzero",
+    "stroke": "none",
+    "stroke-width": "1",
+    "stroke-opacity": "1",
+    "stroke-linecap": "butt",
+    "stroke-linejoin": "miter",
+    "stroke-miterlimit": "4",
+    "stroke-dasharray": "none",
+    "stroke-dashoffset": "0",
+}
+_PRESENTATION = set(_INHERITED) | {"opacity", "clip-path", "mask", "overflow"}
+# attributes holding numbers; transforms get two more digits (scale factors)
+_NUMERIC = {
+    "x",
+    "y",
+    "width",
+    "height",
+    "x1",
+    "y1",
+    "x2",
+    "y2",
+    "cx",
+    "cy",
+    "r",
+    "rx",
+    "ry",
+    "points",
+    "viewBox",
+    "stroke-width",
+    "stroke-dasharray",
+    "stroke-dashoffset",
+}
+# group attributes that cannot move onto a child which has its own
+_GROUP_ONLY = {"clip-path", "mask", "opacity", "filter"}
+# resolved in the user space of the element that carries them, so they cannot
+# move onto a child with its own transform
+_USER_SPACE = {"clip-path", "mask", "filter"}
+
+
+def _tag(el: ET.Element) -> str:
+    return el.tag.rsplit("}", 1)[-1]
+
+
+def _num(value: str, precision: int) -> str:
+    text = f"{float(value):.{precision}f}"
+    if "." in text:
+        text = text.rstrip("0").rstrip(".")
+    if text in ("-0", ""):
+        return "0"
+    if text.startswith("0."):
+        return text[1:]
+    if text.startswith("-0."):
+        return "-" + text[2:]
+    return text
+
+
+def _round_numbers(text: str, precision: int) -> str:
+    return _NUM_RE.sub(lambda m: _num(m.group(0), precision), text)
+
+
+def _compact_path(d: str, precision: int) -> str:
+    """Round the numbers of path data and drop the separators it can do without."""
+    out: list[str] = []
+    prev = ""
+    for token in _PATH_TOKEN_RE.findall(d):
+        if token.isalpha():
+            out.append(token)
+            prev = token
+            continue
+        num = _num(token, precision)
+        if prev and not prev.isalpha():
+            # "-" always starts a new number, and ".5" does after a fraction
+            if not (num[0] == "-" or (num[0] == "." and "." in prev)):
+                out.append(" ")
+        out.append(num)
+        prev = num
+    return "".join(out)
+
+
+def _color(value: str) -> str:
+    m = _RGB_RE.fullmatch(value.strip())
+    if not m:
+        return value.strip()
+    digits = "".join(f"{round(float(p) * 255 / 100):02x}" for p in m.groups())
+    if all(digits[i] == digits[i + 1] for i in (0, 2, 4)):
+        digits = digits[::2]
+    return "#" + digits
+
+
+def _normalize_style(el: ET.Element) -> None:
+    """Move known ``style`` properties to attributes and shorten colours."""
+    style = el.attrib.pop("style", None)
+    rest = []
+    if style:
+        for decl in style.split(";"):
+            if ":" not in decl:
+                continue
+            prop, value = (s.strip() for s in decl.split(":", 1))
+            if prop in _PRESENTATION:
+                el.set(prop, value)  # style wins over a presentation attribute
+            else:
+                rest.append(f"{prop}:{value}")
+    if rest:
+        el.set("style", ";".join(rest))
+    for prop in ("fill", "stroke"):
+        if prop in el.attrib:
+            el.set(prop, _color(el.get(prop)))
+
+
+def _drop_inherited(el: ET.Element, inherited: dict[str, str]) -> None:
+    """Remove properties equal to what ``el`` inherits, then recurse."""
+    for prop in _INHERITED:
+        if el.get(prop) == inherited.get(prop):
+            del el.attrib[prop]
+    context = {**inherited, **{p: el.get(p) for p in _INHERITED if p in el.attrib}}
+    for child in el:
+        # glyphs and clip paths take their context from where they are used
+        if _tag(child) != "defs":
+            _drop_inherited(child, context)
+
+
+def _merge_into_child(group: ET.Element, child: ET.Element) -> bool:
+    if "id" in group.attrib:
+        return False
+    if any(a in child.attrib for a in _GROUP_ONLY if a in group.attrib):
+        return False
+    if "transform" in child.attrib and any(a in group.attrib for a in _USER_SPACE):
+        return False
+    for name, value in group.attrib.items():
+        if name == "transform":
+            inner = child.get("transform")
+            child.set("transform", f"{value} {inner}" if inner else value)
+        elif name not in child.attrib:
+            child.set(name, value)
+    return True
+
+
+def _collapse_groups(parent: ET.Element) -> None:
+    for child in list(parent):
+        _collapse_groups(child)
+    if _tag(parent) == "defs":
+        return
+    i = 0
+    while i < len(parent):
+        child = parent[i]
+        if _tag(child) == "g" and (
+            not child.attrib or (len(child) == 1 and _merge_into_child(child, child[0]))
+        ):
+            parent.remove(child)
+            for j, grandchild in enumerate(list(child)):
+                parent.insert(i + j, grandchild)
+            continue
+        i += 1
+
+
+def _references(root: ET.Element) -> set[str]:
+    refs = set()
+    for el in root.iter():
+        for name, value in el.attrib.items():
+            if name in (HREF, "href") and value.startswith("#"):
+                refs.add(value[1:])
+            else:
+                refs.update(_REF_RE.findall(value))
+    return refs
+
+
+def _rename_refs(root: ET.Element, renames: dict[str, str]) -> None:
+    for el in root.iter():
+        for name, value in el.attrib.items():
+            if name in (HREF, "href") and value[1:] in renames:
+                el.set(name, "#" + renames[value[1:]])
+            elif "url(#" in value:
+                el.set(
+                    name,
+                    _REF_RE.sub(lambda m: f"url(#{renames.get(m[1], m[1])})", value),
+                )
+
+
+def _definitions(root: ET.Element):
+    """Yield ``(holder, element)`` for every definition inside ``<defs>``."""
+    for defs in root.iter(f"{{{SVG_NS}}}defs"):
+        for holder in [defs, *defs.iter(f"{{{SVG_NS}}}g")]:
+            for child in list(holder):
+                if _tag(child) != "g":
+                    yield holder, child
+
+
+def _hash_ids(root: ET.Element) -> None:
+    """Name every definition after its content, merging identical ones."""
+    renames: dict[str, str] = {}
+    seen = set()
+    for holder, el in list(_definitions(root)):
+        old = el.attrib.pop("id", None)
+        if old is None:
+            continue
+        body = ET.tostring(el, encoding="unicode")
+        new = _tag(el)[0] + hashlib.sha1(body.encode("utf-8")).hexdigest()[:10]
+        renames[old] = new
+        if new in seen:
+            holder.remove(el)
+        else:
+            el.set("id", new)
+            seen.add(new)
+    _rename_refs(root, renames)
+
+
+def _prune_defs(parent: ET.Element, refs: set[str]) -> bool:
+    removed = False
+    for child in list(parent):
+        if _tag(child) == "g":
+            removed |= _prune_defs(child, refs)
+            unused = len(child) == 0
+        else:
+            unused = child.get("id") not in refs
+        if unused:
+            parent.remove(child)
+            removed = True
+    return removed
+
+
+def _prune(root: ET.Element) -> None:
+    """Drop unreferenced definitions, empty ``<defs>`` and unused ids."""
+    while True:
+        refs = _references(root)
+        removed = False
+        for parent in list(root.iter()):
+            for defs in parent.findall(f"{{{SVG_NS}}}defs"):
+                removed |= _prune_defs(defs, refs)
+                if len(defs) == 0:
+                    parent.remove(defs)
+        if not removed:
+            break
+    for el in root.iter():
+        if "id" in el.attrib and el.get("id") not in refs:
+            del el.attrib["id"]
+
+
+def minify(svg: bytes, precision: int = 2) -> bytes:
+    """Return a smaller SVG that draws the same as ``svg``.
+
+    Coordinates are rounded to ``precision`` decimals. Input that is not
+    well-formed XML is returned unchanged.
+    """
+    try:
+        root = ET.fromstring(svg)
+    except ET.ParseError:
+        return svg
+    root.attrib.pop("version", None)
+    for el in root.iter():
+        if el.text is not None and not el.text.strip():
+            el.text = None
+        if el.tail is not None and not el.tail.strip():
+            el.tail = None
+        _normalize_style(el)
+        for name, value in el.attrib.items():
+            if name == "d":
+                el.set(name, _compact_path(value, precision))
+            elif name == "transform":
+                el.set(name, _round_numbers(value, precision + 2))
+            elif name in _NUMERIC and el is not root:
+                el.set(name, _round_numbers(value, precision))
+    root.set("viewBox", _round_numbers(root.get("viewBox", ""), precision))
+    if not root.get("viewBox"):
+        del root.attrib["viewBox"]
+    _drop_inherited(root, _INHERITED)
+    _hash_ids(root)
+    _prune(root)
+    _collapse_groups(root)
+    return _serialize(root)
+
+
+def _serialize(root: ET.Element) -> bytes:
+    return ET.tostring(root, encoding="unicode").replace(" />", "/>").encode("utf-8")
+
+
+def share_glyphs(svgs: list[bytes]) -> tuple[bytes, list[bytes]]:
+    """Move the glyphs of minified ``svgs`` into one shared definition block.
+
+    Returns a hidden ``<svg>`` holding each distinct glyph once and the
+    diagrams without their glyphs. Only valid when all of them are inlined
+    into the same HTML document, as ``<use>`` cannot reach into other files
+    (or out of an ``<img>``).
+    """
+    glyphs: dict[str, ET.Element] = {}
+    stripped = []
+    for svg in svgs:
+        root = ET.fromstring(svg)
+        for parent in list(root.iter()):
+            for symbol in parent.findall(f"{{{SVG_NS}}}symbol"):
+                glyphs.setdefault(symbol.get("id"), symbol)
+                parent.remove(symbol)
+        for parent in list(root.iter()):
+            for child in list(parent):
+                if _tag(child) in ("defs", "g") and len(child) == 0:
+                    parent.remove(child)
+        stripped.append(_serialize(root))
+    sprite = ET.Element(f"{{{SVG_NS}}}svg", {"width": "0", "height": "0"})
+    sprite.set("style", "position:absolute")
+    defs = ET.SubElement(sprite, f"{{{SVG_NS}}}defs")
+    defs.extend(glyphs[key] for key in sorted(glyphs))
+    return _serialize(sprite), stripped
+
+
+if __name__ == "__main__":
+    import argparse
+    from pathlib import Path
+
+    parser = argparse.ArgumentParser(description="Minify SVG diagrams in place")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--precision", type=int, default=2)
+    parser.add_argument(
+        "--share",
+        metavar="SPRITE",
+        help="Move the glyphs of all files into this shared SVG",
+    )
+    args = parser.parse_args()
+
+    before = after = 0
+    outputs = []
+    for name in args.files:
+        data = Path(name).read_bytes()
+        small = minify(data, args.precision)
+        outputs.append(small)
+        before += len(data)
+        after += len(small)
+        print(
+            f"{name}: {len(data)} -> {len(small)} bytes (saved {len(data) - len(small)})"
+        )
+    if args.share:
+        sprite, outputs = share_glyphs(outputs)
+        Path(args.share).write_bytes(sprite)
+        after = sum(map(len, outputs)) + len(sprite)
+    for name, small in zip(args.files, outputs):
+        Path(name).write_bytes(small)
+    print(f"Total: {before} -> {after} bytes (saved {before - after})")
@@ -0,0 +1,133 @@
+import gzip
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aops_downloader import WikiClient
+
+
+class FakeWiki:
+    """Minimal in-process stand-in for the MediaWiki ``api.php`` endpoint."""
+
+    def __init__(self) -> None:
+        self.pages: dict[str, str] = {}
+        self.redirects: dict[str, str] = {}
+        # current revision id per title; pages default to revision 1
+        self.revids: dict[str, int] = {}
+        # entries for list=recentchanges: {"title": ..., "timestamp": ...}
+        self.changes: list[dict[str, str]] = []
+        self.requests: list[dict[str, str]] = []
+        # scripted (status, headers, body) responses served before normal ones
+        self.errors: list[tuple[int, dict, dict]] = []
+        self.connections = 0
+        self.url = ""
+
+    def api(self, params: dict[str, str]) -> dict:
+        if params.get("list") == "allpages":
+            titles = sorted(
+                t
+                for t in self.pages
+                if t.startswith(params["apprefix"]) and t not in self.redirects
+            )
+            start = titles.index(params["apcontinue"]) if "apcontinue" in params else 0
+            limit = 500 if params["aplimit"] == "max" else int(params["aplimit"])
+            result = {
+                "query": {
+                    "allpages": [{"title": t} for t in titles[start : start + limit]]
+                }
+            }
+            if start + limit < len(titles):
+                result["continue"] = {"apcontinue": titles[start + limit]}
+            return result
+        if params.get("list") == "recentchanges":
+            changes = [c for c in self.changes if c["timestamp"] >= params["rcstart"]]
+            return {"query": {"recentchanges": changes}}
+        titles = params["titles"].split("|")
+        normalized = [
+            {"from": t, "to": t[0].upper() + t[1:]} for t in titles if t[0].islower()
+        ]
+        titles = [t[0].upper() + t[1:] for t in titles]
+        redirects = [
+            {"from": t, "to": self.redirects[t]} for t in titles if t in self.redirects
+        ]
+        pages = {}
+        for i, t in enumerate(self.redirects.get(t, t) for t in titles):
+            if t in self.pages:
+                revid = self.revids.get(t, 1)
+                revision = {
+                    "revid": revid,
+                    "timestamp": f"2024-01-{revid:02d}T00:00:00Z",
+                }
+                if "content" in params.get("rvprop", "content"):
+                    revision["slots"] = {"main": {"*": self.pages[t]}}
+                pages[str(i + 1)] = {
+                    "pageid": i + 1,
+                    "title": t,
+                    "lastrevid": revid,
+                    "revisions": [revision],
+                }
+            else:
+                pages[str(-i - 1)] = {"title": t, "missing": ""}
+        return {
+            "query": {"normalized": normalized, "redirects": redirects, "pages": pages}
+        }
+
+
+def _make_handler(wiki: FakeWiki):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self) -> None:
+            super().setup()
+            wiki.connections += 1
+
+        def do_GET(self) -> None:
+            query = parse_qs(urlparse(self.path).query)
+            params = {k: v[0] for k, v in query.items()}
+            wiki.requests.append(params)
+            status, headers, payload = 200, {}, None
+            if wiki.errors:
+                status, headers, payload = wiki.errors.pop(0)
+            else:
+                payload = wiki.api(params)
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header("Content-Type", "application/json")
+            if "gzip" in self.headers.get("Accept-Encoding", ""):
+                body = gzip.compress(body)
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def fake_wiki():
+    wiki = FakeWiki()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(wiki))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    wiki.url = f"http://127.0.0.1:{server.server_address[1]}/wiki/api.php"
+    yield wiki
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def wiki_client(fake_wiki):
+    with WikiClient(fake_wiki.url, connect_timeout=2, read_timeout=5) as client:
+        yield client
@@ -0,0 +1,66 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from corpus_store import CorpusStore
+
+
+def _problem(pid, year, source, subjects=None, topics=None, **extra):
+    item = {
+        "ID": pid,
+        "Year": year,
+        "ProblemNumber": int(pid.rsplit("-", 1)[1]),
+        "QuestionType": "int3" if source == "AIME" else "choice",
+        "Question": f"Question {pid}",
+        "Answer": "1",
+        "Solution": "",
+        "Source": source,
+    }
+    item.update(extra)
+    if subjects is not None:
+        item["Subjects"] = subjects
+        item["Topics"] = topics
+    return item
+
+
+def _write(root, rel, items):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(items, indent=2), encoding="utf-8")
+    return path
+
+
+def test_import_query_export_roundtrip(tmp_path):
+    src = tmp_path / "src"
+    aime = [
+        _problem("2012-AIME I-1", "2012", "AIME", ["Geometry"], ["Triangles"]),
+        _problem("2012-AIME I-2", "2012", "AIME", ["Algebra"], ["Polynomials"]),
+    ]
+    old = [_problem("2005-AIME I-3", "2005", "AIME", ["Geometry"], ["Circles"])]
+    amc = [_problem("2021 Fall-10A-1", "2021 Fall", "AMC10", Provider="quokka")]
+    _write(src, "aime_problems/AIME I/2012-AIME I.json", aime)
+    _write(src, "aime_problems/AIME I/2005-AIME I.json", old)
+    amc_path = _write(src, "amc_problems/10A/2021 Fall-10A.json", amc)
+    _write(src, "notes/ignored.json", [])
+
+    with CorpusStore(str(tmp_path / "c.sqlite")) as store:
+        assert store.import_tree(str(src)) == (3, 0)
+        assert store.import_tree(str(src)) == (0, 0)
+
+        hits = store.query(source="AIME", subject="Geometry", year_from=2010)
+        assert [h["ID"] for h in hits] == ["2012-AIME I-1"]
+        assert hits[0] == aime[0]
+        assert [h["ID"] for h in store.query(topic="Circles")] == ["2005-AIME I-3"]
+        assert store.query(source="AMC10")[0]["Provider"] == "quokka"
+
+        amc_path.unlink()
+        assert store.import_tree(str(src)) == (0, 1)
+        assert store.query(source="AMC10") == []
+
+        out = tmp_path / "out"
+        assert store.export_tree(str(out)) == 2
+    exported = out / "aime_problems/AIME I/2012-AIME I.json"
+    assert json.loads(exported.read_text(encoding="utf-8")) == aime
+    assert list(json.loads(exported.read_text(encoding="utf-8"))[0]) == list(aime[0])
@@ -0,0 +1,208 @@
+import json
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import automated
+from aops_downloader import (
+    PageNotFound,
+    RateLimited,
+    download_contest,
+    fetch_page_wikitext,
+    write_json,
+)
+from crawler import CrawlJob, CrawlLimiter, CrawlScheduler, TokenBucket
+
+
+def test_token_bucket_paces_requests():
+    now = [0.0]
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(2.0, 2.0, clock=lambda: now[0], sleep=sleep)
+    for _ in range(6):
+        bucket.acquire()
+    # two burst tokens, then one every half second
+    assert now[0] == pytest.approx(2.0)
+
+
+def test_client_raises_rate_limited(fake_wiki, wiki_client):
+    fake_wiki.pages["P"] = "text"
+    fake_wiki.errors.append((429, {"Retry-After": "7"}, {}))
+    with pytest.raises(RateLimited) as info:
+        fetch_page_wikitext("P", wiki_client)
+    assert info.value.retry_after == 7
+
+    fake_wiki.errors.append(
+        (200, {"Retry-After": "3"}, {"error": {"code": "maxlag", "info": "lagged"}})
+    )
+    wiki_client.maxlag = 5
+    with pytest.raises(RateLimited) as info:
+        fetch_page_wikitext("P", wiki_client)
+    assert info.value.retry_after == 3
+    assert fake_wiki.requests[-1]["maxlag"] == "5"
+
+    wiki_client.limiter = CrawlLimiter(rate=100, per_host=1)
+    assert fetch_page_wikitext("P", wiki_client) == "text"
+
+
+def test_scheduler_retries_and_reports():
+    delays = []
+    attempts = {"flaky": 0, "down": 0, "truncated": 0}
+
+    def flaky():
+        attempts["flaky"] += 1
+        if attempts["flaky"] < 3:
+            raise RateLimited("slow down", 30)
+        return "ok"
+
+    def down():
+        attempts["down"] += 1
+        raise ConnectionError("boom")
+
+    def missing():
+        raise PageNotFound("Page not found")
+
+    def truncated():
+        attempts["truncated"] += 1
+        if attempts["truncated"] < 2:
+            json.loads('{"query": ')
+        return "ok"
+
+    scheduler = CrawlScheduler(workers=3, max_retries=2, sleep=delays.append)
+    report = scheduler.run(
+        [
+            CrawlJob("flaky", flaky),
+            CrawlJob("down", down),
+            CrawlJob("missing", missing),
+            CrawlJob("truncated", truncated),
+        ]
+    )
+    flaky_res, down_res, missing_res, truncated_res = report.results
+    assert truncated_res.ok and truncated_res.attempts == 2
+    assert flaky_res.ok and flaky_res.value == "ok" and flaky_res.attempts == 3
+    assert down_res.attempts == 3 and isinstance(down_res.error, ConnectionError)
+    assert missing_res.attempts == 1
+    assert len(report.failures) == 2
+    # Retry-After is a lower bound on the backoff delay
+    assert sum(d >= 30 for d in delays) >= 2
+    assert "down" in report.summary()
+
+
+def test_resume_download_skips_existing(fake_wiki, wiki_client, tmp_path, monkeypatch):
+    fake_wiki.pages.update(
+        {
+            "2025 AMC 8 Problems": "==Problem 1==\nQ\n",
+            "2025 AMC 8 Answer Key": "# C\n",
+            "2025 AMC 8 Problems/Problem 1": "==Solution==\nS\n",
+        }
+    )
+    monkeypatch.chdir(tmp_path)
+    existing = tmp_path / automated.output_path("2025", "10A")
+    existing.parent.mkdir(parents=True)
+    existing.write_text("[]")
+
+    report = automated.resume_download(
+        wiki_client, contests=[("2025", "8"), ("2025", "10A")], workers=2, rate=100
+    )
+    assert [r.job.name for r in report.results] == ["2025 8"]
+    assert report.results[0].ok
+    assert all(r["maxlag"] == "5" for r in fake_wiki.requests)
+    assert (tmp_path / automated.output_path("2025", "8")).is_file()
+    assert existing.read_text() == "[]"
+
+
+def test_sync_rebuilds_changed_records(fake_wiki, wiki_client, tmp_path, monkeypatch):
+    fake_wiki.pages.update(
+        {
+            "2025 AMC 8 Problems": "==Problem 1==\nQ1\n==Problem 2==\nQ2\n",
+            "2025 AMC 8 Answer Key": "# C\n# D\n",
+            "2025 AMC 8 Problems/Problem 1": "==Solution==\nS1\n",
+            "2025 AMC 8 Problems/Problem 2": "==Solution==\nS2\n",
+        }
+    )
+    monkeypatch.chdir(tmp_path)
+    path = automated.output_path("2025", "8")
+    os.makedirs(os.path.dirname(path))
+    records = download_contest("2025", "8", wiki_client)
+    records[0]["Topics"] = ["Casework"]
+    write_json(path, records)
+
+    # first run only records the high-water mark
+    assert automated.sync(wiki_client) == {}
+    assert "since" in json.loads((tmp_path / automated.sync_state_file).read_text())
+    write_json(automated.sync_state_file, {"since": "2024-01-01T00:00:00Z"})
+
+    fake_wiki.pages["2025 AMC 8 Problems/Problem 2"] = "==Solution==\nFixed\n"
+    fake_wiki.pages["2025 AMC 8 Answer Key"] = "# C\n# E\n"
+    fake_wiki.changes += [
+        {"title": "2025 AMC 8 Problems/Problem 2", "timestamp": "2024-02-01T00:00:00Z"},
+        {"title": "2025 AMC 8 Answer Key", "timestamp": "2024-02-02T00:00:00Z"},
+        {"title": "Main Page", "timestamp": "2024-02-03T00:00:00Z"},
+        {"title": "2019 AIME I Problems", "timestamp": "2023-12-01T00:00:00Z"},
+    ]
+    fake_wiki.requests.clear()
+    # the fixture's edits are older than the wiki keeps recent changes
+    with pytest.raises(automated.StaleSyncState):
+        automated.sync(wiki_client)
+    assert not fake_wiki.requests
+    monkeypatch.setattr(automated, "RC_MAX_AGE", datetime.now() - datetime(2023, 1, 1))
+    assert automated.sync(wiki_client) == {path: [2]}
+    saved = json.loads((tmp_path / path).read_text())
+    assert saved[1]["Solution"] == "Fixed" and saved[1]["Answer"] == "E"
+    assert saved[0]["Topics"] == ["Casework"]
+    # one recentchanges query plus one batched page fetch
+    assert len(fake_wiki.requests) == 2
+    state = json.loads((tmp_path / automated.sync_state_file).read_text())
+    assert state == {"since": "2024-02-03T00:00:00Z"}
+    assert wiki_client.limiter is not None and wiki_client.maxlag == 5
+
+    # a run without edits still moves the mark, so quiet months never go stale
+    write_json(automated.sync_state_file, {"since": "2024-06-01T00:00:00Z"})
+    assert automated.sync(wiki_client) == {}
+    state = json.loads((tmp_path / automated.sync_state_file).read_text())
+    assert state["since"] > "2025"
+
+    # a full sync rebuilds every downloaded contest and restarts the mark
+    fake_wiki.pages["2025 AMC 8 Problems/Problem 1"] = "==Solution==\nNew\n"
+    assert automated.downloaded_contests() == [("2025", "8")]
+    assert automated.sync(wiki_client, full=True) == {path: [1]}
+    state = json.loads((tmp_path / automated.sync_state_file).read_text())
+    assert state["since"] > "2025"
+
+
+def test_catalog_discovery_and_ttl(fake_wiki, wiki_client, tmp_path, monkeypatch):
+    import catalog
+
+    for title in [
+        "2024 AMC 8 Problems",
+        "2024 AMC 8 Problems/Problem 1",
+        "2024 AMC 8 Answer Key",
+        "2024 AIME I Problems",
+        "2021 Fall AMC 10A Problems",
+        "2021 Fall AMC 10A Problems/Problem 2",
+        "2024 USAMO Problems",
+    ]:
+        fake_wiki.pages[title] = "text"
+    monkeypatch.setattr(catalog, "FIRST_YEAR", 2020)
+    monkeypatch.chdir(tmp_path)
+
+    found = catalog.discover_contests(wiki_client, years=[2021, 2024])
+    assert found == [("2024", "8"), ("2024", "AIME I"), ("2021 Fall", "10A")]
+
+    fake_wiki.requests.clear()
+    first = catalog.load_catalog(wiki_client)
+    assert ("2024", "AIME I") in first
+    assert len(fake_wiki.requests) == datetime.now().year + 2 - 2020
+    fake_wiki.requests.clear()
+    assert catalog.load_catalog(wiki_client) == first
+    assert fake_wiki.requests == []
+    catalog.load_catalog(wiki_client, ttl=0)
+    assert fake_wiki.requests
@@ -0,0 +1,60 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from dedup import dedup_tree, find_duplicates, load_canonical
+from search import SearchIndex
+
+SHARED = (
+    "A rectangular box has volume <math>216</math>. Its length is twice its "
+    "width and its height equals the sum of the length and width. What is the "
+    "total surface area of the box? "
+    "<math>\\textbf{(A)}\\ 252 \\qquad \\textbf{(B)}\\ 264 \\qquad \\textbf{(C)}\\ 288</math>"
+)
+
+
+def _item(pid, question):
+    return {
+        "ID": pid,
+        "Year": "2022",
+        "Question": question,
+        "Source": "AMC" + pid[9:11],
+    }
+
+
+def test_find_duplicates_across_contests():
+    items = [
+        _item("2022-AMC 12A-3", SHARED),
+        _item("2022-AMC 10A-5", SHARED.replace("216", "<math>216</math>")),
+        _item("2022-AMC 10A-6", SHARED.replace("(C)}\\ 288", "(C)}\\ 300")),
+        _item("2022-AMC 10A-7", "How many positive divisors does 2022 have?"),
+        _item("2022-AMC 10A-8", ""),
+    ]
+    result = find_duplicates(items)
+    assert set(result) == {"2022-AMC 12A-3", "2022-AMC 10A-6"}
+    assert result["2022-AMC 12A-3"] == {
+        "canonical": "2022-AMC 10A-5",
+        "similarity": 1.0,
+    }
+    assert 0.8 <= result["2022-AMC 10A-6"]["similarity"] < 1.0
+
+
+def test_dedup_tree_and_search_collapse(tmp_path):
+    for contest, pid in (("AMC 10A", "2022-AMC 10A-5"), ("AMC 12A", "2022-AMC 12A-3")):
+        folder = tmp_path / "amc_problems" / contest
+        folder.mkdir(parents=True)
+        (folder / f"2022-{contest}.json").write_text(
+            json.dumps([_item(pid, SHARED)]), encoding="utf-8"
+        )
+    out = str(tmp_path / "duplicates.json")
+    dedup_tree(str(tmp_path), out)
+    canonical = load_canonical(out)
+    assert canonical == {"2022-AMC 12A-3": "2022-AMC 10A-5"}
+    assert load_canonical(str(tmp_path / "missing.json")) == {}
+
+    index = SearchIndex()
+    index.update_from_tree(str(tmp_path))
+    assert len(index.search("surface area box")) == 2
+    assert len(index.search("surface area box", canonical=canonical)) == 1
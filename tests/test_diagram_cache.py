@@ -0,0 +1,85 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import renderer
+from diagram_cache import DiagramCache
+
+
+def test_diagram_cache_lru(tmp_path):
+    cache = DiagramCache(tmp_path, max_bytes=10)
+    cache.put("aa01", b"1234")
+    cache.put("bb02", b"5678")
+    assert cache.get("aa01") == b"1234"  # "aa01" becomes most recently used
+    cache.put("cc03", b"9abc")
+    assert cache.get("bb02") is None
+    assert cache.total_bytes() == 8
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_diagram_cache_blob_extensions(tmp_path):
+    cache = DiagramCache(tmp_path)
+    cache.put("aa01", b"<svg/>")
+    cache.put("aa01.png", b"png")
+    assert (tmp_path / "blobs" / "aa" / "aa01.svg").read_bytes() == b"<svg/>"
+    assert (tmp_path / "blobs" / "aa" / "aa01.png").read_bytes() == b"png"
+    assert cache.get("aa01.png") == b"png"
+
+
+def test_diagram_cache_hit_while_index_locked(tmp_path):
+    cache = DiagramCache(tmp_path)
+    cache.put("aa01", b"1234")
+    cache._db.execute("PRAGMA busy_timeout = 0")
+    other = sqlite3.connect(tmp_path / "index.sqlite")
+    other.execute("BEGIN EXCLUSIVE")
+    assert cache.get("aa01") == b"1234"
+    other.rollback()
+    other.close()
+
+
+def test_cached_render_skips_subprocesses(tmp_path, monkeypatch):
+    rendered = []
+    probes = []
+
+    def fake_render(code, raster=False):
+        rendered.append(code)
+        return f"<svg>{code}</svg>".encode(), None
+
+    def fake_run(command, **kwargs):
+        probes.append(command)
+        return subprocess.CompletedProcess(command, 0, "", f"{command[0]} 1.0\n")
+
+    monkeypatch.setattr(renderer, "_render_asy", fake_render)
+    monkeypatch.setattr(renderer.subprocess, "run", fake_run)
+    for tool in ("asy", "pdftocairo"):
+        (tmp_path / tool).write_text("")
+    monkeypatch.setattr(renderer.shutil, "which", lambda tool: str(tmp_path / tool))
+    cache = DiagramCache(tmp_path / "cache")
+
+    key = renderer.diagram_key("draw((0,0)--(1,1));", cache)
+    assert renderer.render_diagram("draw((0,0)--(1,1));", cache).startswith(b"<svg>")
+    assert len(probes) == 2  # one version probe per tool, remembered afterwards
+    probes.clear()
+    assert renderer.diagram_key("draw((0,0)--(1,1));", cache) == key
+    assert renderer.render_diagram("draw((0,0)--(1,1));", cache).startswith(b"<svg>")
+    assert len(rendered) == 1 and probes == []
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    monkeypatch.setattr(renderer, "DIAGRAM_SIZE", 200)
+    assert renderer.diagram_key("draw((0,0)--(1,1));", cache) != key
+
+    folder = tmp_path / "amc_problems" / "AMC 8"
+    folder.mkdir(parents=True)
+    problems = [
+        {"ID": "2020-8-1", "Question": "<asy>dot((0,0));</asy>", "Solution": ""},
+        {"ID": "2020-8-2", "Question": "x", "Solution": "<asy>dot((0,0));</asy>"},
+    ]
+    (folder / "2020-8.json").write_text(json.dumps(problems), encoding="utf-8")
+    rendered.clear()
+    assert renderer.prewarm(str(tmp_path), cache) == (1, 0)
+    assert renderer.prewarm(str(tmp_path), cache) == (1, 0)
+    assert rendered == ["dot((0,0));"]
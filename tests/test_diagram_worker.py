@@ -0,0 +1,65 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from diagram_worker import DiagramError, run_limited
+
+
+def _alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs /proc")
+def test_timeout_kills_process_group(tmp_path):
+    start = time.perf_counter()
+    with pytest.raises(subprocess.TimeoutExpired) as info:
+        run_limited(
+            ["sh", "-c", "sleep 30 & echo $! > child; wait"], cwd=tmp_path, timeout=0.5
+        )
+    assert time.perf_counter() - start < 5
+    child = int((tmp_path / "child").read_text())
+    for _ in range(50):
+        if not _alive(child):
+            break
+        time.sleep(0.05)
+    assert not _alive(child)
+    assert DiagramError.from_exception(info.value).kind == "timeout"
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs prlimit")
+def test_memory_limit():
+    script = "import time; time.sleep(0.2); bytearray(1024 * 1024 * 1024)"
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        run_limited(
+            [sys.executable, "-c", script], check=True, memory=256 * 1024 * 1024
+        )
+    error = DiagramError.from_exception(info.value)
+    assert error.kind == "memory" and error.message == "MemoryError"
+    assert run_limited([sys.executable, "-c", "print(1)"]).stdout == b"1\n"
+
+
+def test_timeout_counts_from_last_progress(tmp_path):
+    # 4 steps of 0.4s each outlast the 1s timeout, but each makes progress
+    script = "for i in 1 2 3 4; do sleep 0.4; touch f$i; done"
+    progress = lambda: len(list(tmp_path.glob("f*")))
+    run_limited(["sh", "-c", script], cwd=tmp_path, timeout=1, progress=progress)
+    assert progress() == 4
+
+    start = time.perf_counter()
+    with pytest.raises(subprocess.TimeoutExpired):
+        run_limited(
+            ["sh", "-c", "touch g; sleep 30"],
+            cwd=tmp_path,
+            timeout=1,
+            progress=progress,
+        )
+    assert time.perf_counter() - start < 5
@@ -2,11 +2,16 @@ import json
 import os
 import sys
 
+import pytest
+
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from aops_downloader import (
     fetch_page_wikitext,
+    fetch_pages_wikitext,
+    iter_sections,
     parse_problems,
+    parse_solution_list,
     parse_answers,
     parse_solutions,
     download_contest,
@@ -88,3 +93,104 @@ def test_aime_and_ahsme():
     first_h = next(item for item in ahsme_data if item["ProblemNumber"] == 1)
     assert first_h["Answer"] in "ABCDE"
     assert first_h["Source"] == "AHSME"
+
+
+FAKE_PAGES = {
+    "2025 AMC 8 Problems": "==Problem 1==\nWhat is 1+1?\n\n==Problem 2==\nWhat is 2+2?\n",
+    "2025 AMC 8 Answer Key": "# B\n# D\n",
+    "2025 AMC 8 Problems/Problem 1": "==Problem==\nx\n==Solution==\nTwo.\n~author\n",
+    "Moved Page": "==Solution 1==\nFour.\n==Video Solution==\nhttps://youtube\n",
+}
+FAKE_REDIRECTS = {"2025 AMC 8 Problems/Problem 2": "Moved Page"}
+
+
+@pytest.fixture
+def amc_wiki(fake_wiki):
+    fake_wiki.pages.update(FAKE_PAGES)
+    fake_wiki.redirects.update(FAKE_REDIRECTS)
+    return fake_wiki
+
+
+def test_fetch_pages_batched(amc_wiki, wiki_client, monkeypatch):
+    import aops_downloader
+
+    pages = fetch_pages_wikitext(
+        ["2025 AMC 8 Problems", "2025 AMC 8 Problems/Problem 2", "no such page"],
+        wiki_client,
+    )
+    assert len(amc_wiki.requests) == 1
+    assert pages["2025 AMC 8 Problems"].text.startswith("==Problem 1==")
+    moved = pages["2025 AMC 8 Problems/Problem 2"]
+    assert moved.redirected and moved.resolved_title == "Moved Page"
+    assert "Four." in moved.text
+    missing = pages["no such page"]
+    assert missing.resolved_title == "No such page"
+    assert missing.text is None and missing.error == "Page not found"
+
+    amc_wiki.requests.clear()
+    monkeypatch.setattr(aops_downloader, "API_TITLE_LIMIT", 2)
+    fetch_pages_wikitext(["A", "B", "C", "A"], wiki_client)
+    assert [r["titles"] for r in amc_wiki.requests] == ["A|B", "C"]
+
+
+def test_download_contest_offline(amc_wiki, wiki_client):
+    data = download_contest("2025", "8", wiki_client)
+    assert len(amc_wiki.requests) == 2
+    # both batches travel over one pooled keep-alive connection
+    assert amc_wiki.connections == 1
+    assert [item["Answer"] for item in data] == ["B", "D"]
+    assert data[0]["Solution"] == "Two."
+    assert data[1]["Solution"] == "Four."
+
+
+def test_iter_sections_structured():
+    page = (
+        "==Problem==\nFind x.\n"
+        "==Solution 1==\nUse [[File:a.png]]algebra.\n~alice\n"
+        "==Solution 2 (Cheese)==\nGuess.\n===Remark===\nNice.\n~ bob\n"
+        "==Video Solution==\nhttps://youtu.be/x\n"
+        "==See Also==\n{{AMC8 box}}\n"
+    )
+    kinds = [(s.kind, s.number) for s in iter_sections(page)]
+    assert kinds == [
+        ("other", None),
+        ("solution", 1),
+        ("solution", 2),
+        ("video", None),
+        ("see_also", None),
+    ]
+    first, second = parse_solution_list(page)
+    assert first.body == "Use algebra." and first.author == "alice"
+    assert second.body == "Guess.\n===Remark===\nNice." and second.author == "bob"
+    assert parse_solutions(page) == first.body + "\n\n" + second.body
+
+    contest = (
+        "==Problem 1==\nQ [[2025 AMC 8 Problems/Problem 1|Solution]]\n==Problem 2==\nR"
+    )
+    assert parse_problems(contest) == {1: "Q", 2: "R"}
+    sections = iter_sections(contest, ("problem",))
+    assert next(sections).number == 1  # lazily produced
+
+
+def test_checkpointed_download_resumes(amc_wiki, wiki_client, tmp_path):
+    from aops_downloader import checkpoint_path, download_contest_to
+
+    moved = amc_wiki.redirects.pop("2025 AMC 8 Problems/Problem 2")
+    out = str(tmp_path / "2025-8.json")
+    with pytest.raises(ValueError):
+        download_contest_to(out, "2025", "8", wiki_client, batch_size=1)
+    assert not os.path.exists(out)
+    with open(checkpoint_path(out), encoding="utf-8") as f:
+        assert [json.loads(line)["ProblemNumber"] for line in f] == [1]
+
+    amc_wiki.redirects["2025 AMC 8 Problems/Problem 2"] = moved
+    amc_wiki.requests.clear()
+    data = download_contest_to(out, "2025", "8", wiki_client, batch_size=1)
+    # the index pages plus only the problem that was still missing
+    assert [r["titles"] for r in amc_wiki.requests][1:] == [
+        "2025 AMC 8 Problems/Problem 2"
+    ]
+    assert [r["ProblemNumber"] for r in data] == [1, 2]
+    with open(out, encoding="utf-8") as f:
+        assert json.load(f) == data
+    assert not os.path.exists(checkpoint_path(out))
@@ -0,0 +1,74 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aops_downloader import WikiClient, download_contest
+from http_archive import ArchiveMiss, ArchiveReader, ArchiveWriter, benchmark_parsers
+from wiki_cache import WikiCache
+
+
+def test_record_then_replay(fake_wiki, tmp_path):
+    fake_wiki.pages.update(
+        {
+            "2025 AMC 8 Problems": "==Problem 1==\nQ1\n",
+            "2025 AMC 8 Answer Key": "# A\n",
+            "2025 AMC 8 Problems/Problem 1": "==Solution==\nS1\n",
+        }
+    )
+    archive = str(tmp_path / "wiki.archive")
+    with ArchiveWriter(archive) as recorder:
+        with WikiClient(fake_wiki.url, recorder=recorder) as client:
+            recorded = download_contest("2025", "8", client)
+
+    fake_wiki.requests.clear()
+    with ArchiveReader(archive) as replay:
+        assert len(replay) == 2
+        with WikiClient("http://127.0.0.1:9/unreachable", replay=replay) as client:
+            assert download_contest("2025", "8", client) == recorded
+            with pytest.raises(ArchiveMiss):
+                download_contest("2024", "8", client)
+    assert fake_wiki.requests == []
+
+    timings, pages = benchmark_parsers(archive)
+    assert pages == 3 and set(timings) >= {"parse_problems", "parse_solutions"}
+
+
+def test_record_with_warm_cache_then_replay(fake_wiki, tmp_path):
+    fake_wiki.pages.update(
+        {
+            "2025 AMC 8 Problems": "==Problem 1==\nQ1\n",
+            "2025 AMC 8 Answer Key": "# A\n",
+            "2025 AMC 8 Problems/Problem 1": "==Solution==\nS1\n",
+        }
+    )
+    cache = WikiCache(tmp_path / "cache")
+    with WikiClient(fake_wiki.url, cache=cache) as client:
+        download_contest("2025", "8", client)
+
+    archive = str(tmp_path / "wiki.archive")
+    with ArchiveWriter(archive) as recorder:
+        with WikiClient(fake_wiki.url, cache=cache, recorder=recorder) as client:
+            recorded = download_contest("2025", "8", client)
+    with ArchiveReader(archive) as replay:
+        with WikiClient("http://127.0.0.1:9/unreachable", replay=replay) as client:
+            assert download_contest("2025", "8", client) == recorded
+
+
+def test_archive_appends_and_rebuilds_index(tmp_path):
+    archive = str(tmp_path / "a.archive")
+    with ArchiveWriter(archive) as w:
+        w.add({"titles": "A", "maxlag": 5}, b'{"v": 1}')
+        w.add({"titles": "B"}, b'{"v": 2}')
+    with ArchiveWriter(archive) as w:
+        w.add({"titles": "A"}, b'{"v": 3}')
+    # a stale or missing index is rebuilt from the data file
+    os.remove(archive + ".idx")
+    with open(archive, "ab") as f:
+        f.write(b"\x00\x00")  # truncated tail of an interrupted recording
+    with ArchiveReader(archive) as r:
+        assert r.get({"titles": "A"}) == {"v": 3}
+        assert r.get({"titles": "B", "maxlag": 1}) == {"v": 2}
+        assert len(r) == 2
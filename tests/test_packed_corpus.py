@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from packed_corpus import PackedCorpus, pack_tree
+
+
+def test_pack_and_lazy_access(tmp_path):
+    items = [
+        {
+            "ID": f"2019-AIME I-{n}",
+            "Year": "2019",
+            "ProblemNumber": n,
+            "QuestionType": "int3",
+            "Question": f"Find $x_{n}$ — ∑",
+            "Answer": str(n),
+            "Solution": "" if n == 2 else "Long solution " * 50,
+            "Source": "AIME",
+            "Subjects": ["Algebra", "Geometry"] if n == 1 else [],
+            "Topics": ["Polynomials"] if n == 1 else [],
+            "Note": {"reviewed": n == 1},
+        }
+        for n in (3, 1, 2)
+    ]
+    folder = tmp_path / "aime_problems" / "AIME I"
+    folder.mkdir(parents=True)
+    (folder / "2019-AIME I.json").write_text(json.dumps(items), encoding="utf-8")
+    out = str(tmp_path / "corpus.pack")
+    assert pack_tree(str(tmp_path), out) == 3
+
+    with PackedCorpus(out) as corpus:
+        assert len(corpus) == 3
+        rec = corpus.get("2019-AIME I-1")
+        assert rec.problem_number == 1 and rec.subjects == ["Algebra", "Geometry"]
+        assert rec["Question"] == "Find $x_1$ — ∑"
+        assert rec.provider is None and rec.get("Provider") is None
+        assert rec.path == os.path.join("aime_problems", "AIME I", "2019-AIME I.json")
+        assert corpus.get("2019-AIME I-9") is None
+        assert corpus[1].to_dict() == items[1]
+        assert [r.to_dict() for r in corpus] == items
+        assert not hasattr(rec, "__dict__")
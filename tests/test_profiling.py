@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import profiling
+from profiling import span
+
+
+def test_span_is_noop_when_disabled():
+    profiling.disable()
+    assert profiling.active() is None
+    assert span("a") is span("b", figures=2)
+    with span("a"):
+        pass
+
+
+def test_profiler_stages_and_trace(tmp_path):
+    profiler = profiling.enable()
+    try:
+        for _ in range(3):
+            with span("outer", figures=1):
+                with span("inner"):
+                    time.sleep(0.001)
+    finally:
+        profiling.disable()
+
+    stats = profiler.stages()
+    assert stats["outer"]["count"] == stats["inner"]["count"] == 3
+    assert stats["inner"]["p50"] >= 1.0
+    assert stats["outer"]["total"] >= stats["inner"]["total"]
+    table = profiler.table().splitlines()
+    assert table[0].split()[:2] == ["stage", "count"]
+    assert table[1].startswith("outer")
+
+    path = tmp_path / "trace.json"
+    profiler.write_trace(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    assert len(events) == 6
+    assert {e["ph"] for e in events} == {"X"}
+    assert events[1]["args"] == {"figures": 1}
+    assert events[0]["ts"] >= events[1]["ts"]  # inner closes first
+
+    assert len(profiler.drain()) == 6
+    assert profiler.events == []
@@ -4,12 +4,17 @@ import sys
 import shutil
 import base64
 import re
+import subprocess
+from pathlib import Path
+
 import pytest
 
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 from aops_downloader import download_contest
+import renderer
 from renderer import render_json, render_wikitext, MATHJAX_SCRIPT, DIAGRAM_SIZE
+from diagram_worker import DiagramError
 
 pandoc_exists = True
 try:
@@ -76,3 +81,450 @@ def test_svg_fixed_size():
     svg = base64.b64decode(m.group(1)).decode("utf-8")
     assert f'width="{DIAGRAM_SIZE}px"' in svg
     assert f'height="{DIAGRAM_SIZE}px"' in svg
+
+
+def _fake_tools(calls):
+    """Stand-ins for asy/pdftocairo.
+
+    Figures containing "error" fail to compile and "hang" hits the timeout.
+    """
+
+    def run(command, cwd=None, check=False, **kwargs):
+        calls.append(command[0])
+        if command[:2] == ["pdftocairo", "-png"]:
+            from PIL import Image
+
+            Image.new("RGBA", (300, 200), "black").save(f"{command[-1]}.png")
+            return subprocess.CompletedProcess(command, 0)
+        if command[0] == "pdftocairo":
+            Path(command[3]).write_text(
+                f'<svg width="1pt" height="1pt">{Path(command[2]).read_text()}</svg>'
+            )
+            return subprocess.CompletedProcess(command, 0)
+        args = [str(a) for a in command[3:]]
+        out = args[1] if args[0] == "-o" else None
+        failed = False
+        for name in [a for a in args if a.endswith(".asy")]:
+            code = (Path(cwd) / name).read_text()
+            if "hang" in code:
+                raise subprocess.TimeoutExpired(command, kwargs.get("timeout"))
+            if "error" in code:
+                failed = True
+                continue
+            stem = out or Path(name).stem
+            (Path(cwd) / f"{stem}.pdf").write_text(code.splitlines()[-1])
+        if failed and check:
+            raise subprocess.CalledProcessError(1, command)
+        return subprocess.CompletedProcess(command, int(failed))
+
+    return run
+
+
+def test_batch_timeout_after_every_figure(monkeypatch):
+    calls = []
+    fake = _fake_tools(calls)
+
+    def run(command, cwd=None, check=False, **kwargs):
+        result = fake(command, cwd, check, **kwargs)
+        if command[0] == "asy" and len(command) > 4:
+            raise subprocess.TimeoutExpired(command, 1)  # hung while exiting
+        return result
+
+    monkeypatch.setattr(renderer, "run_limited", run)
+    results = renderer.render_diagrams(["dot((0,0));", "dot((1,1));"])
+    assert calls.count("asy") == 1
+    assert b"dot((1,1));" in results["dot((1,1));"]
+
+
+def test_batch_render_isolates_failures(monkeypatch):
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    problems = [
+        {
+            "ID": "2020-8-1",
+            "ProblemNumber": 1,
+            "Question": "<asy>dot((0,0));</asy> and <asy>dot((1,1));</asy>",
+            "Solution": "<asy>dot((0,0));</asy>",
+        },
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "<asy>error;</asy>"},
+    ]
+    results = renderer.render_diagrams(
+        [c for p in problems for c in renderer.diagram_codes(p["Question"])]
+    )
+    assert calls.count("asy") == 2  # one batch run plus the failing figure alone
+    assert calls.count("pdftocairo") == 2
+    assert b'width="300px"' in results["dot((0,0));"]
+    assert b"dot((1,1));" in results["dot((1,1));"]
+    assert isinstance(results["error;"], DiagramError)
+    assert results["error;"].kind == "error"
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_render_corpus_parallel_is_deterministic(tmp_path, monkeypatch):
+    initargs = []
+
+    class Pool(renderer.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            initargs.append(kwargs["initargs"])
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(renderer, "ProcessPoolExecutor", Pool)
+    monkeypatch.setattr(renderer, "CONVERT_THREADS", 8)
+    folder = tmp_path / "amc_problems" / "AMC 8"
+    folder.mkdir(parents=True)
+    problems = [
+        {
+            "ID": f"2020-8-{n}",
+            "ProblemNumber": n,
+            "Question": f"What is <math>{n}+{n}</math>?",
+            "Answer": str(2 * n),
+        }
+        for n in (3, 1, 2, 4)
+    ]
+    (folder / "2020-8.json").write_text(json.dumps(problems), encoding="utf-8")
+
+    outputs = []
+    for run in ("a", "b"):
+        lines = []
+        report = renderer.render_corpus(
+            str(tmp_path),
+            str(tmp_path / run),
+            jobs=2,
+            cache_dir=None,
+            progress=lines.append,
+        )
+        assert report.problems == 4 and report.contests == 1 and not report.failures
+        assert len(lines) == 4 and lines[-1].startswith("[4/4]")
+        out = tmp_path / run / "amc_problems" / "AMC 8" / "2020-8"
+        outputs.append({p.name: p.read_text() for p in sorted(out.glob("*.html"))})
+    assert outputs[0] == outputs[1]
+    index = outputs[0]["index.html"]
+    assert (
+        index.index("Problem 1") < index.index("Problem 2") < index.index("Problem 4")
+    )
+    assert len(outputs[0]) == 5
+    # 2 workers share the 8 pdftocairo slots
+    assert initargs[0][4] == 4
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_pandoc_backends_match():
+    from pandoc_backend import LuaBackend, SubprocessBackend
+
+    fragments = [
+        "",
+        "Plain text — with ünïcode ∑.",
+        "What is <math>\\frac{1}{2}</math>?\n\n== Solution ==\n* one\n* two",
+        "'''Bold''' [[Some page|a link]] <ref>note</ref> " + "word " * 40,
+        '<math class="math inline">x^2</math>\n{| class="wikitable"\n|a||b\n|}',
+        "$\\textbf{(A)}\\ 1 \\qquad \\textbf{(B)}\\ 2$",
+        "a\tb\r\n\tcode\r\n* item",
+        " preformatted\n\n:indent\n# one\n#two\n",
+    ]
+    lua = LuaBackend()
+    try:
+        for text in fragments:
+            for math in ("mathjax", "mathml"):
+                expected = SubprocessBackend().convert(text, math)
+                assert lua.convert(text, math) == expected
+        html = render_wikitext("<cmath>a+b</cmath>", backend=lua)
+        assert html == render_wikitext(
+            "<cmath>a+b</cmath>", backend=SubprocessBackend()
+        )
+    finally:
+        lua.close()
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_incremental_render_with_manifest(tmp_path, monkeypatch):
+    problems = [
+        {"ID": f"2020-8-{n}", "ProblemNumber": n, "Question": f"Question {n}"}
+        for n in (1, 2, 3)
+    ]
+    json_path = tmp_path / "2020-8.json"
+    out = tmp_path / "out"
+
+    def render(**kwargs):
+        json_path.write_text(json.dumps(problems), encoding="utf-8")
+        return render_json(str(json_path), str(out), **kwargs)
+
+    def mtimes():
+        return {p.name: p.stat().st_mtime_ns for p in out.glob("*.html")}
+
+    assert render() == 3
+    before = mtimes()
+    assert render() == 0 and mtimes() == before
+
+    problems[1]["Question"] = "Question two, edited"
+    assert render() == 1
+    after = mtimes()
+    assert after["2020-8-1.html"] == before["2020-8-1.html"]
+    assert after["index.html"] != before["index.html"]
+    assert "edited" in (out / "index.html").read_text()
+
+    del problems[2]
+    assert render() == 0
+    assert not (out / "2020-8-3.html").exists()
+    assert "Question 3" not in (out / "index.html").read_text()
+
+    assert render(force=True) == 2
+    monkeypatch.setattr(renderer, "DIAGRAM_SIZE", 200)
+    assert render() == 2
+    monkeypatch.setattr(renderer, "pandoc_version", lambda: "99.0")
+    assert render() == 2
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_render_json_with_assets(tmp_path, monkeypatch):
+    import gzip
+
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    problems = [
+        {"ID": "2020-8-1", "ProblemNumber": 1, "Question": "A <asy>dot((0,0));</asy>"},
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "B <asy>dot((0,0));</asy>"},
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+    out = tmp_path / "out"
+
+    assert render_json(str(json_path), str(out), assets=True, compress=True) == 2
+    (asset,) = (out / "assets").glob("*.svg")
+    img = f'<img src="assets/{asset.name}" alt="diagram" loading="lazy"/>'
+    page = (out / "2020-8-1.html").read_text()
+    assert img in page and img in (out / "index.html").read_text()
+    assert gzip.decompress((out / "2020-8-1.html.gz").read_bytes()) == page.encode()
+    assert (out / "index.html.gz").exists()
+    assert (out / "assets" / f"{asset.name}.gz").exists()
+
+    # switching back to inline diagrams rebuilds every page
+    assert render_json(str(json_path), str(out)) == 2
+    page = (out / "2020-8-1.html").read_text()
+    assert '<img src="data:image/svg+xml;base64,' in page and "&lt;img" not in page
+
+
+def test_asset_store_adds_missing_gzip(tmp_path):
+    from asset_store import AssetStore
+
+    url = AssetStore(tmp_path).url(b"<svg/>")
+    name = url.removeprefix("assets/")
+    assert not (tmp_path / f"{name}.gz").exists()
+    assert AssetStore(tmp_path, compress=True).url(b"<svg/>") == url
+    assert (tmp_path / f"{name}.gz").exists()
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_failed_diagrams_get_placeholders(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    problems = [
+        {"ID": "2020-8-1", "ProblemNumber": 1, "Question": "<asy>dot((0,0));</asy>"},
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "<asy>hang;</asy>"},
+        {"ID": "2020-8-3", "ProblemNumber": 3, "Question": "<asy>dot((1,1));</asy>"},
+        {"ID": "2020-8-4", "ProblemNumber": 4, "Question": "<asy>error;</asy>"},
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+    out = tmp_path / "out"
+
+    records = []
+    assert render_json(str(json_path), str(out), records=records) == 4
+    # the batch timed out on figure 2: it and the figures after it are retried
+    assert calls.count("asy") == 4
+    assert 'alt="diagram"' in (out / "2020-8-1.html").read_text()
+    assert 'alt="diagram unavailable (timeout)"' in (out / "2020-8-2.html").read_text()
+    assert 'alt="diagram unavailable (error)"' in (out / "2020-8-4.html").read_text()
+    errors = json.loads((out / "diagram_errors.json").read_text())
+    assert [(e["owner"], e["error"]) for e in errors] == [
+        ("2020-8-2", "timeout"),
+        ("2020-8-4", "error"),
+    ]
+    summary = renderer.diagram_summary(records)
+    assert summary.startswith("Diagrams: 4 rendered, 2 failed")
+    assert "failed 2020-8-2" in summary
+
+    # problems with failed figures are tried again on the next build
+    assert render_json(str(json_path), str(out)) == 2
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_render_json_profile_spans(tmp_path, monkeypatch):
+    import profiling
+
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    problems = [
+        {"ID": "2020-8-1", "ProblemNumber": 1, "Question": "A <asy>dot((0,0));</asy>"},
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "B <math>x</math>"},
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+
+    profiler = profiling.enable()
+    try:
+        render_json(str(json_path), str(tmp_path / "out"))
+    finally:
+        profiling.disable()
+    stats = profiler.stages()
+    assert stats["problem"]["count"] == stats["write"]["count"] == 2
+    assert stats["diagram.batch"]["count"] == stats["asy"]["count"] == 1
+    assert {"pandoc", "pdftocairo", "svg.minify", "base64"} <= set(stats)
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_mathml_mode(tmp_path):
+    html = render_wikitext(
+        "<math>\\frac{1}{2}</math> and <math>\\unknownmacro{x} < 1</math>",
+        math="mathml",
+    )
+    assert '<math display="inline" xmlns="http://www.w3.org/1998/Math/MathML">' in html
+    assert renderer.math_fallbacks(html) == ["\\unknownmacro{x} < 1"]
+
+    problems = [
+        {"ID": "2020-8-1", "ProblemNumber": 1, "Question": "<math>x^2</math>"},
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "<math>\\foo</math>"},
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+    out = tmp_path / "out"
+    fallbacks = []
+    assert render_json(str(json_path), str(out), math="mathml", fallbacks=fallbacks)
+    assert fallbacks == [("2020-8-2", "\\foo")]
+    for name in ("2020-8-1.html", "index.html"):
+        page = (out / name).read_text()
+        assert "<script" not in page and "</math>" in page
+    assert renderer.math_summary(fallbacks).startswith(
+        "MathML: 1 fragments in 1 problems kept as TeX"
+    )
+
+    # switching back to MathJax rebuilds every page
+    assert render_json(str(json_path), str(out)) == 2
+    assert MATHJAX_SCRIPT in (out / "index.html").read_text()
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_benchmark_math(tmp_path):
+    problems = [
+        {
+            "ID": "2020-8-1",
+            "ProblemNumber": 1,
+            "Question": "<math>a+b</math> <asy>dot((0,0));</asy> <math>\\foo</math>",
+        }
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+    results = renderer.benchmark_math([str(json_path)], repeat=1)
+    assert results["mathjax"]["browser_typeset"] == 2
+    assert results["mathjax"]["fallbacks"] == 0
+    assert results["mathml"]["browser_typeset"] == 0
+    assert results["mathml"]["fallbacks"] == 1
+    assert results["mathjax"]["pages"] == results["mathml"]["pages"] == 1
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_render_json_with_thumbnails(tmp_path, monkeypatch):
+    from PIL import Image
+
+    from diagram_cache import DiagramCache
+
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    problems = [
+        {"ID": "2020-8-1", "ProblemNumber": 1, "Question": "A <asy>dot((0,0));</asy>"},
+        {"ID": "2020-8-2", "ProblemNumber": 2, "Question": "B <asy>error;</asy>"},
+    ]
+    json_path = tmp_path / "2020-8.json"
+    json_path.write_text(json.dumps(problems), encoding="utf-8")
+    out = tmp_path / "out"
+    cache = DiagramCache(tmp_path / "cache")
+
+    render_json(str(json_path), str(out), cache=cache, assets=True, thumbnails=True)
+    # one SVG and one PNG conversion per figure that compiled
+    assert calls.count("pdftocairo") == 2
+    assert len(list((out / "assets").glob("*.svg"))) == 2  # with the placeholder
+    (thumbnail,) = (out / "assets").glob("*-150.png")
+    stem, tag = thumbnail.name[:20], renderer.raster_tag()
+    for size in (renderer.THUMBNAIL_SIZE, DIAGRAM_SIZE):
+        for fmt in renderer.RASTER_FORMATS:
+            with Image.open(out / "assets" / f"{stem}-{tag}-{size}.{fmt}") as image:
+                assert image.size == (size, size)
+    page = (out / "2020-8-1.html").read_text()
+    assert f'<img src="assets/{stem}.svg" alt="diagram" loading="lazy"/>' in page
+    index = (out / "index.html").read_text()
+    assert (
+        f'srcset="assets/{stem}-{tag}-150.png 150w, '
+        f'assets/{stem}-{tag}-300.png 300w" sizes="150px"' in index
+    )
+    assert "<picture>" in index and "<picture>" not in page
+    assert 'alt="diagram unavailable (error)" loading="lazy"/>' in index
+
+    # existing variants are not derived again
+    derived = []
+    variants = renderer.raster_variants
+    monkeypatch.setattr(
+        renderer, "raster_variants", lambda png: derived.append(png) or variants(png)
+    )
+    render_json(
+        str(json_path), str(out), cache=cache, assets=True, thumbnails=True, force=True
+    )
+    assert derived == []
+
+    # the PNG is cached with the SVG, so nothing is rasterized again
+    calls.clear()
+    shutil.rmtree(out)
+    render_json(str(json_path), str(out), cache=cache, assets=True, thumbnails=True)
+    assert "pdftocairo" not in calls and len(derived) == 1
+    assert (out / "assets" / f"{stem}-{tag}-150.png").exists()
+
+    # other raster settings give other file names and rebuild the pages
+    monkeypatch.setattr(renderer, "RASTER_COLORS", 16)
+    assert renderer.raster_tag() != tag
+    render_json(str(json_path), str(out), cache=cache, assets=True, thumbnails=True)
+    assert len(derived) == 2
+    assert renderer.raster_tag() in (out / "index.html").read_text()
+
+    with pytest.raises(ValueError):
+        render_json(str(json_path), str(out), thumbnails=True)
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_json_command_with_several_files(tmp_path):
+    for contest in ("A", "B"):
+        problems = [
+            {"ID": f"2020-{contest}-{n}", "ProblemNumber": n, "Question": f"Q {n}"}
+            for n in (1, 2)
+        ]
+        (tmp_path / f"{contest}.json").write_text(json.dumps(problems))
+    script = Path(renderer.__file__)
+    command = [sys.executable, str(script), "--no-cache", "json", "A.json"]
+    command += ["B.json", "out"]
+
+    subprocess.run(command, cwd=tmp_path, check=True, capture_output=True)
+    page = tmp_path / "out" / "A" / "2020-A-1.html"
+    mtime = page.stat().st_mtime_ns
+    subprocess.run(command, cwd=tmp_path, check=True, capture_output=True)
+    for contest in ("A", "B"):
+        index = (tmp_path / "out" / contest / "index.html").read_text()
+        assert "Problem 1" in index and "Problem 2" in index
+        assert (tmp_path / "out" / contest / f"2020-{contest}-2.html").exists()
+    assert page.stat().st_mtime_ns == mtime  # the second run skipped everything
+
+
+@pytest.mark.skipif(not pandoc_exists, reason="pandoc missing")
+def test_shared_memo_keeps_failed_problems_stale(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(renderer, "run_limited", _fake_tools(calls))
+    rendered, diagrams = {}, {}
+    for contest in ("A", "B"):
+        problems = [
+            {"ID": f"{contest}-1", "ProblemNumber": 1, "Question": "<asy>error;</asy>"}
+        ]
+        json_path = tmp_path / f"{contest}.json"
+        json_path.write_text(json.dumps(problems), encoding="utf-8")
+        out = tmp_path / contest
+        render_json(str(json_path), str(out), rendered, diagrams=diagrams)
+        errors = json.loads((out / "diagram_errors.json").read_text())
+        assert [(e["owner"], e["error"]) for e in errors] == [(f"{contest}-1", "error")]
+    assert calls.count("asy") == 1  # B reused the result
+    # B's problem is tried again on the next build, like A's
+    assert render_json(str(json_path), str(tmp_path / "B")) == 1
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from search import SearchIndex, benchmark, tokenize
+
+
+def test_tokenize_wikitext_and_latex():
+    text = (
+        "Let <math>\\dfrac{\\Delta}{2}</math> be the [[Area|area]] of the triangle."
+        "<asy>draw((0,0)--(1,1));</asy> $\\left(x\\right)$"
+    )
+    assert tokenize(text) == [
+        "let", "\\frac", "\\Delta", "2", "area", "triangle", "x"
+    ]  # fmt: skip
+
+
+def _write(root, name, items):
+    folder = root / "amc_problems" / "AMC 10A"
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / name).write_text(json.dumps(items), encoding="utf-8")
+
+
+def _item(pid, year, question, solution="", topics=()):
+    return {
+        "ID": pid,
+        "Year": year,
+        "Question": question,
+        "Solution": solution,
+        "Source": "AMC10",
+        "Topics": list(topics),
+    }
+
+
+def test_rank_filter_and_incremental_update(tmp_path):
+    _write(
+        tmp_path,
+        "2020-AMC 10A.json",
+        [
+            _item("2020-AMC 10A-1", "2020", "Find the area of the triangle."),
+            _item("2020-AMC 10A-2", "2020", "How many primes?", "A triangle helps."),
+        ],
+    )
+    _write(
+        tmp_path,
+        "2021-AMC 10A.json",
+        [_item("2021-AMC 10A-5", "2021", "Triangle area again", topics=["Geometry"])],
+    )
+    index = SearchIndex()
+    assert index.update_from_tree(str(tmp_path)) == (2, 0)
+    ids = [pid for pid, _ in index.search("triangle area")]
+    assert ids[-1] == "2020-AMC 10A-2" and len(ids) == 3
+    assert [p for p, _ in index.search("triangle", year_from=2021)] == [
+        "2021-AMC 10A-5"
+    ]
+    assert [p for p, _ in index.search("area", topic="Geometry")] == ["2021-AMC 10A-5"]
+    assert index.search("triangle", source="AIME") == []
+    assert len(index.search("triangle", source="AMC10")) == 3
+
+    path = str(tmp_path / "index.sqlite")
+    index.save(path)
+    index = SearchIndex.load(path)
+    assert index.update_from_tree(str(tmp_path)) == (0, 0)
+
+    os.remove(tmp_path / "amc_problems" / "AMC 10A" / "2021-AMC 10A.json")
+    _write(
+        tmp_path,
+        "2020-AMC 10A.json",
+        [_item("2020-AMC 10A-1", "2020", "Count the primes.")],
+    )
+    assert index.update_from_tree(str(tmp_path)) == (1, 1)
+    assert index.search("triangle") == []
+    assert [p for p, _ in index.search("primes")] == ["2020-AMC 10A-1"]
+    index.save(path)
+    stats = benchmark(path, ["primes"], repeat=3)
+    assert stats["queries"] == 3 and stats["load"] > 0
@@ -0,0 +1,59 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from corpus_store import CorpusStore
+from site_builder import build_listings
+
+
+def _write_tree(root, count):
+    folder = root / "amc_problems" / "AMC 8"
+    folder.mkdir(parents=True, exist_ok=True)
+    problems = [
+        {
+            "ID": f"2020-8-{n}",
+            "Year": "2020",
+            "ProblemNumber": n,
+            "Question": f"Question {n}",
+            "Source": "AMC8",
+            "Subjects": ["Algebra"] if n % 2 else ["Geometry", "Algebra"],
+            "Topics": [],
+        }
+        for n in range(1, count + 1)
+    ]
+    (folder / "2020-8.json").write_text(json.dumps(problems), encoding="utf-8")
+
+
+def test_build_listings(tmp_path):
+    _write_tree(tmp_path, 5)
+    out = tmp_path / "site"
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store:
+        store.import_tree(str(tmp_path))
+        report = build_listings(store, str(out), page_size=2)
+        # source, year and Algebra: 3 pages each; Geometry: 1 page; home page
+        assert report.written == 11
+        listing = out / "browse" / "subject" / "algebra"
+        assert sorted(p.name for p in listing.iterdir()) == [
+            "1.html",
+            "2.html",
+            "3.html",
+        ]
+        page = (listing / "1.html").read_text()
+        assert page.count("<li>") == 2
+        url = "../../../amc_problems/AMC%208/2020-8/2020-8-1.html"
+        assert f'<a href="{url}">2020 AMC8 Problem 1</a>' in page
+        assert f'<div class="question" data-src="{url}"></div>' in page
+        assert "Question 1" not in page  # loaded lazily from the problem page
+        home = (out / "index.html").read_text()
+        assert '<a href="browse/subject/geometry/1.html">Geometry</a> (2)' in home
+
+        assert build_listings(store, str(out), page_size=2).written == 0
+
+    _write_tree(tmp_path, 2)
+    with CorpusStore(str(tmp_path / "corpus.sqlite")) as store:
+        store.import_tree(str(tmp_path))
+        report = build_listings(store, str(out), page_size=2)
+    assert report.removed == 6
+    assert sorted(p.name for p in listing.iterdir()) == ["1.html"]
@@ -0,0 +1,98 @@
+import os
+import sys
+from xml.etree import ElementTree as ET
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from svg_minify import minify, share_glyphs
+
+GLYPH = "M 3.390625 -2.40625 L 5.0625 0 C 5.078125 -3.125 5.84375 -3.71875 0.5 0.5 Z "
+SVG = f"""<?xml version="1.0" encoding="UTF-8"?>
+<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="300px" height="300px" viewBox="0 0 105.123456 88.654321" version="1.1">
+<defs>
+<g>
+<symbol overflow="visible" id="glyph0-0">
+<path style="stroke:none;" d=""/>
+</symbol>
+<symbol overflow="visible" id="glyph0-1">
+<path style="stroke:none;" d="{GLYPH}"/>
+</symbol>
+<symbol overflow="visible" id="glyph1-1">
+<path style="stroke:none;" d="{GLYPH}"/>
+</symbol>
+</g>
+<clipPath id="clip1">
+  <path d="M 0.5 0.5 L 100.000001 0.5 L 100.000001 80 L 0.5 80 Z "/>
+</clipPath>
+<clipPath id="clip2">
+  <path d="M 0 0 L 1 0 Z "/>
+</clipPath>
+</defs>
+<g id="surface1">
+<g clip-path="url(#clip1)" clip-rule="nonzero">
+<path style="fill:none;stroke-width:0.5;stroke-linecap:butt;stroke:rgb(0%,0%,0%);stroke-opacity:1;" d="M 0.00078125 0.00078125 L 100.000125 0.00078125 Z "/>
+</g>
+<g style="fill:rgb(100%,0%,0%);fill-opacity:1;">
+  <use xlink:href="#glyph0-1" x="10.5123" y="20.3456"/>
+  <use xlink:href="#glyph1-1" x="30.5" y="20.3456"/>
+</g>
+</g>
+</svg>
+""".encode()
+
+NS = {"svg": "http://www.w3.org/2000/svg"}
+
+
+def test_minify_svg():
+    small = minify(SVG)
+    assert len(small) < len(SVG) // 2
+    root = ET.fromstring(small)
+    (symbol,) = root.findall(".//svg:symbol", NS)  # unused glyph dropped, twins merged
+    assert (
+        symbol.find("svg:path", NS).get("d")
+        == "M3.39-2.41L5.06 0C5.08-3.12 5.84-3.72.5.5Z"
+    )
+    assert len(root.findall(".//svg:clipPath", NS)) == 1
+    # the clip group holds one path and the path takes over its attributes
+    path = root.find("svg:path", NS)
+    assert (
+        path.get("clip-path") == f"url(#{root.find('.//svg:clipPath', NS).get('id')})"
+    )
+    assert path.get("d") == "M0 0L100 0Z"
+    assert path.get("stroke") == "#000" and path.get("stroke-width") == ".5"
+    assert "stroke-linecap" not in path.attrib and "style" not in path.attrib
+    uses = root.findall("svg:g/svg:use", NS)
+    assert root.find("svg:g", NS).get("fill") == "#f00"
+    assert {u.get("{http://www.w3.org/1999/xlink}href") for u in uses} == {
+        "#" + symbol.get("id")
+    }
+    assert root.get("viewBox") == "0 0 105.12 88.65"
+    assert minify(small) == small
+    assert minify(b"<svg><unclosed></svg>") == b"<svg><unclosed></svg>"
+
+
+def test_user_space_attributes_stay_on_transformed_groups():
+    svg = (
+        '<svg xmlns="http://www.w3.org/2000/svg" width="10" height="10">'
+        '<defs><mask id="m"><rect width="5" height="5"/></mask>'
+        '<filter id="f"><feGaussianBlur stdDeviation="1"/></filter>'
+        '<clipPath id="c"><rect width="5" height="5"/></clipPath></defs>'
+        '<g mask="url(#m)"><path transform="scale(2)" d="M0 0L1 1"/></g>'
+        '<g filter="url(#f)"><path transform="scale(2)" d="M0 0L1 2"/></g>'
+        '<g clip-path="url(#c)"><path transform="scale(2)" d="M0 0L1 3"/></g>'
+        '<g mask="url(#m)"><path d="M0 0L1 4"/></g>'
+        "</svg>"
+    ).encode()
+    root = ET.fromstring(minify(svg))
+    groups = root.findall("svg:g", NS)
+    assert [list(g.attrib) for g in groups] == [["mask"], ["filter"], ["clip-path"]]
+    assert all(g[0].get("transform") == "scale(2)" for g in groups)
+    # without a child transform the group still collapses
+    assert root.find("svg:path[@mask]", NS).get("d") == "M0 0L1 4"
+
+
+def test_share_glyphs():
+    sprite, (a, b) = share_glyphs([minify(SVG), minify(SVG.replace(b"10.5123", b"3"))])
+    assert sprite.count(b"<symbol") == 1
+    assert b"<symbol" not in a and b"<symbol" not in b
+    assert b"<clipPath" in a
@@ -0,0 +1,50 @@
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from aops_downloader import WikiClient, fetch_pages_wikitext
+from wiki_cache import WikiCache
+
+
+def test_cache_lru_eviction(tmp_path):
+    cache = WikiCache(tmp_path, max_bytes=10)
+    cache.put("a", "aaaa", revid=1)
+    cache.put("b", "bbbb", revid=1)
+    # identical bodies share one blob and do not count twice
+    cache.put("b2", "bbbb", revid=1)
+    assert cache.total_bytes() == 8
+    assert cache.get("a").text == "aaaa"  # "a" becomes most recently used
+    cache.put("c", "cccc", revid=1)
+    assert cache.get("b") is None and cache.get("b2") is None
+    assert cache.get("a").revid == 1 and cache.get("c") is not None
+    assert len([p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]) == 2
+
+
+def test_conditional_refetch(fake_wiki, tmp_path):
+    fake_wiki.pages.update({"A": "one", "B": "two"})
+    cache = WikiCache(tmp_path)
+    with WikiClient(fake_wiki.url, cache=cache) as client:
+        fetch_pages_wikitext(["A", "B", "Missing"], client)
+        assert "content" in fake_wiki.requests[-1]["rvprop"]
+
+        fake_wiki.requests.clear()
+        pages = fetch_pages_wikitext(["A", "B", "Missing"], client)
+        assert len(fake_wiki.requests) == 1
+        assert "content" not in fake_wiki.requests[0]["rvprop"]
+        assert pages["A"].text == "one" and pages["A"].revid == 1
+        assert pages["Missing"].error == "Page not found"
+
+        fake_wiki.pages["B"] = "two, edited"
+        fake_wiki.revids["B"] = 2
+        fake_wiki.requests.clear()
+        pages = fetch_pages_wikitext(["A", "B"], client)
+        assert [r["titles"] for r in fake_wiki.requests] == ["A|B", "B"]
+        assert pages["B"].text == "two, edited"
+        assert cache.get("B").revid == 2
+
+        client.refresh = True
+        fake_wiki.requests.clear()
+        fetch_pages_wikitext(["A", "B"], client)
+        assert len(fake_wiki.requests) == 1
+        assert "content" in fake_wiki.requests[0]["rvprop"]
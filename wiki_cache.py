@@ -0,0 +1,183 @@
+"""Persistent, revision-aware cache of raw AoPS wikitext.
+
+Page bodies are stored content-addressed (``blobs/<sha256>``) so identical
+pages share one file; a small SQLite index maps each title to its blob and to
+the ``revid``/timestamp the body was fetched at. The downloader compares those
+against cheap bulk revision lookups and only refetches pages that changed.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_CACHE_DIR = ".wiki_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    title TEXT PRIMARY KEY,
+    resolved_title TEXT NOT NULL,
+    revid INTEGER,
+    timestamp TEXT,
+    sha256 TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed);
+CREATE INDEX IF NOT EXISTS pages_sha256 ON pages (sha256);
+"""
+
+
+@dataclass
+class CachedPage:
+    title: str
+    resolved_title: str
+    revid: Optional[int]
+    timestamp: Optional[str]
+    text: str
+
+
+class WikiCache:
+    """On-disk wikitext cache with a total size cap and LRU eviction."""
+
+    def __init__(
+        self,
+        directory: str | os.PathLike = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        (self.directory / "blobs").mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            self.directory / "index.sqlite", check_same_thread=False
+        )
+        self._db.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+
+    def _blob_path(self, sha: str) -> Path:
+        return self.directory / "blobs" / sha[:2] / sha
+
+    def revisions(self, titles: Iterable[str]) -> Dict[str, Optional[int]]:
+        """Return the cached ``revid`` for every title present in the cache."""
+        titles = list(titles)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT title, revid FROM pages WHERE title IN ({','.join('?' * len(titles))})",
+                titles,
+            ).fetchall()
+        return dict(rows)
+
+    def titles_resolving_to(self, resolved_titles: Iterable[str]) -> List[str]:
+        """Return cached titles that redirect or normalize to ``resolved_titles``."""
+        resolved_titles = list(resolved_titles)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT title FROM pages WHERE title != resolved_title AND "
+                f"resolved_title IN ({','.join('?' * len(resolved_titles))})",
+                resolved_titles,
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get(self, title: str) -> Optional[CachedPage]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT resolved_title, revid, timestamp, sha256 FROM pages WHERE title = ?",
+                (title,),
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            resolved, revid, timestamp, sha = row
+            try:
+                text = self._blob_path(sha).read_text(encoding="utf-8")
+            except FileNotFoundError:
+                self._db.execute("DELETE FROM pages WHERE title = ?", (title,))
+                self._db.commit()
+                self.misses += 1
+                return None
+            self._db.execute(
+                "UPDATE pages SET accessed = ? WHERE title = ?", (time.time(), title)
+            )
+            self._db.commit()
+            self.hits += 1
+        return CachedPage(title, resolved, revid, timestamp, text)
+
+    def put(
+        self,
+        title: str,
+        text: str,
+        *,
+        resolved_title: Optional[str] = None,
+        revid: Optional[int] = None,
+        timestamp: Optional[str] = None,
+    ) -> None:
+        data = text.encode("utf-8")
+        sha = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(sha)
+        with self._lock:
+            if not path.exists():
+                path.parent.mkdir(exist_ok=True)
+                tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp.write_bytes(data)
+                os.replace(tmp, path)
+            old = self._db.execute(
+                "SELECT sha256 FROM pages WHERE title = ?", (title,)
+            ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    title,
+                    resolved_title or title,
+                    revid,
+                    timestamp,
+                    sha,
+                    len(data),
+                    time.time(),
+                ),
+            )
+            if old and old[0] != sha:
+                self._drop_blob_if_unused(old[0])
+            self._evict()
+            self._db.commit()
+
+    def _drop_blob_if_unused(self, sha: str) -> None:
+        used = self._db.execute(
+            "SELECT 1 FROM pages WHERE sha256 = ? LIMIT 1", (sha,)
+        ).fetchone()
+        if not used:
+            self._blob_path(sha).unlink(missing_ok=True)
+
+    def total_bytes(self) -> int:
+        row = self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM pages)"
+        ).fetchone()
+        return row[0]
+
+    def _evict(self) -> None:
+        total = self.total_bytes()
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute(
+            "SELECT title, sha256, size FROM pages ORDER BY accessed ASC"
+        ).fetchall()
+        for title, sha, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM pages WHERE title = ?", (title,))
+            used = self._db.execute(
+                "SELECT 1 FROM pages WHERE sha256 = ? LIMIT 1", (sha,)
+            ).fetchone()
+            if not used:
+                self._blob_path(sha).unlink(missing_ok=True)
+                total -= size
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()